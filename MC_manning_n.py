@@ -1,8 +1,12 @@
 import numpy as np
+import os
+import shutil
 import time
 from pyHMT2D import RAS_2D
 
-def monte_carlo_n_values(project_file, terrain_file, num_realizations=1000):
+from preprocessing.geometry_roughness import GeometryRoughness
+
+def monte_carlo_n_values(project_file, terrain_file, num_realizations=1000, direct_geometry=True):
     """
     This function runs a Monte Carlo experiment by sampling n values from a normal distribution
     and applying them to the main channel of each cross section in a HEC-RAS project. The water
@@ -12,6 +16,9 @@ def monte_carlo_n_values(project_file, terrain_file, num_realizations=1000):
     :param project_file: Path to the HEC-RAS project file
     :param terrain_file: Path to the terrain file
     :param num_realizations: Number of Monte Carlo realizations to run
+    :param direct_geometry: Write each realization's n values straight into the geometry file and
+        reopen the project, instead of setting them cross section by cross section through the
+        controller (see preprocessing/geometry_roughness.py)
     :return: Exceedance probability water surface elevations
     """
 
@@ -36,31 +43,50 @@ def monte_carlo_n_values(project_file, terrain_file, num_realizations=1000):
     # Array to keep track of sampled n values
     sampled_n_values = np.zeros(num_realizations)
 
-    # Run Monte Carlo realizations
-    for i in range(num_realizations):
-        # Sample n value from normal distribution
-        n_ch = np.random.normal(mean_n, stddev_n)
-
-        # Apply the sampled n value to the geometry
-        apply_n_values_to_geometry(ras_controller, n_ch)
-
-        # Save the project with new Manning's n values
-        ras_controller.Project_Save()
-
-        # Run the HEC-RAS computation
-        ras_controller.Compute_HideComputationWindow()
-        did_compute = ras_controller.Compute_CurrentPlan()
-
-        # Get water surface elevation output for a specific river station
-        wse_elevations[i] = ras_controller.Output_NodeOutput(1, 1, 1, 0, 1, 2)
-
-        # Store sampled n value
-        sampled_n_values[i] = n_ch
-
-        # Show progress
-        elapsed_time = round((time.time() - start_time) / 60, 2)
-        print(f"Finished computing realization #{i+1} of {num_realizations}. "
-              f"Sampled N Value = {round(n_ch, 4)}. Elapsed Time: {elapsed_time} minutes.")
+    # The geometry file is parsed once; each realization only rewrites its n fields
+    if direct_geometry:
+        geometry_file = ras_controller.CurrentGeomFile()
+        roughness = GeometryRoughness(geometry_file)
+        backup_file = geometry_file + '.mc_backup'
+        shutil.copy2(geometry_file, backup_file)
+
+    # Run Monte Carlo realizations. The geometry file is restored however the loop ends
+    # (a failed computation, an output error or Ctrl-C), and a copy of the original stays
+    # beside it while the loop runs, in case the process is killed outright
+    try:
+        for i in range(num_realizations):
+            # Sample n value from normal distribution
+            n_ch = np.random.normal(mean_n, stddev_n)
+
+            if direct_geometry:
+                # Write the sampled n value into the geometry file and reload it
+                roughness.write(geometry_file, channel_n=n_ch, left_n=0.1, right_n=0.1)
+                ras_controller.Project_Open(project_file)
+            else:
+                # Apply the sampled n value to the geometry
+                apply_n_values_to_geometry(ras_controller, n_ch)
+
+                # Save the project with new Manning's n values
+                ras_controller.Project_Save()
+
+            # Run the HEC-RAS computation
+            ras_controller.Compute_HideComputationWindow()
+            did_compute = ras_controller.Compute_CurrentPlan()
+
+            # Get water surface elevation output for a specific river station
+            wse_elevations[i] = ras_controller.Output_NodeOutput(1, 1, 1, 0, 1, 2)
+
+            # Store sampled n value
+            sampled_n_values[i] = n_ch
+
+            # Show progress
+            elapsed_time = round((time.time() - start_time) / 60, 2)
+            print(f"Finished computing realization #{i+1} of {num_realizations}. "
+                  f"Sampled N Value = {round(n_ch, 4)}. Elapsed Time: {elapsed_time} minutes.")
+    finally:
+        if direct_geometry:
+            roughness.write(geometry_file)
+            os.remove(backup_file)
 
     # Sort the water surface elevations to calculate exceedance probabilities
     sorted_wse_elevations = np.sort(wse_elevations)
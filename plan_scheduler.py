@@ -0,0 +1,259 @@
+"""
+Runs the plans of a HEC-RAS project side by side, each worker in its own copy of the project.
+
+run_multiple_HEC_RAS_plans runs plans one after the other in the project folder, because
+selecting a plan rewrites 'Current Plan=' in the shared .prj. PlanScheduler gives each worker
+a workspace copy of the project folder (made with save_hec_ras_project and refreshed on reuse)
+and dispatches the plans to up to max_workers workers through a queue. When a plan finishes,
+its .p##.hdf is moved back into the master project under a temporary name and renamed, so
+the master folder only ever holds complete results. The master .prj is never modified.
+
+The solver is a pluggable backend with a run(project_file, plan) method: HecRasBackend drives
+HEC-RAS through the controller, CommandBackend starts any executable (Ras.exe on Windows, or a
+stand-in that writes a result file on Linux).
+
+Usage:
+    scheduler = PlanScheduler(r"C:\\ATD\\Hydraulic Models\\Bennett_MC\\UE\\UE_Valleys.prj",
+                              HecRasBackend(terrain_file), max_workers=4)
+    results = scheduler.run(['p02', 'p04', 'p05', 'p06'])
+"""
+
+import os
+import queue
+import shutil
+import subprocess
+import tempfile
+import threading
+import time
+
+from preprocessing.utils.copy_project import save_hec_ras_project
+from session_pool import DEFAULT_MAX_RUNS, HecRasSession, SessionPool
+
+# Files of the master project that workspaces do not need: results of other plans, run
+# scratch files and the bookkeeping files of this package
+WORKSPACE_IGNORE = shutil.ignore_patterns('*.p[0-9][0-9].hdf', '*.p[0-9][0-9][0-9].hdf', '*.tmp.hdf', '*.tmp',
+                                          '*.ras_index.json', '*.alloc.lock', '*.reservations.json', '*.run_journal.json',
+                                          '*.index.json', '*.bak')
+
+# Result files collected from a workspace after a plan ran; {base} is the project base name
+RESULT_PATTERNS = ('{base}.{plan}.hdf',)
+
+
+def plan_extension(plan):
+    # 'p05' from 'p05', 'P05' or 'ME_Valleys.p05'
+    return plan.split('.')[-1].lower()
+
+
+class HecRasBackend:
+    """
+    Runs a plan through the HEC-RAS Controller. Each worker keeps its HEC-RAS session warm
+    for up to max_runs plans (see session_pool.SessionPool).
+    """
+
+    def __init__(self, terrain_file, max_runs=DEFAULT_MAX_RUNS, switch_mode='set_current'):
+        self.terrain_file = terrain_file
+        self.pool = SessionPool(lambda: HecRasSession(terrain_file, switch_mode=switch_mode), size=None,
+                                max_runs=max_runs)
+
+    def run(self, project_file, plan):
+        # The controller is a COM object; every worker thread needs COM initialized
+        try:
+            import pythoncom
+            pythoncom.CoInitialize()
+        except ImportError:
+            pass
+        result = self.pool.run(project_file, plan)
+        if result['error']:
+            raise RuntimeError(f"HEC-RAS did not compute plan {plan} of {project_file}: {result['error']}")
+
+    def finish(self):
+        # Called by each worker thread when it stops; COM sessions are closed by their own thread
+        self.pool.close(thread_only=True)
+
+
+class CommandBackend:
+    """
+    Runs a plan by starting an executable, e.g. the HEC-RAS command line
+    ['C:\\Program Files (x86)\\HEC\\HEC-RAS\\6.1\\Ras.exe', '-c', '{project}', '{plan_file}'] or,
+    for testing on Linux, [sys.executable, 'fake_ras.py', '{project}', '{plan}'].
+
+    The arguments are formatted with {project} (the workspace .prj), {plan} ('p05'),
+    {plan_file} (the workspace .p05) and {workspace} (the workspace folder).
+    """
+
+    def __init__(self, command, timeout=None):
+        """
+        Parameters:
+            command (list): Executable and arguments.
+            timeout (float): Seconds after which a run is killed; None waits indefinitely.
+        """
+        self.command = list(command)
+        self.timeout = timeout
+
+    def run(self, project_file, plan):
+        fields = {'project': project_file, 'plan': plan, 'workspace': os.path.dirname(project_file),
+                  'plan_file': f"{os.path.splitext(project_file)[0]}.{plan}"}
+        command = [argument.format(**fields) for argument in self.command]
+        completed = subprocess.run(command, cwd=fields['workspace'], capture_output=True, text=True,
+                                   timeout=self.timeout)
+        if completed.returncode != 0:
+            raise RuntimeError(f"{os.path.basename(command[0])} exited with code {completed.returncode}: "
+                               f"{completed.stderr.strip()[-500:]}")
+
+
+class PlanScheduler:
+    """
+    Dispatches the plans of a project to concurrent workers, each with its own workspace.
+    """
+
+    def __init__(self, project_file, backend, max_workers=None, workspace_root=None, keep_workspaces=True,
+                 journal=None):
+        """
+        Parameters:
+            project_file (str): The master project's .prj file.
+            backend: Object with run(project_file, plan), see HecRasBackend and CommandBackend. An
+                optional finish() is called by every worker thread when it stops.
+            max_workers (int): Plans run at the same time at most; defaults to the CPU count.
+            workspace_root (str): Folder of the workspaces; defaults to '<project folder>_workspaces'
+                beside the project folder.
+            keep_workspaces (bool): Keep the workspaces for the next run, which then only copies
+                the files that changed. False deletes them when the run ends.
+            journal (RunJournal): Skips plans whose results are up to date and records every run
+                (see run_journal.py).
+        """
+        self.project_file = os.path.abspath(project_file)
+        self.project_dir = os.path.dirname(self.project_file)
+        self.base_name = os.path.splitext(os.path.basename(self.project_file))[0]
+        self.backend = backend
+        self.max_workers = max(1, max_workers or os.cpu_count() or 1)
+        self.workspace_root = workspace_root or self.project_dir.rstrip(os.sep) + '_workspaces'
+        self.keep_workspaces = keep_workspaces
+        self.journal = journal
+
+    def workspace(self, worker):
+        # Folder of a worker's project copy
+        return os.path.join(self.workspace_root, f"worker_{worker + 1:02d}")
+
+    def prepare_workspace(self, worker):
+        """
+        Creates or refreshes a worker's copy of the project.
+
+        Returns:
+            str: The workspace's .prj file.
+        """
+        workspace = self.workspace(worker)
+        save_hec_ras_project(self.project_dir, [workspace], ignore=WORKSPACE_IGNORE, update_only=True)
+        return os.path.join(workspace, os.path.basename(self.project_file))
+
+    def collect(self, workspace_prj, plan):
+        """
+        Moves a plan's result files from a workspace into the master project, each through a
+        temporary file and a rename (a plain rename when both are on one drive).
+
+        Returns:
+            list: The result files written to the master project.
+        """
+        collected = []
+        workspace = os.path.dirname(workspace_prj)
+        for pattern in RESULT_PATTERNS:
+            name = pattern.format(base=self.base_name, plan=plan)
+            source = os.path.join(workspace, name)
+            if not os.path.exists(source):
+                raise FileNotFoundError(f"Plan {plan} produced no {name} in {workspace}.")
+            destination = os.path.join(self.project_dir, name)
+            handle, temp_path = tempfile.mkstemp(dir=self.project_dir, suffix='.tmp')
+            os.close(handle)
+            try:
+                shutil.move(source, temp_path)
+                os.replace(temp_path, destination)
+            except BaseException:
+                if os.path.exists(temp_path):
+                    os.remove(temp_path)
+                raise
+            collected.append(destination)
+        return collected
+
+    def _run_plan(self, worker, workspace_prj, plan):
+        result = {'plan': plan, 'worker': worker + 1, 'status': 'failed', 'seconds': 0.0, 'files': [], 'error': None}
+        start = time.time()
+        try:
+            # A result left in the workspace by an earlier run must not be collected as this run's
+            for pattern in RESULT_PATTERNS:
+                stale = os.path.join(os.path.dirname(workspace_prj), pattern.format(base=self.base_name, plan=plan))
+                if os.path.exists(stale):
+                    os.remove(stale)
+            if self.journal is not None:
+                self.journal.start(plan)
+            self.backend.run(workspace_prj, plan)
+            result['files'] = self.collect(workspace_prj, plan)
+            result['status'] = 'completed'
+        except Exception as e:
+            result['error'] = f"{type(e).__name__}: {e}"
+        if self.journal is not None:
+            self.journal.finish(plan, result['status'] == 'completed', result['error'])
+            if self.journal.plans[plan]['status'] != 'completed':
+                result['status'], result['error'] = 'failed', self.journal.plans[plan]['error']
+        result['seconds'] = round(time.time() - start, 2)
+        return result
+
+    def _worker(self, worker, plans, results, lock):
+        workspace_prj = None
+        while True:
+            try:
+                plan = plans.get_nowait()
+            except queue.Empty:
+                break
+            # The workspace is made by the worker itself, so copies happen in parallel too
+            if workspace_prj is None:
+                try:
+                    workspace_prj = self.prepare_workspace(worker)
+                except Exception as e:
+                    with lock:
+                        results.append({'plan': plan, 'worker': worker + 1, 'status': 'failed', 'seconds': 0.0,
+                                        'files': [], 'error': f"Workspace: {type(e).__name__}: {e}"})
+                    continue
+            print(f"Worker {worker + 1}: running plan {plan}")
+            result = self._run_plan(worker, workspace_prj, plan)
+            print(f"Worker {worker + 1}: plan {plan} {result['status']} in {result['seconds']} s"
+                  + (f" ({result['error']})" if result['error'] else ''))
+            with lock:
+                results.append(result)
+        finish = getattr(self.backend, 'finish', None)
+        if finish is not None:
+            finish()
+
+    def run(self, plans):
+        """
+        Runs plans concurrently and collects their results into the master project.
+
+        Parameters:
+            plans (iterable): Plan extensions or file names ('p05', 'ME_Valleys.p05').
+
+        Returns:
+            list: One dict per plan, in the order given, with 'plan', 'worker', 'status'
+            ('completed', 'failed' or 'skipped' when the journal found it up to date),
+            'seconds', 'files' (collected results) and 'error'.
+        """
+        plans = list(dict.fromkeys(plan_extension(plan) for plan in plans))
+        to_run = self.journal.pending(plans) if self.journal is not None else plans
+        results = [{'plan': plan, 'worker': None, 'status': 'skipped', 'seconds': 0.0, 'files': [], 'error': None}
+                   for plan in plans if plan not in to_run]
+        pending = queue.Queue()
+        for plan in to_run:
+            pending.put(plan)
+        lock = threading.Lock()
+        threads = [threading.Thread(target=self._worker, args=(worker, pending, results, lock), daemon=True)
+                   for worker in range(min(self.max_workers, len(to_run)))]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+
+        if not self.keep_workspaces:
+            shutil.rmtree(self.workspace_root, ignore_errors=True)
+        order = {plan: number for number, plan in enumerate(plans)}
+        results.sort(key=lambda result: order[result['plan']])
+        failed = [result['plan'] for result in results if result['status'] == 'failed']
+        print(f"{len(results) - len(failed)} of {len(results)} plans completed or up to date"
+              + (f"; failed: {', '.join(failed)}" if failed else '') + '.')
+        return results
@@ -0,0 +1,283 @@
+"""
+Batch extraction of results from many plan HDF files in parallel.
+
+Takes a directory or glob of .p##.hdf files, names every output after the plan title and fans
+the extraction out over a process pool. Outputs and the report are ordered by plan title, so
+reruns produce the same file names regardless of which worker finishes first. A file that
+fails (corrupt, incomplete, or crashing the worker) is reported and the rest of the batch
+carries on.
+
+Usage:
+    python -m postprocessing.batch_extract "C:\\ATD\\Hydraulic Models\\Bennett_MC\\ME" out_dir --workers 4
+"""
+
+import argparse
+import glob
+import os
+import re
+import time
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor, as_completed
+from concurrent.futures.process import BrokenProcessPool
+
+import h5py
+
+from preprocessing.get_plan_names import extract_plan_title_from_file
+
+# Plan result files, e.g. ME_Valleys.p01.hdf
+PLAN_HDF_PATTERN = re.compile(r'.*\.p\d{2,3}\.hdf$', re.IGNORECASE)
+
+# Output products and the extension of the file each one writes ('all' writes a folder of
+# rasters and points for every area and summary variable, see extract_products; 'depth' a
+# folder of depth and wet/dry rasters, see depth_maps; 'velocity' a folder of cell velocity
+# and hazard rasters, see cell_velocity)
+PRODUCTS = {'points': '.shp', 'raster': '', 'all': '', 'depth': '', 'velocity': ''}
+
+# Times a file is retried after it crashed a worker process running alone, before it is
+# reported as failed
+MAX_CRASH_RETRIES = 1
+
+
+def find_plan_hdfs(source):
+    """
+    Lists plan HDF files from a directory or a glob pattern.
+
+    Parameters:
+        source (str): Project directory, or a glob such as 'C:/models/ME/*.p0*.hdf'.
+
+    Returns:
+        list: Sorted paths of the plan HDF files.
+    """
+    if os.path.isdir(source):
+        candidates = glob.glob(os.path.join(source, '*.hdf'))
+    else:
+        candidates = glob.glob(source)
+    return sorted(path for path in candidates if PLAN_HDF_PATTERN.match(path))
+
+
+def plan_number(hdf_path):
+    # 'p01' from 'ME_Valleys.p01.hdf'
+    return os.path.basename(hdf_path).split('.')[-2]
+
+
+def get_plan_title(hdf_path):
+    """
+    Returns the title of the plan a result HDF belongs to.
+
+    The plan text file next to the HDF is read first, then the 'Plan Title' attribute inside
+    the HDF. If neither is readable the plan number is used.
+
+    Parameters:
+        hdf_path (str): Path to the plan HDF file.
+
+    Returns:
+        str: Plan title.
+    """
+    plan_file = hdf_path[:-len('.hdf')]
+    if os.path.exists(plan_file):
+        try:
+            return extract_plan_title_from_file(plan_file)
+        except (UnboundLocalError, OSError, UnicodeDecodeError):
+            pass
+    try:
+        with h5py.File(hdf_path, 'r') as hdf_file:
+            title = hdf_file['Plan Data/Plan Information'].attrs['Plan Title']
+            return title.decode() if isinstance(title, bytes) else str(title)
+    except (OSError, KeyError):
+        return plan_number(hdf_path)
+
+
+def plan_output_names(hdf_paths):
+    """
+    Assigns every plan HDF a unique output name based on its plan title.
+
+    Parameters:
+        hdf_paths (list): Paths of the plan HDF files.
+
+    Returns:
+        list: (output_name, hdf_path) tuples sorted by output name. Plans that share a title are
+        told apart by their plan number, e.g. 'ME_1cms_p03'.
+    """
+    titles = {hdf_path: get_plan_title(hdf_path) for hdf_path in hdf_paths}
+    title_counts = {}
+    for title in titles.values():
+        title_counts[title] = title_counts.get(title, 0) + 1
+
+    names = []
+    for hdf_path, title in titles.items():
+        safe_title = re.sub(r'[\\/:*?"<>|]', '_', title).strip() or plan_number(hdf_path)
+        if title_counts[title] > 1:
+            safe_title = f"{safe_title}_{plan_number(hdf_path)}"
+        names.append((safe_title, hdf_path))
+    return sorted(names)
+
+
+def limit_worker_memory(memory_limit_mb):
+    """
+    Caps the address space of a worker process. Only enforced where the 'resource' module
+    exists (Linux, macOS); on Windows the limit is only passed on to the extraction.
+
+    Parameters:
+        memory_limit_mb (float): Memory limit in megabytes, or None for no limit.
+    """
+    if not memory_limit_mb:
+        return
+    try:
+        import resource
+    except ImportError:
+        return
+    limit = int(memory_limit_mb * 1024 * 1024)
+    resource.setrlimit(resource.RLIMIT_AS, (limit, limit))
+
+
+def extract_plan(hdf_path, output_path, product='points', resolution=1, cache_dir=None, terrain_path=None):
+    """
+    Extracts one product from one plan HDF. Runs inside a worker process.
+
+    Parameters:
+        hdf_path (str): Path to the plan HDF file.
+        output_path (str): Output file (points) or folder (raster).
+        product (str): 'points' for a point shapefile of the maximum water surface, 'raster'
+            for a GeoTIFF of the summary maximum water surface, 'all' for rasters and points
+            of every area and summary variable from a single file open, 'depth' for depth
+            and wet/dry rasters of every area, or 'velocity' for maximum cell velocity and
+            hazard rasters of every area.
+        resolution (float): Raster resolution.
+        cache_dir (str): Shared geometry cache folder, see geometry_cache.load_geometry.
+        terrain_path (str): Terrain GeoTIFF for subgrid depths ('depth' only). Without it,
+            depths are computed per cell from the cell minimum elevation.
+
+    Returns:
+        dict: 'status' ('ok' or 'failed'), 'seconds' and 'error'.
+    """
+    # Imported here so the pool workers only load the extraction stack they need
+    start_time = time.perf_counter()
+    try:
+        if product == 'points':
+            from postprocessing.save_results_as_shp import extract_and_save_rasters as extract_points
+            extract_points(hdf_path, output_path, cache_dir)
+        elif product == 'raster':
+            from postprocessing.save_results_as_tif import extract_and_save_rasters as extract_raster
+            os.makedirs(output_path, exist_ok=True)
+            extract_raster(hdf_path, output_path, resolution, cache_dir)
+        elif product == 'all':
+            from postprocessing.extract_products import extract_plan_products
+            extract_plan_products(hdf_path, output_path, products=('raster', 'points'),
+                                  resolution=resolution, cache_dir=cache_dir)
+        elif product == 'depth':
+            from postprocessing.depth_maps import write_depth_maps
+            write_depth_maps(hdf_path, output_path, terrain_path=terrain_path, resolution=resolution,
+                             cache_dir=cache_dir)
+        elif product == 'velocity':
+            from postprocessing.cell_velocity import write_velocity_products
+            write_velocity_products(hdf_path, output_path, resolution=resolution)
+        else:
+            raise ValueError(f"Unknown product '{product}'. Expected one of {tuple(PRODUCTS)}.")
+        status, error = 'ok', None
+    except Exception as e:
+        status, error = 'failed', f"{type(e).__name__}: {e}"
+    return {'status': status, 'seconds': time.perf_counter() - start_time, 'error': error}
+
+
+def extract_plan_isolated(hdf_path, output_path, product, resolution, cache_dir, terrain_path, memory_limit_mb):
+    # Runs one file in its own single-worker pool, so a crash is attributable to that file
+    with ProcessPoolExecutor(max_workers=1, initializer=limit_worker_memory, initargs=(memory_limit_mb,)) as pool:
+        return pool.submit(extract_plan, hdf_path, output_path, product, resolution, cache_dir,
+                           terrain_path).result()
+
+
+def batch_extract(source, output_dir, product='points', resolution=1, workers=None, memory_limit_mb=None,
+                  cache_dir=None, terrain_path=None):
+    """
+    Extracts results from every plan HDF in a directory or glob, in parallel.
+
+    Parameters:
+        source (str or list): Directory, glob pattern, or list of plan HDF paths.
+        output_dir (str): Folder for the outputs, one file (or folder) per plan named after its title.
+        product (str): 'points', 'raster', 'all', 'depth' or 'velocity', see extract_plan.
+        resolution (float): Raster resolution.
+        workers (int): Number of worker processes. Defaults to the number of CPUs.
+        memory_limit_mb (float): Per-worker memory limit in megabytes.
+        cache_dir (str): Geometry cache shared by all workers. Defaults to a 'geometry_cache'
+            folder in output_dir.
+        terrain_path (str): Terrain GeoTIFF for subgrid depth maps, see extract_plan.
+
+    Returns:
+        list: One result dict per plan, ordered by output name, with 'name', 'hdf_path',
+        'output_path', 'status', 'seconds' and 'error'.
+    """
+    hdf_paths = source if isinstance(source, (list, tuple)) else find_plan_hdfs(source)
+    if not hdf_paths:
+        print(f"No plan HDF files found in {source}")
+        return []
+    os.makedirs(output_dir, exist_ok=True)
+    if cache_dir is None:
+        cache_dir = os.path.join(output_dir, 'geometry_cache')
+
+    jobs = {}
+    for name, hdf_path in plan_output_names(hdf_paths):
+        output_path = os.path.join(output_dir, name + PRODUCTS.get(product, ''))
+        jobs[name] = {'name': name, 'hdf_path': hdf_path, 'output_path': output_path,
+                      'status': 'pending', 'seconds': None, 'error': None}
+
+    print(f"Extracting {product} from {len(jobs)} plans with {workers or os.cpu_count()} workers")
+    batch_start = time.perf_counter()
+    def collect(futures, crashed):
+        for future in as_completed(futures):
+            name = futures[future]
+            try:
+                jobs[name].update(future.result())
+            except BrokenProcessPool:
+                crashed.append(name)
+                continue
+            print(f"{jobs[name]['status']:>6}  {jobs[name]['seconds']:8.2f} s  {name}"
+                  + (f"  ({jobs[name]['error']})" if jobs[name]['error'] else ""))
+
+    # A worker that dies (e.g. a crash inside HDF5) breaks the pool, and every unfinished job
+    # lands in crashed, not only the one that crashed
+    crashed = []
+    with ProcessPoolExecutor(max_workers=workers, initializer=limit_worker_memory,
+                             initargs=(memory_limit_mb,)) as pool:
+        collect({pool.submit(extract_plan, jobs[name]['hdf_path'], jobs[name]['output_path'],
+                             product, resolution, cache_dir, terrain_path): name for name in jobs}, crashed)
+
+    # Those jobs are rerun concurrently, each in its own single-worker pool, so only a file that
+    # crashes its worker on its own counts a retry; repeat offenders are marked failed
+    attempts = {name: 0 for name in jobs}
+    pending = sorted(crashed)
+    while pending:
+        crashed = []
+        with ThreadPoolExecutor(max_workers=workers or os.cpu_count()) as threads:
+            collect({threads.submit(extract_plan_isolated, jobs[name]['hdf_path'], jobs[name]['output_path'],
+                                    product, resolution, cache_dir, terrain_path, memory_limit_mb): name
+                     for name in pending}, crashed)
+        pending = []
+        for name in sorted(crashed):
+            attempts[name] += 1
+            if attempts[name] > MAX_CRASH_RETRIES:
+                jobs[name].update(status='failed', error='Worker process crashed')
+                print(f"failed  {name}  (worker process crashed)")
+            else:
+                pending.append(name)
+
+    results = [jobs[name] for name in sorted(jobs)]
+    failed = [result for result in results if result['status'] != 'ok']
+    print(f"Finished {len(results) - len(failed)} of {len(results)} plans in "
+          f"{time.perf_counter() - batch_start:.1f} s")
+    for result in failed:
+        print(f"Failed: {result['hdf_path']}: {result['error']}")
+    return results
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Extract results from many HEC-RAS plan HDF files in parallel.")
+    parser.add_argument("source", help="Project directory or glob of .p##.hdf files")
+    parser.add_argument("output_dir", help="Output folder")
+    parser.add_argument("--product", choices=tuple(PRODUCTS), default="points", help="Output product")
+    parser.add_argument("--resolution", type=float, default=1, help="Raster resolution")
+    parser.add_argument("--workers", type=int, default=None, help="Number of worker processes")
+    parser.add_argument("--memory-limit-mb", type=float, default=None, help="Per-worker memory limit")
+    parser.add_argument("--terrain", default=None, help="Terrain GeoTIFF for subgrid depth maps")
+    args = parser.parse_args()
+
+    batch_extract(args.source, args.output_dir, args.product, args.resolution, args.workers, args.memory_limit_mb,
+                  terrain_path=args.terrain)
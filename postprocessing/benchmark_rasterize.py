@@ -0,0 +1,118 @@
+"""
+Benchmarks the vectorized cell-center rasterizer against the original Point-per-cell path.
+
+A synthetic mesh of jittered cell centers is generated, rasterized with both engines onto
+the same grid and the timings are printed. The original path (one shapely Point per cell
+handed to rasterio.features.rasterize) is slow on millions of cells, so its run can be
+limited to a subset of the mesh with --legacy-cells and the timing extrapolated.
+
+Usage:
+    python -m postprocessing.benchmark_rasterize --cells 5000000 --resolution 1
+"""
+
+import argparse
+import time
+
+import numpy as np
+from rasterio.transform import from_bounds
+
+from postprocessing.raster_engine import rasterize_cell_values
+
+
+def make_synthetic_mesh(n_cells, cell_size=2.0, seed=0):
+    """
+    Creates jittered cell centers on a square grid, roughly like a regular 2D flow area mesh.
+
+    Parameters:
+        n_cells (int): Number of cells.
+        cell_size (float): Nominal spacing between cell centers.
+        seed (int): Random seed.
+
+    Returns:
+        tuple: (x_coords, y_coords, data)
+    """
+    rng = np.random.default_rng(seed)
+    side = int(np.ceil(np.sqrt(n_cells)))
+    index = np.arange(n_cells)
+    x_coords = 500000.0 + (index % side) * cell_size + rng.uniform(-0.3, 0.3, n_cells) * cell_size
+    y_coords = 4400000.0 + (index // side) * cell_size + rng.uniform(-0.3, 0.3, n_cells) * cell_size
+    data = rng.uniform(2000.0, 2100.0, n_cells).astype(np.float32)
+    return x_coords, y_coords, data
+
+
+def legacy_rasterize(x_coords, y_coords, data, transform, width, height):
+    # The original rasterize_points implementation, kept here for comparison only
+    import geopandas as gpd
+    from rasterio.features import rasterize
+    from shapely.geometry import Point
+
+    gdf = gpd.GeoDataFrame({
+        'value': data,
+        'geometry': [Point(x, y) for x, y in zip(x_coords, y_coords)]
+    })
+    return rasterize(
+        [(geom, value) for geom, value in zip(gdf.geometry, gdf['value'])],
+        out_shape=(height, width),
+        transform=transform,
+        fill=0,
+        all_touched=True,
+        dtype='float32'
+    )
+
+
+def run_benchmark(n_cells=5000000, resolution=1.0, legacy_cells=None, reduction="max"):
+    """
+    Times both rasterizers on a synthetic mesh and prints the speedup.
+
+    Parameters:
+        n_cells (int): Number of cells in the synthetic mesh.
+        resolution (float): Output pixel size.
+        legacy_cells (int): Number of cells to run the original path on. None runs it on the
+            full mesh, 0 skips it.
+        reduction (str): Reduction rule for the vectorized rasterizer.
+
+    Returns:
+        dict: Timings in seconds.
+    """
+    x_coords, y_coords, data = make_synthetic_mesh(n_cells)
+    x_min, x_max = x_coords.min(), x_coords.max()
+    y_min, y_max = y_coords.min(), y_coords.max()
+    width = int((x_max - x_min) / resolution)
+    height = int((y_max - y_min) / resolution)
+    transform = from_bounds(x_min, y_min, x_max, y_max, width, height)
+    print(f"Synthetic mesh: {n_cells} cells, grid {height} x {width} at {resolution} m")
+
+    start_time = time.perf_counter()
+    rasterize_cell_values(x_coords, y_coords, data, transform, width, height, reduction=reduction)
+    vectorized_time = time.perf_counter() - start_time
+    print(f"Vectorized rasterizer ({reduction}): {vectorized_time:.2f} s")
+    timings = {"vectorized": vectorized_time}
+
+    if legacy_cells is None:
+        legacy_cells = n_cells
+    if legacy_cells:
+        legacy_cells = min(legacy_cells, n_cells)
+        start_time = time.perf_counter()
+        legacy_rasterize(x_coords[:legacy_cells], y_coords[:legacy_cells], data[:legacy_cells],
+                         transform, width, height)
+        legacy_time = time.perf_counter() - start_time
+        # Both paths scale linearly with the number of cells
+        legacy_time_full = legacy_time * n_cells / legacy_cells
+        print(f"Point-per-cell rasterizer: {legacy_time:.2f} s on {legacy_cells} cells "
+              f"(~{legacy_time_full:.2f} s for {n_cells} cells)")
+        print(f"Speedup: ~{legacy_time_full / vectorized_time:.1f}x")
+        timings["legacy"] = legacy_time_full
+
+    return timings
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Benchmark cell-center rasterization.")
+    parser.add_argument("--cells", type=int, default=5000000, help="Number of synthetic cells")
+    parser.add_argument("--resolution", type=float, default=1.0, help="Output pixel size")
+    parser.add_argument("--legacy-cells", type=int, default=500000,
+                        help="Cells to run the original path on (0 skips it)")
+    parser.add_argument("--reduction", default="max", help="max, min, mean or last")
+    args = parser.parse_args()
+
+    run_benchmark(args.cells, args.resolution, args.legacy_cells, args.reduction)
@@ -0,0 +1,264 @@
+"""
+Cell-center velocity vectors reconstructed from HEC-RAS face velocities.
+
+HEC-RAS stores only the velocity normal to each face ('Face Velocity'). The velocity vector
+of a cell is the least-squares fit to the normal velocities of its faces, weighted by face
+length: V = (sum w n n^T)^-1 sum w n u. Every term of that fit is fixed by the mesh, so it is
+folded once into two sparse (cells x faces) matrices Bx and By. Reconstructing a timestep is
+then one sparse mat-vec, and a block of timesteps one sparse mat-mat. The time series is
+streamed in blocks of timesteps, keeping per-cell maximum speed and maximum depth x
+velocity (flood hazard) without holding the whole series in memory.
+
+Usage:
+    python -m postprocessing.cell_velocity ME_Valleys.p01.hdf out_dir --area ME_Valley
+"""
+
+import argparse
+import os
+
+import numpy as np
+from scipy import sparse
+
+from postprocessing.point_export import export_points_table
+from postprocessing.ras_hdf import RasPlanResults
+from postprocessing.raster_writer import crs_from_hdf
+from postprocessing.save_results_as_tif import rasterize_points
+from postprocessing.time_series_reducer import DEFAULT_MAX_MEMORY_MB
+
+# Cells whose face normals do not span the plane (perimeter ghost cells) get no velocity
+SINGULAR_TOLERANCE = 1e-9
+
+
+def build_velocity_operator(plan, area):
+    """
+    Builds the sparse least-squares operator that maps face velocities to cell velocities.
+
+    Parameters:
+        plan (RasPlanResults): Open plan.
+        area (str): Name of the 2D flow area.
+
+    Returns:
+        dict: 'bx' and 'by' (cells x faces CSR matrices, so vx = bx @ u and vy = by @ u),
+        'valid' (cells whose faces determine a velocity) and 'n_cells'.
+    """
+    face_cells = plan.geometry(area, 'Faces Cell Indexes')
+    normals = plan.geometry(area, 'Faces NormalUnitVector and Length')
+    n_cells = len(plan.geometry(area, 'Cells Center Coordinate'))
+    n_faces = len(face_cells)
+
+    # One entry per (cell, face) pair; both cells of a face see the same normal and velocity
+    faces = np.repeat(np.arange(n_faces), 2)
+    cells = face_cells.ravel().astype(np.int64)
+    keep = (cells >= 0) & (cells < n_cells)
+    faces, cells = faces[keep], cells[keep]
+    nx, ny, weight = normals[faces, 0], normals[faces, 1], normals[faces, 2]
+
+    # Per-cell normal matrix M = sum w n n^T and its closed-form 2 x 2 inverse
+    m00 = np.bincount(cells, weight * nx * nx, minlength=n_cells)
+    m01 = np.bincount(cells, weight * nx * ny, minlength=n_cells)
+    m11 = np.bincount(cells, weight * ny * ny, minlength=n_cells)
+    det = m00 * m11 - m01 * m01
+    valid = det > SINGULAR_TOLERANCE * np.maximum((m00 + m11) ** 2, np.finfo(float).tiny)
+    safe_det = np.where(valid, det, 1.0)
+    inv00, inv01, inv11 = m11 / safe_det, -m01 / safe_det, m00 / safe_det
+
+    # V = M^-1 sum w n u, folded into one coefficient per (cell, face)
+    scale = np.where(valid[cells], weight, 0.0)
+    bx_data = (inv00[cells] * nx + inv01[cells] * ny) * scale
+    by_data = (inv01[cells] * nx + inv11[cells] * ny) * scale
+    shape = (n_cells, n_faces)
+    return {
+        'bx': sparse.csr_matrix((bx_data, (cells, faces)), shape=shape),
+        'by': sparse.csr_matrix((by_data, (cells, faces)), shape=shape),
+        'valid': valid,
+        'n_cells': n_cells,
+    }
+
+
+def reconstruct_velocity(operator, face_velocity):
+    """
+    Reconstructs cell velocities from the face velocities of one or more timesteps.
+
+    Parameters:
+        operator (dict): Operator from build_velocity_operator.
+        face_velocity (np.ndarray): (faces,) for one timestep or (timesteps, faces) for a block.
+
+    Returns:
+        tuple: (vx, vy) with the shape of face_velocity, faces replaced by cells. NaN where a
+        cell has no velocity.
+    """
+    face_velocity = np.asarray(face_velocity, dtype=np.float64)
+    # Sparse mat-vec for one timestep, sparse mat-mat for a (faces x timesteps) block
+    vx = (operator['bx'] @ face_velocity.T).T
+    vy = (operator['by'] @ face_velocity.T).T
+    invalid = ~operator['valid']
+    vx[..., invalid] = np.nan
+    vy[..., invalid] = np.nan
+    return vx, vy
+
+
+def iter_timestep_blocks(dataset, max_memory_mb=DEFAULT_MAX_MEMORY_MB, row_bytes=None):
+    """
+    Reads a (time x columns) dataset in blocks of whole timesteps aligned to its chunks.
+
+    Parameters:
+        dataset (h5py.Dataset): 2D (time x faces or cells) dataset.
+        max_memory_mb (float): Memory budget for one block and what is derived from it.
+        row_bytes (int): Bytes needed per timestep. Defaults to one row of the dataset.
+
+    Yields:
+        tuple: (t0, block) with block = dataset[t0:t0 + len(block), :].
+    """
+    n_times, n_columns = dataset.shape
+    chunk_times = dataset.chunks[0] if dataset.chunks else 1
+    row_bytes = row_bytes or n_columns * dataset.dtype.itemsize
+    time_block = max(int(max_memory_mb * 1024 * 1024 // row_bytes) // chunk_times, 1) * chunk_times
+    for t0 in range(0, n_times, time_block):
+        yield t0, dataset[t0:min(t0 + time_block, n_times), :]
+
+
+def velocity_summary(plan, area, max_memory_mb=DEFAULT_MAX_MEMORY_MB):
+    """
+    Streams the face velocity time series and keeps per-cell velocity and hazard maxima.
+
+    Parameters:
+        plan (RasPlanResults): Open plan.
+        area (str): Name of the 2D flow area.
+        max_memory_mb (float): Memory budget for one block of timesteps.
+
+    Returns:
+        dict: 'max_speed', 'max_velocity_x' and 'max_velocity_y' (vector at the time of the
+        maximum speed), 'time_of_max_speed', and 'max_hazard' (maximum of depth x speed; None
+        if the plan has neither depth nor water surface output).
+    """
+    operator = build_velocity_operator(plan, area)
+    n_cells = operator['n_cells']
+    face_velocity = plan.time_series(area, 'Face Velocity', access='timestep')
+
+    # Depth per timestep: the Depth output, or water surface minus cell minimum elevation
+    variables = plan.variables(area)['time_series']
+    depth_dataset, min_elevation = None, 0.0
+    if 'Depth' in variables:
+        depth_dataset = plan.time_series(area, 'Depth', access='timestep')
+    elif 'Water Surface' in variables:
+        depth_dataset = plan.time_series(area, 'Water Surface', access='timestep')
+        min_elevation = plan.geometry(area, 'Cells Minimum Elevation')
+
+    max_speed = np.full(n_cells, -np.inf)
+    max_vx = np.full(n_cells, np.nan)
+    max_vy = np.full(n_cells, np.nan)
+    index_of_max = np.zeros(n_cells, dtype=np.int64)
+    max_hazard = np.full(n_cells, -np.inf) if depth_dataset is not None else None
+
+    # A block holds the face velocities plus vx, vy, speed (and depth) for every cell
+    row_bytes = face_velocity.shape[1] * 8 + n_cells * 8 * 4
+    for t0, block in iter_timestep_blocks(face_velocity, max_memory_mb, row_bytes):
+        vx, vy = reconstruct_velocity(operator, block)
+        speed = np.hypot(vx, vy)
+
+        # Block maximum and the timestep it first occurs at; all-NaN cells stay at -inf
+        filled = np.where(np.isnan(speed), -np.inf, speed)
+        block_argmax = np.argmax(filled, axis=0)
+        columns = np.arange(n_cells)
+        block_max = filled[block_argmax, columns]
+        is_new_max = block_max > max_speed
+        max_speed[is_new_max] = block_max[is_new_max]
+        max_vx[is_new_max] = vx[block_argmax, columns][is_new_max]
+        max_vy[is_new_max] = vy[block_argmax, columns][is_new_max]
+        index_of_max[is_new_max] = t0 + block_argmax[is_new_max]
+
+        if depth_dataset is not None:
+            depth = np.maximum(depth_dataset[t0:t0 + block.shape[0], :] - min_elevation, 0.0)
+            np.fmax(max_hazard, np.nanmax(np.where(np.isnan(speed), -np.inf, depth * speed), axis=0),
+                    out=max_hazard)
+
+    times = plan.times
+    if times is None:
+        times = np.arange(face_velocity.shape[0], dtype=np.float64)
+    never = ~np.isfinite(max_speed)
+    max_speed[never] = np.nan
+    summary = {
+        'max_speed': max_speed,
+        'max_velocity_x': max_vx,
+        'max_velocity_y': max_vy,
+        'time_of_max_speed': np.where(never, np.nan, times[index_of_max]),
+        'max_hazard': None,
+    }
+    if max_hazard is not None:
+        max_hazard[~np.isfinite(max_hazard)] = np.nan
+        summary['max_hazard'] = max_hazard
+    return summary
+
+
+def cell_velocity_at(plan, area, timestep, operator=None):
+    """
+    Velocity vector and speed of every cell at one timestep.
+
+    Parameters:
+        plan (RasPlanResults): Open plan.
+        area (str): Name of the 2D flow area.
+        timestep (int): Timestep index.
+        operator (dict): Prebuilt operator, to reuse it across timesteps.
+
+    Returns:
+        tuple: (vx, vy, speed) arrays, one value per cell.
+    """
+    if operator is None:
+        operator = build_velocity_operator(plan, area)
+    vx, vy = reconstruct_velocity(operator, plan.timestep(area, 'Face Velocity', timestep))
+    return vx, vy, np.hypot(vx, vy)
+
+
+def write_velocity_products(hdf_path, output_dir, areas=None, products=('raster',), resolution=1,
+                            max_memory_mb=DEFAULT_MAX_MEMORY_MB, points_format='.parquet'):
+    """
+    Writes per-cell velocity and hazard summaries of every 2D flow area of a plan.
+
+    Parameters:
+        hdf_path (str): Path to the plan HDF file.
+        output_dir (str): Output folder.
+        areas (list): 2D flow areas. None processes every area with face velocity output.
+        products (tuple): 'raster' (one GeoTIFF per statistic) and/or 'points' (one point file
+            per area with every statistic as a column).
+        resolution (float): Raster resolution.
+        max_memory_mb (float): Memory budget for one block of timesteps.
+        points_format (str): '.parquet' or '.fgb'.
+
+    Returns:
+        list: Paths of the written files.
+    """
+    os.makedirs(output_dir, exist_ok=True)
+    written = []
+    with RasPlanResults(hdf_path) as plan:
+        crs = crs_from_hdf(plan)
+        for area in (plan.areas if areas is None else areas):
+            if 'Face Velocity' not in plan.variables(area)['time_series']:
+                print(f"Warning: no Face Velocity output for {area}, skipping.")
+                continue
+            summary = {name: values for name, values in velocity_summary(plan, area, max_memory_mb).items()
+                       if values is not None}
+            x_coords, y_coords = plan.cell_centers(area)
+
+            if 'raster' in products:
+                x_min, y_min, x_max, y_max = plan.bounds(area)
+                for name, values in summary.items():
+                    rasterize_points(x_coords, y_coords, values, x_min, y_min, x_max, y_max, resolution,
+                                     output_dir, f"{area}_{name}", crs=crs)
+                    written.append(os.path.join(output_dir, f"{area}_{name}.tif"))
+            if 'points' in products:
+                output_path = os.path.join(output_dir, f"{area}_velocity{points_format}")
+                export_points_table(x_coords, y_coords, summary, output_path, crs=crs)
+                written.append(output_path)
+    return written
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Cell velocity and hazard summaries from HEC-RAS face velocities.")
+    parser.add_argument("hdf_path", help="Plan HDF file")
+    parser.add_argument("output_dir", help="Output folder")
+    parser.add_argument("--area", action="append", default=None, help="2D flow area (repeatable); default all")
+    parser.add_argument("--products", nargs="+", choices=("raster", "points"), default=["raster"])
+    parser.add_argument("--resolution", type=float, default=1, help="Raster resolution")
+    args = parser.parse_args()
+
+    write_velocity_products(args.hdf_path, args.output_dir, args.area, tuple(args.products), args.resolution)
@@ -0,0 +1,224 @@
+"""
+Depth and wet/dry rasters computed from the plan HDF, without RAS Mapper exports.
+
+Depth rasters used to come from RAS Mapper ('Depth (Max).Terrain...tif'), which needs the
+Windows GUI and a manual export per plan before copy_exported_hec_tifs.py and
+copy_ras_tifs_to_folder.py gather the files. Here depth is water surface minus ground,
+computed with NumPy straight from the HDF, so every plan of a batch can be mapped on Linux.
+
+Two modes:
+    cell     Depth per cell = water surface - 'Cells Minimum Elevation', drawn on the cell
+             polygons. Fast, no terrain needed, but as coarse as the mesh.
+    subgrid  Depth per terrain pixel = water surface of the cell the pixel lies in - terrain
+             elevation, like RAS Mapper. The terrain GeoTIFF is read in row strips (only the
+             part under the mesh) and each strip gets its own pixel -> cell index, built
+             from the cells overlapping it and cached per strip, so memory is bounded by
+             the strip size (about 16 bytes per strip pixel for index and terrain).
+
+Depth is 0 on dry pixels inside the mesh and nodata outside it; the wet/dry raster is 1 for
+wet, 0 for dry and 255 outside the mesh.
+"""
+
+import os
+
+import numpy as np
+import rasterio
+from rasterio.windows import Window
+
+from postprocessing.mesh_rasterizer import gather_cell_values, load_or_build_index, read_cell_shapes
+from postprocessing.ras_hdf import RasPlanResults, geometry_hash
+from postprocessing.raster_writer import crs_from_hdf, write_raster, write_tiled
+from postprocessing.time_series_reducer import DEFAULT_WET_DEPTH
+
+DEPTH_MODES = ('cell', 'subgrid')
+
+# Water surface the depth is computed from
+DEFAULT_WSE_VARIABLE = 'Maximum Water Surface'
+
+# Terrain rows read and written per strip in subgrid mode (a multiple of the output block size)
+DEFAULT_STRIP_ROWS = 512
+
+# Nodata of the uint8 wet/dry raster
+WET_DRY_NODATA = 255
+
+
+def read_water_surface(plan, area, variable=DEFAULT_WSE_VARIABLE):
+    # Summary water surface of every cell, or the last timestep of a time series variable
+    if variable in plan.variables(area)['summary']:
+        return np.asarray(plan.summary_values(area, variable), dtype=np.float64)
+    return np.asarray(plan.timestep(area, variable, -1), dtype=np.float64)
+
+
+def cell_depths(plan, area, water_surface):
+    """
+    Depth of every cell above its minimum elevation.
+
+    Parameters:
+        plan (RasPlanResults): Open plan.
+        area (str): Name of the 2D flow area.
+        water_surface (np.ndarray): Water surface of every cell.
+
+    Returns:
+        np.ndarray: Depth per cell, 0 where the cell is dry and NaN where the water surface is.
+    """
+    min_elevation = plan.geometry(area, 'Cells Minimum Elevation')
+    return np.maximum(water_surface - min_elevation, 0.0)
+
+
+def terrain_window(terrain, plan, area):
+    """
+    Window of the terrain raster that covers the mesh of a 2D flow area.
+
+    Parameters:
+        terrain (rasterio.DatasetReader): Open terrain raster (north-up).
+        plan (RasPlanResults): Open plan.
+        area (str): Name of the 2D flow area.
+
+    Returns:
+        rasterio.windows.Window: Pixel window, clipped to the terrain extent.
+    """
+    facepoints = plan.geometry(area, 'FacePoints Coordinate')
+    (x_min, y_min), (x_max, y_max) = facepoints.min(axis=0), facepoints.max(axis=0)
+    transform = terrain.transform
+    col0 = max(int(np.floor((x_min - transform.c) / transform.a)), 0)
+    col1 = min(int(np.ceil((x_max - transform.c) / transform.a)), terrain.width)
+    row0 = max(int(np.floor((y_max - transform.f) / transform.e)), 0)
+    row1 = min(int(np.ceil((y_min - transform.f) / transform.e)), terrain.height)
+    if col1 <= col0 or row1 <= row0:
+        raise ValueError(f"The mesh of {area} does not overlap the terrain {terrain.name}.")
+    return Window(col0, row0, col1 - col0, row1 - row0)
+
+
+def iter_subgrid_depth(terrain, window, strip_index, water_surface, strip_rows=DEFAULT_STRIP_ROWS, nodata=np.nan):
+    """
+    Computes pixel depths strip by strip from the terrain and the cell water surfaces.
+
+    Parameters:
+        terrain (rasterio.DatasetReader): Open terrain raster.
+        window (Window): Part of the terrain under the mesh, see terrain_window.
+        strip_index (callable): strip_index(transform, width, height) returns the pixel -> cell
+            index of one strip's grid.
+        water_surface (np.ndarray): Water surface of every cell.
+        strip_rows (int): Rows per strip.
+        nodata (float): Value outside the mesh and where the terrain has no data.
+
+    Yields:
+        tuple: (Window relative to the output grid, float32 depth strip)
+    """
+    width, height = int(window.width), int(window.height)
+    for row0 in range(0, height, strip_rows):
+        rows = min(strip_rows, height - row0)
+        terrain_strip = Window(window.col_off, window.row_off + row0, width, rows)
+        index = strip_index(terrain.window_transform(terrain_strip), width, rows)
+        ground = terrain.read(1, window=terrain_strip, masked=True).astype(np.float64)
+        pixel_ground = ground.ravel()[index['pixels']]
+
+        depth = np.full(rows * width, nodata, dtype=np.float32)
+        pixel_depth = np.maximum(water_surface[index['cells']] - pixel_ground.filled(np.nan), 0.0)
+        pixel_depth[np.ma.getmaskarray(pixel_ground)] = nodata
+        depth[index['pixels']] = pixel_depth
+        yield Window(0, row0, width, rows), depth.reshape(rows, width)
+
+
+def wet_dry(depth, dry_depth=DEFAULT_WET_DEPTH):
+    # 1 wet, 0 dry, WET_DRY_NODATA where the depth is nodata
+    return np.where(np.isfinite(depth), depth > dry_depth, WET_DRY_NODATA).astype(np.uint8)
+
+
+def write_wet_dry_from_depth(depth_path, output_path, crs, dry_depth=DEFAULT_WET_DEPTH, strip_rows=DEFAULT_STRIP_ROWS,
+                             cog=True, compress='DEFLATE'):
+    # Classifies a depth raster strip by strip, so the grid is never held in memory
+    with rasterio.open(depth_path) as depth_raster:
+        def write_strips(dst):
+            for row0 in range(0, depth_raster.height, strip_rows):
+                strip = Window(0, row0, depth_raster.width, min(strip_rows, depth_raster.height - row0))
+                dst.write(wet_dry(depth_raster.read(1, window=strip), dry_depth), 1, window=strip)
+
+        write_tiled(output_path, write_strips, depth_raster.height, depth_raster.width, 1, depth_raster.transform,
+                    crs=crs, nodata=WET_DRY_NODATA, cog=cog, compress=compress, resampling='nearest', dtype='uint8')
+
+
+def write_depth_maps(hdf_path, output_dir, terrain_path=None, resolution=1, areas=None,
+                     variable=DEFAULT_WSE_VARIABLE, dry_depth=DEFAULT_WET_DEPTH, cache_dir=None,
+                     strip_rows=DEFAULT_STRIP_ROWS, cog=True, compress='DEFLATE'):
+    """
+    Writes a depth raster and a wet/dry raster for every 2D flow area of a plan.
+
+    Parameters:
+        hdf_path (str): Path to the plan HDF file.
+        output_dir (str): Output folder.
+        terrain_path (str): Terrain GeoTIFF. Given: subgrid mode on the terrain grid.
+            None: cell mode on a grid of the given resolution.
+        resolution (float): Pixel size in cell mode.
+        areas (list): 2D flow areas to map. None maps every area.
+        variable (str): Water surface variable, 'Maximum Water Surface' by default.
+        dry_depth (float): Depth at or below which a pixel counts as dry.
+        cache_dir (str): Folder for the pixel -> cell indexes, see mesh_rasterizer.
+        strip_rows (int): Terrain rows per strip in subgrid mode.
+        cog (bool): Write Cloud-Optimized GeoTIFFs.
+        compress (str): Raster compression.
+
+    Returns:
+        list: Paths of the written rasters.
+    """
+    os.makedirs(output_dir, exist_ok=True)
+    written = []
+    name = variable.replace('Maximum ', 'Max ').replace(' ', '_')
+
+    with RasPlanResults(hdf_path) as plan:
+        crs = crs_from_hdf(plan)
+        for area in (plan.areas if areas is None else areas):
+            water_surface = read_water_surface(plan, area, variable)
+            depth_path = os.path.join(output_dir, f"{area}_Depth_{name}.tif")
+            wet_dry_path = os.path.join(output_dir, f"{area}_WetDry_{name}.tif")
+
+            if terrain_path is None:
+                # Cell mode: one depth per cell drawn on the cell polygons
+                index = load_or_build_index(plan, area, resolution, cache_dir)
+                depth = gather_cell_values(index, cell_depths(plan, area, water_surface))
+                write_raster(depth_path, depth, index['transform'], crs=crs, cog=cog, compress=compress)
+                write_raster(wet_dry_path, wet_dry(depth, dry_depth), index['transform'], crs=crs,
+                             nodata=WET_DRY_NODATA, cog=cog, compress=compress, resampling='nearest', dtype='uint8')
+            else:
+                # Subgrid mode: one index per terrain strip under the mesh. The cell polygons
+                # are read once, and only if a strip index is not cached yet
+                with rasterio.open(terrain_path) as terrain:
+                    window = terrain_window(terrain, plan, area)
+                    transform = terrain.window_transform(window)
+                    geometry_key = geometry_hash(plan, area)
+                    shapes = {}
+
+                    def cell_shapes(area=area):
+                        if not shapes:
+                            print(f"Building pixel -> cell indexes for {area} "
+                                  f"({int(window.height)} x {int(window.width)} pixels)")
+                            shapes.update(read_cell_shapes(plan, area))
+                        return shapes
+
+                    def strip_index(strip_transform, width, height, area=area):
+                        return load_or_build_index(plan, area, cache_dir=cache_dir, transform=strip_transform,
+                                                   width=width, height=height, shapes=cell_shapes,
+                                                   geometry_key=geometry_key, verbose=False)
+
+                    def write_strips(dst):
+                        for strip, depth in iter_subgrid_depth(terrain, window, strip_index, water_surface,
+                                                               strip_rows):
+                            dst.write(depth, 1, window=strip)
+
+                    write_tiled(depth_path, write_strips, int(window.height), int(window.width), 1, transform,
+                                crs=crs, cog=cog, compress=compress)
+                write_wet_dry_from_depth(depth_path, wet_dry_path, crs, dry_depth, strip_rows, cog, compress)
+
+            written.extend([depth_path, wet_dry_path])
+    return written
+
+
+if __name__ == "__main__":
+    # Depth and wet/dry maps of every plan of a flow ladder, sampled on the project terrain
+    from postprocessing.batch_extract import batch_extract
+
+    project_dir = r"C:\ATD\Hydraulic Models\Bennett_MC\ME"
+    output_dir = r"C:\ATD\Hydraulic Models\Bennett_MC\ME\Output_Depth"
+    terrain_path = r"C:\ATD\Hydraulic Models\Bennett_MC\ME\Terrain\Terrain.ME_DEM.tif"
+
+    batch_extract(project_dir, output_dir, product='depth', terrain_path=terrain_path)
@@ -0,0 +1,328 @@
+"""
+Cell-wise ensemble statistics across many plan HDF files (Monte Carlo realizations).
+
+MC_manning_n.py ranks the realizations of a single node in memory. Here the same statistics
+are computed for every 2D cell across hundreds of plans: percentiles, mean, standard
+deviation and the probability that a cell is inundated. Plans are read one at a time, and
+mean, standard deviation and inundation counts are accumulated as they stream past
+(Welford's update), so they never need all realizations at once.
+
+Percentiles come from one of two modes:
+    exact   Every realization is written into a disk-backed (plans x cells) buffer, which is
+            then sorted block of cells by block of cells. Exact, memory bounded by
+            max_memory_mb, disk use of plans x cells x 4 bytes.
+    approx  A fixed-size reservoir sample is kept per cell and the percentiles are taken from
+            it. Memory is sketch_size x cells regardless of the number of plans; the error
+            shrinks with the sketch size.
+
+Usage:
+    python -m postprocessing.ensemble_stats "C:\\ATD\\Hydraulic Models\\Bennett_MC\\ME" out_dir --area ME_Valley
+"""
+
+import argparse
+import os
+import shutil
+import tempfile
+import time
+
+import numpy as np
+from rasterio.transform import from_bounds
+
+from postprocessing.batch_extract import find_plan_hdfs
+from postprocessing.geometry_cache import load_geometry
+from postprocessing.point_export import export_points_table
+from postprocessing.ras_hdf import RasPlanResults
+from postprocessing.raster_engine import burn_cell_values, cells_to_pixel_indices
+from postprocessing.raster_writer import crs_from_hdf, write_raster
+from postprocessing.time_series_reducer import (ABSOLUTE_VARIABLES, DEFAULT_MAX_MEMORY_MB, DEFAULT_WET_DEPTH,
+                                                reduce_dataset)
+
+# Percentiles written by default, the same ones MC_manning_n.py reports for a single node
+DEFAULT_PERCENTILES = (1, 10, 50, 90, 99)
+
+# Summary variable the statistics are computed for by default
+DEFAULT_VARIABLE = 'Maximum Water Surface'
+
+# Realizations kept per cell in approximate mode
+DEFAULT_SKETCH_SIZE = 128
+
+MODES = ('exact', 'approx')
+
+
+def percentile_name(percentile):
+    # 'p01', 'p50', 'p99', 'p99.9'
+    return f"p{percentile:02g}"
+
+
+def read_plan_values(plan, area, variable, max_memory_mb=DEFAULT_MAX_MEMORY_MB):
+    """
+    Reads one value per cell of a plan: a summary dataset, or the maximum of a time series.
+
+    Parameters:
+        plan (RasPlanResults): Open plan.
+        area (str): Name of the 2D flow area.
+        variable (str): Summary Output dataset (e.g. 'Maximum Water Surface') or Unsteady Time
+            Series dataset (e.g. 'Depth'), which is reduced to its maximum.
+        max_memory_mb (float): Memory budget for time series slabs.
+
+    Returns:
+        np.ndarray: Value of every cell, as float32.
+    """
+    variables = plan.variables(area)
+    if variable in variables['summary']:
+        values = plan.summary_values(area, variable)
+    elif variable in variables['time_series']:
+        values = reduce_dataset(plan.time_series(area, variable, access='timestep'),
+                                absolute=variable in ABSOLUTE_VARIABLES, max_memory_mb=max_memory_mb)['max']
+    else:
+        raise KeyError(f"{variable} not found for {area} in {plan.filename}")
+    return np.asarray(values, dtype=np.float32)
+
+
+def welford_update(state, values):
+    """
+    Adds one realization to running per-cell counts, means and sums of squared deviations.
+
+    Parameters:
+        state (dict): 'count', 'mean' and 'm2' arrays, updated in place.
+        values (np.ndarray): Value of every cell in this realization. NaN values are skipped.
+    """
+    valid = np.isfinite(values)
+    state['count'][valid] += 1
+    delta = np.where(valid, values - state['mean'], 0.0)
+    state['mean'] += np.where(valid, delta / np.maximum(state['count'], 1), 0.0)
+    state['m2'] += np.where(valid, delta * (values - state['mean']), 0.0)
+
+
+def reservoir_update(sketch, values, seen, rng):
+    """
+    Adds one realization to a per-cell reservoir sample (Algorithm R, vectorized over cells).
+
+    Parameters:
+        sketch (np.ndarray): (sketch_size, cells) reservoir, updated in place.
+        values (np.ndarray): Value of every cell in this realization.
+        seen (int): Number of realizations added before this one.
+        rng (np.random.Generator): Random generator.
+    """
+    sketch_size = sketch.shape[0]
+    if seen < sketch_size:
+        sketch[seen] = values
+        return
+    # Each cell keeps the new value with probability sketch_size / (seen + 1), in a random slot
+    slots = rng.integers(0, seen + 1, size=values.shape[0])
+    replace = slots < sketch_size
+    sketch[slots[replace], np.flatnonzero(replace)] = values[replace]
+
+
+def sorted_percentiles(sorted_block, percentiles):
+    """
+    Linear-interpolated percentiles of blocks already sorted along the first axis.
+
+    Matches np.percentile(..., method='linear') without sorting the block once per percentile.
+    NaN values sort to the end and are excluded per cell.
+
+    Parameters:
+        sorted_block (np.ndarray): (realizations, cells) block sorted along axis 0.
+        percentiles (tuple): Percentiles between 0 and 100.
+
+    Returns:
+        np.ndarray: (len(percentiles), cells) array, NaN for cells without any value.
+    """
+    counts = np.isfinite(sorted_block).sum(axis=0)
+    columns = np.arange(sorted_block.shape[1])
+    last = np.maximum(counts - 1, 0)
+    result = np.empty((len(percentiles), sorted_block.shape[1]), dtype=np.float64)
+    for i, percentile in enumerate(percentiles):
+        position = percentile / 100.0 * last
+        lower = np.floor(position).astype(np.int64)
+        upper = np.minimum(lower + 1, last)
+        fraction = position - lower
+        low_values = sorted_block[lower, columns].astype(np.float64)
+        high_values = sorted_block[upper, columns].astype(np.float64)
+        result[i] = np.where(counts > 0, low_values + (high_values - low_values) * fraction, np.nan)
+    return result
+
+
+def ensemble_statistics(hdf_paths, area, variable=DEFAULT_VARIABLE, mode='exact', percentiles=DEFAULT_PERCENTILES,
+                        inundation_depth=DEFAULT_WET_DEPTH, sketch_size=DEFAULT_SKETCH_SIZE,
+                        max_memory_mb=DEFAULT_MAX_MEMORY_MB, work_dir=None, cache_dir=None, seed=0):
+    """
+    Computes per-cell ensemble statistics of one variable across many plans.
+
+    Parameters:
+        hdf_paths (list): Plan HDF files, one per realization. All must share the same mesh.
+        area (str): Name of the 2D flow area.
+        variable (str): Summary or time series variable, see read_plan_values.
+        mode (str): 'exact' (disk-backed sort) or 'approx' (reservoir sketch).
+        percentiles (tuple): Percentiles to compute, between 0 and 100.
+        inundation_depth (float): Depth above the cell minimum elevation at which a cell counts
+            as inundated. Water surface variables are turned into depths with the cell minimum
+            elevation; any other variable is taken to be a depth already.
+        sketch_size (int): Realizations kept per cell in 'approx' mode.
+        max_memory_mb (float): Memory budget for one block of the 'exact' sort.
+        work_dir (str): Folder for the disk-backed buffer. Defaults to the system temp folder.
+        cache_dir (str): Geometry cache folder, see geometry_cache.load_geometry.
+        seed (int): Seed of the reservoir sampling.
+
+    Returns:
+        tuple: (statistics, geometry, crs) where statistics holds 'mean', 'std',
+        'inundation_probability', 'count' and one 'pNN' array per percentile, geometry is the
+        dict from load_geometry and crs the CRS of the first plan.
+    """
+    if mode not in MODES:
+        raise ValueError(f"Unknown mode '{mode}'. Expected one of {MODES}.")
+    if not hdf_paths:
+        raise ValueError("No plan HDF files given.")
+
+    with RasPlanResults(hdf_paths[0]) as plan:
+        geometry = load_geometry(plan, area, cache_dir)
+        crs = crs_from_hdf(plan)
+    n_cells = len(geometry['x_coords'])
+    n_plans = len(hdf_paths)
+    is_water_surface = 'Water Surface' in variable
+    if is_water_surface and geometry['min_elevation'] is None:
+        raise KeyError(f"Cells Minimum Elevation is needed to turn {variable} into depths.")
+
+    state = {'count': np.zeros(n_cells, dtype=np.int64), 'mean': np.zeros(n_cells), 'm2': np.zeros(n_cells)}
+    wet_count = np.zeros(n_cells, dtype=np.int64)
+    rng = np.random.default_rng(seed)
+
+    buffer_dir = None
+    if mode == 'exact':
+        buffer_dir = tempfile.mkdtemp(prefix='ensemble_', dir=work_dir)
+        buffer = np.lib.format.open_memmap(os.path.join(buffer_dir, 'values.npy'), mode='w+',
+                                           dtype=np.float32, shape=(n_plans, n_cells))
+    else:
+        buffer = np.full((min(sketch_size, n_plans), n_cells), np.nan, dtype=np.float32)
+
+    try:
+        # Pass over the plans: running moments, inundation counts, and the buffer or sketch
+        start_time = time.perf_counter()
+        for plan_index, hdf_path in enumerate(hdf_paths):
+            with RasPlanResults(hdf_path) as plan:
+                values = read_plan_values(plan, area, variable, max_memory_mb)
+            if values.shape[0] != n_cells:
+                raise ValueError(f"{hdf_path} has {values.shape[0]} cells for {area}, expected {n_cells}.")
+
+            welford_update(state, values)
+            depth = values - geometry['min_elevation'][:n_cells] if is_water_surface else values
+            wet_count += depth > inundation_depth
+            if mode == 'exact':
+                buffer[plan_index] = values
+            else:
+                reservoir_update(buffer, values, plan_index, rng)
+            print(f"Read plan {plan_index + 1} of {n_plans}: {os.path.basename(hdf_path)} "
+                  f"({time.perf_counter() - start_time:.1f} s)")
+
+        # Percentiles, one block of cells at a time so the sorted block fits the memory budget
+        quantiles = np.empty((len(percentiles), n_cells), dtype=np.float64)
+        column_block = max(int(max_memory_mb * 1024 * 1024 // (buffer.shape[0] * buffer.itemsize)), 1)
+        for c0 in range(0, n_cells, column_block):
+            c1 = min(c0 + column_block, n_cells)
+            block = np.array(buffer[:, c0:c1])
+            block.sort(axis=0)
+            quantiles[:, c0:c1] = sorted_percentiles(block, percentiles)
+    finally:
+        if buffer_dir is not None:
+            del buffer
+            shutil.rmtree(buffer_dir, ignore_errors=True)
+
+    count = state['count']
+    statistics = {
+        'mean': np.where(count > 0, state['mean'], np.nan),
+        'std': np.where(count > 1, np.sqrt(state['m2'] / np.maximum(count - 1, 1)), np.nan),
+        'inundation_probability': wet_count / n_plans,
+        'count': count,
+    }
+    for percentile, values in zip(percentiles, quantiles):
+        statistics[percentile_name(percentile)] = values
+    return statistics, geometry, crs
+
+
+def write_ensemble_products(statistics, geometry, output_dir, prefix, products=('raster',), resolution=1, crs=None,
+                            points_format='.parquet', cog=True, compress='DEFLATE'):
+    """
+    Writes ensemble statistics as one raster per statistic and/or one multi-column point file.
+
+    Parameters:
+        statistics (dict): Output of ensemble_statistics.
+        geometry (dict): Geometry from load_geometry.
+        output_dir (str): Output folder.
+        prefix (str): File name prefix, e.g. 'ME_Valley_Maximum_Water_Surface'.
+        products (tuple): 'raster' and/or 'points'.
+        resolution (float): Raster resolution.
+        crs (str): CRS of the outputs.
+        points_format (str): '.parquet' or '.fgb'.
+        cog (bool): Write Cloud-Optimized GeoTIFFs.
+        compress (str): Raster compression.
+
+    Returns:
+        list: Paths of the written files.
+    """
+    os.makedirs(output_dir, exist_ok=True)
+    x_coords, y_coords = geometry['x_coords'], geometry['y_coords']
+    written = []
+
+    if 'raster' in products:
+        x_min, y_min, x_max, y_max = geometry['bounds']
+        width = int((x_max - x_min) / resolution)
+        height = int((y_max - y_min) / resolution)
+        transform = from_bounds(x_min, y_min, x_max, y_max, width, height)
+        rows, cols, inside = cells_to_pixel_indices(x_coords, y_coords, transform, width, height)
+        for name, values in statistics.items():
+            if name == 'count':
+                continue
+            raster = burn_cell_values(rows, cols, np.asarray(values, dtype=np.float64)[inside], (height, width))
+            output_path = os.path.join(output_dir, f"{prefix}_{name}.tif")
+            write_raster(output_path, raster, transform, crs=crs, cog=cog, compress=compress)
+            written.append(output_path)
+
+    if 'points' in products:
+        output_path = os.path.join(output_dir, f"{prefix}_ensemble{points_format}")
+        export_points_table(x_coords, y_coords, statistics, output_path, crs=crs)
+        written.append(output_path)
+
+    return written
+
+
+def ensemble_exceedance_maps(source, output_dir, area, variable=DEFAULT_VARIABLE, mode='exact',
+                             percentiles=DEFAULT_PERCENTILES, products=('raster',), resolution=1, **kwargs):
+    """
+    Computes ensemble statistics for every plan HDF in a directory or glob and writes them.
+
+    Parameters:
+        source (str or list): Directory, glob pattern, or list of plan HDF paths.
+        output_dir (str): Output folder.
+        area (str): Name of the 2D flow area.
+        variable (str): Variable to compute statistics for.
+        mode (str): 'exact' or 'approx'.
+        percentiles (tuple): Percentiles to compute.
+        products (tuple): 'raster' and/or 'points'.
+        resolution (float): Raster resolution.
+        **kwargs: Passed on to ensemble_statistics.
+
+    Returns:
+        list: Paths of the written files.
+    """
+    hdf_paths = source if isinstance(source, (list, tuple)) else find_plan_hdfs(source)
+    statistics, geometry, crs = ensemble_statistics(hdf_paths, area, variable, mode, percentiles, **kwargs)
+    prefix = f"{area}_{variable}".replace(' ', '_')
+    return write_ensemble_products(statistics, geometry, output_dir, prefix, products, resolution, crs)
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Per-cell ensemble statistics across many HEC-RAS plan HDF files.")
+    parser.add_argument("source", help="Project directory or glob of .p##.hdf files")
+    parser.add_argument("output_dir", help="Output folder")
+    parser.add_argument("--area", required=True, help="2D flow area name")
+    parser.add_argument("--variable", default=DEFAULT_VARIABLE, help="Summary or time series variable")
+    parser.add_argument("--mode", choices=MODES, default="exact", help="Exact sort or approximate sketch")
+    parser.add_argument("--percentiles", type=float, nargs="+", default=list(DEFAULT_PERCENTILES))
+    parser.add_argument("--products", nargs="+", choices=("raster", "points"), default=["raster"])
+    parser.add_argument("--resolution", type=float, default=1, help="Raster resolution")
+    parser.add_argument("--max-memory-mb", type=float, default=DEFAULT_MAX_MEMORY_MB)
+    args = parser.parse_args()
+
+    ensemble_exceedance_maps(args.source, args.output_dir, args.area, args.variable, args.mode,
+                             tuple(args.percentiles), tuple(args.products), args.resolution,
+                             max_memory_mb=args.max_memory_mb)
@@ -0,0 +1,245 @@
+"""
+Extracts every 2D flow area and every requested result variable of a plan in one file open.
+
+Areas are discovered under 'Geometry/2D Flow Areas' and variables under 'Summary Output'
+and 'Unsteady Time Series', so nothing is hard-coded to one area name. The file is opened
+once, the geometry of each area is read once (or served from the geometry cache), every
+summary dataset is read with a single hyperslab read, time series are reduced in one
+streaming pass, and all products are written from that.
+"""
+
+import os
+
+import h5py
+import numpy as np
+from rasterio.transform import from_bounds
+
+from postprocessing.point_export import export_points_table
+from postprocessing.ras_hdf import (TIME_SERIES_PATH, geometry_path, list_2d_flow_areas, list_result_variables,
+                                    summary_path, time_series_path)
+from postprocessing.raster_engine import burn_cell_values, cells_to_pixel_indices
+from postprocessing.raster_writer import crs_from_hdf, write_raster
+from postprocessing.save_results_as_tif import get_georeferencing_info
+from postprocessing.time_series_reducer import DEFAULT_MAX_MEMORY_MB, reduce_time_series
+
+# Statistics of a reduced time series that can be written as products
+TIME_SERIES_STATISTICS = ('max', 'min', 'mean', 'time_of_max', 'time_of_first_wet')
+
+
+def read_face_centers(hdf_file, area):
+    # Midpoint of every face, used to place face-based results such as face velocities
+    facepoints = hdf_file[geometry_path(area, 'FacePoints Coordinate')][()]
+    face_facepoints = hdf_file[geometry_path(area, 'Faces FacePoint Indexes')][()]
+    centers = facepoints[face_facepoints].mean(axis=1)
+    return centers[:, 0], centers[:, 1]
+
+
+def read_summary_values(dataset):
+    # Summary datasets hold one row of values, or a row of values followed by a row of times
+    if dataset.ndim == 1:
+        return dataset[()]
+    return dataset[0, :]
+
+
+def product_name(area, variable, statistic=None):
+    # 'MW_Valley_Maximum_Water_Surface' or 'MW_Valley_Water_Surface_max'
+    parts = [area, variable] + ([statistic] if statistic else [])
+    return '_'.join(part.replace(' ', '_') for part in parts)
+
+
+def collect_area_values(hdf_file, area, summary_variables=None, time_series_variables=(),
+                        statistics=('max',), max_memory_mb=DEFAULT_MAX_MEMORY_MB):
+    """
+    Reads every requested result of one 2D flow area.
+
+    Parameters:
+        hdf_file (h5py.File): Open plan HDF file.
+        area (str): Name of the 2D flow area.
+        summary_variables (list): Summary Output datasets to read. None reads all of them.
+        time_series_variables (list): Unsteady Time Series datasets to reduce. None reduces all.
+        statistics (tuple): Statistics of each time series to keep, see TIME_SERIES_STATISTICS.
+        max_memory_mb (float): Memory budget for time series slabs.
+
+    Returns:
+        dict: {product name: values}, one value per cell or per face.
+    """
+    available = list_result_variables(hdf_file, area)
+    if summary_variables is None:
+        summary_variables = available['summary']
+    if time_series_variables is None:
+        time_series_variables = [name for name in available['time_series'] if name not in ('Time', 'Time Date Stamp')]
+
+    values = {}
+    for variable in summary_variables:
+        if variable not in available['summary']:
+            print(f"Warning: {variable} not found in Summary Output for {area}, skipping.")
+            continue
+        values[product_name(area, variable)] = read_summary_values(hdf_file[summary_path(area, variable)])
+
+    if time_series_variables:
+        reduced = reduce_time_series(hdf_file, area, time_series_variables, max_memory_mb=max_memory_mb)
+        for variable, stats in reduced.items():
+            for statistic in statistics:
+                if stats.get(statistic) is not None:
+                    values[product_name(area, variable, statistic)] = stats[statistic]
+    return values
+
+
+def extract_plan_products(hdf_path, output_dir, areas=None, summary_variables=None, time_series_variables=(),
+                          statistics=('max',), products=('raster',), resolution=1, cache_dir=None,
+                          max_memory_mb=DEFAULT_MAX_MEMORY_MB, points_format='.parquet', raster_stack=False,
+                          cog=True, compress='DEFLATE'):
+    """
+    Extracts all requested areas and variables of a plan and writes every product in one pass.
+
+    Parameters:
+        hdf_path (str): Path to the plan HDF file.
+        output_dir (str): Folder for the products.
+        areas (list): 2D flow areas to extract. None extracts every area in the plan.
+        summary_variables (list): Summary Output datasets, e.g. ['Maximum Water Surface'].
+            None extracts all of them.
+        time_series_variables (list): Unsteady Time Series datasets to reduce, e.g.
+            ['Water Surface', 'Depth']. None reduces all of them; the default reduces none.
+        statistics (tuple): Statistics written for each time series variable.
+        products (tuple): 'raster' (one GeoTIFF per variable) and/or 'points' (one point file
+            per area holding every cell variable as a column, plus one for face variables).
+        resolution (float): Raster resolution.
+        cache_dir (str): Geometry cache folder, see geometry_cache.load_geometry.
+        max_memory_mb (float): Memory budget for time series slabs.
+        points_format (str): Point file format, '.parquet' (GeoParquet), '.fgb' (FlatGeobuf)
+            or '.shp' (one shapefile per variable, as before).
+        raster_stack (bool): Write all variables of an area as named bands of one
+            '<area>_stack.tif' instead of one file per variable.
+        cog (bool): Write Cloud-Optimized GeoTIFFs, see raster_writer.write_raster.
+        compress (str): Raster compression, 'DEFLATE' or 'ZSTD'.
+
+    Returns:
+        list: Paths of the written products.
+    """
+    os.makedirs(output_dir, exist_ok=True)
+    written = []
+
+    with h5py.File(hdf_path, 'r') as hdf_file:
+        crs = crs_from_hdf(hdf_file)
+        plan_areas = list_2d_flow_areas(hdf_file)
+        for area in (plan_areas if areas is None else areas):
+            if area not in plan_areas:
+                print(f"Warning: 2D flow area {area} not found in {hdf_path}, skipping.")
+                continue
+
+            values = collect_area_values(hdf_file, area, summary_variables, time_series_variables,
+                                         statistics, max_memory_mb)
+            if not values:
+                continue
+
+            # Cell and face locations; faces are only read when a face variable was requested
+            x_coords, y_coords, x_min, y_min, x_max, y_max = get_georeferencing_info(hdf_file, cache_dir, area)
+            locations = {len(x_coords): (x_coords, y_coords)}
+            if any(len(data) not in locations for data in values.values()):
+                face_x, face_y = read_face_centers(hdf_file, area)
+                locations[len(face_x)] = (face_x, face_y)
+
+            # One grid per area; pixel indices are computed once per location type
+            width = int((x_max - x_min) / resolution)
+            height = int((y_max - y_min) / resolution)
+            transform = from_bounds(x_min, y_min, x_max, y_max, width, height)
+            pixel_indices = {}
+            point_columns = {}
+            stack_bands = {}
+
+            for name, data in values.items():
+                if len(data) not in locations:
+                    print(f"Warning: {name} has {len(data)} values, matching neither cells nor faces; skipping.")
+                    continue
+                x, y = locations[len(data)]
+
+                if 'raster' in products:
+                    if len(data) not in pixel_indices:
+                        pixel_indices[len(data)] = cells_to_pixel_indices(x, y, transform, width, height)
+                    rows, cols, inside = pixel_indices[len(data)]
+                    raster = burn_cell_values(rows, cols, np.asarray(data)[inside], (height, width))
+                    if raster_stack:
+                        stack_bands[name[len(area) + 1:]] = raster
+                    else:
+                        output_path = os.path.join(output_dir, f"{name}.tif")
+                        write_raster(output_path, raster, transform, crs=crs, cog=cog, compress=compress)
+                        written.append(output_path)
+
+                if 'points' in products:
+                    # Column named after the variable, without the area prefix
+                    point_columns.setdefault(len(data), {})[name[len(area) + 1:]] = data
+
+            if stack_bands:
+                output_path = os.path.join(output_dir, f"{area}_stack.tif")
+                write_raster(output_path, list(stack_bands.values()), transform, crs=crs,
+                             band_names=list(stack_bands), cog=cog, compress=compress)
+                written.append(output_path)
+
+            # One point file per area and location type, with every variable as a column
+            for count, columns in point_columns.items():
+                x, y = locations[count]
+                if points_format == '.shp':
+                    for column, data in columns.items():
+                        output_path = os.path.join(output_dir, f"{area}_{column}.shp")
+                        export_points_table(x, y, {'value': data}, output_path, crs=crs)
+                        written.append(output_path)
+                    continue
+                kind = 'cells' if count == len(x_coords) else 'faces'
+                output_path = os.path.join(output_dir, f"{area}_{kind}{points_format}")
+                export_points_table(x, y, columns, output_path, crs=crs)
+                written.append(output_path)
+
+    return written
+
+
+def extract_timestep_stack(hdf_path, area, variable, timesteps, output_path, resolution=1, cache_dir=None,
+                           cog=True, compress='DEFLATE'):
+    """
+    Writes several timesteps of a time series variable as the bands of one raster.
+
+    Parameters:
+        hdf_path (str): Path to the plan HDF file.
+        area (str): Name of the 2D flow area.
+        variable (str): Cell-based Unsteady Time Series dataset, e.g. 'Water Surface'.
+        timesteps (list): Timestep indices to write, one band each. Negative indices count
+            from the end (-1 is the last timestep); repeated indices are written once, and
+            the bands are in timestep order.
+        output_path (str): Path of the output .tif file.
+        resolution (float): Raster resolution.
+        cache_dir (str): Geometry cache folder.
+        cog (bool): Write a Cloud-Optimized GeoTIFF.
+        compress (str): Raster compression.
+    """
+    with h5py.File(hdf_path, 'r') as hdf_file:
+        crs = crs_from_hdf(hdf_file)
+        x_coords, y_coords, x_min, y_min, x_max, y_max = get_georeferencing_info(hdf_file, cache_dir, area)
+        dataset = hdf_file[time_series_path(area, variable)]
+        n_times = dataset.shape[0]
+        out_of_range = [int(step) for step in timesteps if not -n_times <= int(step) < n_times]
+        if out_of_range:
+            raise IndexError(f"Timesteps {out_of_range} are out of range for {n_times} timesteps of {variable}.")
+        # h5py reads a list of rows in one call when the indices are increasing and unique
+        timesteps = sorted(set(int(step) % n_times for step in timesteps))
+        rows = dataset[timesteps, :]
+        stamp_path = f'{TIME_SERIES_PATH}/Time Date Stamp'
+        if stamp_path in hdf_file:
+            stamps = hdf_file[stamp_path][timesteps]
+            band_names = [stamp.decode() if isinstance(stamp, bytes) else str(stamp) for stamp in stamps]
+        else:
+            band_names = [f"{variable} t{step}" for step in timesteps]
+
+    width = int((x_max - x_min) / resolution)
+    height = int((y_max - y_min) / resolution)
+    transform = from_bounds(x_min, y_min, x_max, y_max, width, height)
+    pixel_rows, pixel_cols, inside = cells_to_pixel_indices(x_coords, y_coords, transform, width, height)
+    bands = [burn_cell_values(pixel_rows, pixel_cols, row[inside], (height, width)) for row in rows]
+    write_raster(output_path, bands, transform, crs=crs, band_names=band_names, cog=cog, compress=compress)
+
+
+if __name__ == "__main__":
+    hdf_path = r"C:\ATD\Hydraulic Models\Bennett_MC\ME\ME_Valleys.p01.hdf"
+    output_dir = r"C:\ATD\Hydraulic Models\Bennett_MC\ME\Output_HDF_All"
+
+    # Every area, every summary variable, plus the maximum of the water surface and depth time series
+    extract_plan_products(hdf_path, output_dir, time_series_variables=['Water Surface', 'Depth'],
+                          products=('raster', 'points'), resolution=1)
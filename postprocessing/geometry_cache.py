@@ -0,0 +1,184 @@
+"""
+On-disk cache of 2D flow area geometry shared by every plan that uses the same geometry file.
+
+Monte Carlo and flow-ladder batches run many plans against one .g##, yet every plan HDF
+carries its own copy of the geometry and each extraction used to decompress it again. The
+geometry is fingerprinted (by the geometry file's size and modification time plus the plan's
+cell count, or by hashing the coordinate bytes), its coordinates, bounds, cell areas and minimum elevations are saved
+once as .npy files, and later extractions get them back memory-mapped.
+"""
+
+import hashlib
+import json
+import os
+import shutil
+import tempfile
+
+import numpy as np
+
+from postprocessing.ras_hdf import geometry_hash, geometry_path
+
+# Default folder for cached geometry, created next to the plan HDF
+DEFAULT_CACHE_DIR_NAME = 'geometry_cache'
+
+# Cached arrays and the geometry dataset each one comes from
+CACHED_DATASETS = {
+    'coords': 'Cells Center Coordinate',
+    'cell_areas': 'Cells Surface Area',
+    'min_elevation': 'Cells Minimum Elevation',
+}
+
+# Geometries already loaded in this process, keyed by cache folder
+_loaded = {}
+
+
+def find_geometry_file(hdf_file):
+    """
+    Finds the geometry file a plan HDF was computed with.
+
+    Parameters:
+        hdf_file (h5py.File): Open plan HDF file.
+
+    Returns:
+        str: Path of the geometry HDF (.g##.hdf), or the geometry text file (.g##) if that is
+        all there is, or None if the plan does not name one or it is missing.
+    """
+    plan_info = hdf_file.get('Plan Data/Plan Information')
+    if plan_info is None or 'Geometry File' not in plan_info.attrs:
+        return None
+    geometry_ext = plan_info.attrs['Geometry File']
+    geometry_ext = geometry_ext.decode() if isinstance(geometry_ext, bytes) else str(geometry_ext)
+
+    # ME_Valleys.p01.hdf -> ME_Valleys.g01.hdf
+    plan_path = os.path.abspath(hdf_file.filename)
+    base_name = os.path.basename(plan_path).split('.')[0]
+    for candidate in (f"{base_name}.{geometry_ext}.hdf", f"{base_name}.{geometry_ext}"):
+        candidate_path = os.path.join(os.path.dirname(plan_path), candidate)
+        if os.path.exists(candidate_path):
+            return candidate_path
+    return None
+
+
+def geometry_fingerprint(hdf_file, area, method='auto'):
+    """
+    Fingerprints the geometry of a 2D flow area.
+
+    Parameters:
+        hdf_file (h5py.File): Open plan HDF file.
+        area (str): Name of the 2D flow area.
+        method (str): 'stat' uses the size and modification time of the plan's geometry file
+            and the plan's cell count, which costs no HDF data reads. 'hash' hashes the cell
+            center coordinates. 'auto' uses 'stat' when the geometry file is found and was not
+            modified after the plan HDF (whose mesh may then differ), and 'hash' otherwise.
+
+    Returns:
+        str: Hex digest identifying the geometry.
+    """
+    if method not in ('auto', 'stat', 'hash'):
+        raise ValueError(f"Unknown fingerprint method '{method}'. Expected 'auto', 'stat' or 'hash'.")
+
+    if method in ('auto', 'stat'):
+        geometry_file = find_geometry_file(hdf_file)
+        if geometry_file is not None:
+            stat = os.stat(geometry_file)
+            edited_after_plan = stat.st_mtime_ns > os.stat(hdf_file.filename).st_mtime_ns
+            if method == 'stat' or not edited_after_plan:
+                # The plan's own cell count (HDF metadata) tells meshes of one file name apart
+                shape = hdf_file[geometry_path(area, CACHED_DATASETS['coords'])].shape
+                key = f"{area}|{os.path.basename(geometry_file)}|{stat.st_size}|{stat.st_mtime_ns}|{shape}"
+                return 'stat-' + hashlib.sha1(key.encode()).hexdigest()
+        elif method == 'stat':
+            raise FileNotFoundError(f"Geometry file of {hdf_file.filename} not found.")
+
+    return 'hash-' + geometry_hash(hdf_file, area, datasets=('Cells Center Coordinate',))
+
+
+def write_geometry(hdf_file, area, folder):
+    """
+    Saves the cached geometry arrays of a 2D flow area into a folder.
+
+    Parameters:
+        hdf_file (h5py.File): Open plan HDF file.
+        area (str): Name of the 2D flow area.
+        folder (str): Destination folder. It is written under a temporary name and renamed
+            into place, so a concurrent reader never sees a partial entry.
+    """
+    parent = os.path.dirname(folder)
+    os.makedirs(parent, exist_ok=True)
+    temp_folder = tempfile.mkdtemp(dir=parent, prefix='.tmp_')
+    try:
+        for key, name in CACHED_DATASETS.items():
+            path = geometry_path(area, name)
+            if path in hdf_file:
+                np.save(os.path.join(temp_folder, f"{key}.npy"), hdf_file[path][()])
+
+        coords = np.load(os.path.join(temp_folder, 'coords.npy'), mmap_mode='r')
+        x_min, y_min = coords.min(axis=0)
+        x_max, y_max = coords.max(axis=0)
+        with open(os.path.join(temp_folder, 'bounds.json'), 'w') as file:
+            json.dump({'area': area, 'bounds': [float(x_min), float(y_min), float(x_max), float(y_max)]}, file)
+        del coords
+
+        os.replace(temp_folder, folder)
+    except OSError:
+        # Another process finished the same entry first
+        shutil.rmtree(temp_folder, ignore_errors=True)
+        if not os.path.exists(os.path.join(folder, 'bounds.json')):
+            raise
+
+
+def load_geometry(hdf_file, area, cache_dir=None, method='auto'):
+    """
+    Returns the geometry of a 2D flow area, from the cache when the geometry was seen before.
+
+    Parameters:
+        hdf_file (h5py.File): Open plan HDF file.
+        area (str): Name of the 2D flow area.
+        cache_dir (str): Cache folder. Defaults to a 'geometry_cache' folder next to the HDF file.
+        method (str): Fingerprint method, see geometry_fingerprint.
+
+    Returns:
+        dict: 'fingerprint', 'folder' (cache entry, where derived data such as the cell search
+        tree can be stored), 'coords' (n x 2, memory-mapped), 'x_coords', 'y_coords', 'bounds'
+        (x_min, y_min, x_max, y_max), 'cell_areas' and 'min_elevation' (None if the plan
+        does not have them).
+    """
+    if cache_dir is None:
+        cache_dir = os.path.join(os.path.dirname(os.path.abspath(hdf_file.filename)), DEFAULT_CACHE_DIR_NAME)
+
+    fingerprint = geometry_fingerprint(hdf_file, area, method)
+    folder = os.path.join(cache_dir, fingerprint)
+    if folder in _loaded:
+        return _loaded[folder]
+
+    if not os.path.exists(os.path.join(folder, 'bounds.json')):
+        print(f"Caching geometry of {area}: {folder}")
+        write_geometry(hdf_file, area, folder)
+    geometry = read_geometry(folder, fingerprint)
+
+    # An entry that does not match the plan's mesh is stale; it is rebuilt from this plan
+    n_cells = hdf_file[geometry_path(area, CACHED_DATASETS['coords'])].shape[0]
+    if len(geometry['coords']) != n_cells:
+        print(f"Warning: cached geometry {folder} has {len(geometry['coords'])} cells, "
+              f"{hdf_file.filename} has {n_cells}. Rebuilding it.")
+        geometry = None
+        shutil.rmtree(folder, ignore_errors=True)
+        write_geometry(hdf_file, area, folder)
+        geometry = read_geometry(folder, fingerprint)
+
+    _loaded[folder] = geometry
+    return geometry
+
+
+def read_geometry(folder, fingerprint):
+    # Loads a cache entry, memory-mapping its arrays
+    with open(os.path.join(folder, 'bounds.json')) as file:
+        bounds = tuple(json.load(file)['bounds'])
+
+    geometry = {'fingerprint': fingerprint, 'folder': folder, 'bounds': bounds}
+    for key in CACHED_DATASETS:
+        array_path = os.path.join(folder, f"{key}.npy")
+        geometry[key] = np.load(array_path, mmap_mode='r') if os.path.exists(array_path) else None
+    geometry['x_coords'] = geometry['coords'][:, 0]
+    geometry['y_coords'] = geometry['coords'][:, 1]
+    return geometry
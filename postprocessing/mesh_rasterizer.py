@@ -0,0 +1,276 @@
+"""
+Rasterizes 2D flow area results onto the true cell polygons of the mesh.
+
+Stamping cell centers leaves holes and aliasing wherever the mesh is coarser or finer than
+the output grid. Here the cell polygons are built from 'Cells FacePoint Indexes' and
+'FacePoints Coordinate', burned once into a sparse pixel -> cell index, and that index is
+saved to disk keyed by a hash of the geometry, the area and the grid. Every plan that shares
+the geometry reuses the index, and rasterizing a result vector is then a single NumPy gather.
+"""
+
+import hashlib
+import os
+import tempfile
+
+import h5py
+import numpy as np
+from rasterio.features import rasterize
+from rasterio.transform import Affine, from_origin
+import shapely
+from shapely.geometry import Polygon
+
+from postprocessing.ras_hdf import geometry_hash, geometry_path, summary_path
+from postprocessing.raster_writer import crs_from_hdf, write_raster
+
+# Default folder for persisted pixel -> cell indexes, created next to the plan HDF
+DEFAULT_CACHE_DIR_NAME = 'mesh_index_cache'
+
+
+def read_cell_polygons(hdf_file, area):
+    """
+    Builds the polygon of every cell of a 2D flow area.
+
+    Parameters:
+        hdf_file (h5py.File): Open plan or geometry HDF file.
+        area (str): Name of the 2D flow area.
+
+    Returns:
+        tuple: (polygons, cell_ids) with the shapely polygons and the index of the cell each
+        one belongs to. Ghost cells on the perimeter (fewer than 3 face points) are left out.
+    """
+    facepoints = hdf_file[geometry_path(area, 'FacePoints Coordinate')][()]
+    cell_facepoints = hdf_file[geometry_path(area, 'Cells FacePoint Indexes')][()]
+
+    # Face point lists are padded with -1 up to the widest cell
+    vertex_counts = (cell_facepoints >= 0).sum(axis=1)
+
+    polygons = []
+    cell_ids = []
+    # Cells with the same number of vertices are built together with the vectorized constructor
+    for count in np.unique(vertex_counts):
+        if count < 3:
+            continue
+        ids = np.flatnonzero(vertex_counts == count)
+        coords = facepoints[cell_facepoints[ids, :count]]
+        if hasattr(shapely, 'polygons'):
+            polygons.extend(shapely.polygons(coords))
+        else:
+            polygons.extend(Polygon(ring) for ring in coords)
+        cell_ids.append(ids)
+
+    cell_ids = np.concatenate(cell_ids) if cell_ids else np.empty(0, dtype=np.int64)
+    return polygons, cell_ids
+
+
+def read_cell_shapes(hdf_file, area):
+    """
+    Reads the cell polygons of a 2D flow area with their bounding boxes, for building indexes
+    of many small grids (e.g. terrain strips) without rebuilding the polygons for each one.
+
+    Returns:
+        dict: 'polygons', 'cell_ids' (see read_cell_polygons) and 'bounds' ((n, 4) array of
+        min x, min y, max x, max y per polygon).
+    """
+    polygons, cell_ids = read_cell_polygons(hdf_file, area)
+    if hasattr(shapely, 'bounds'):
+        bounds = shapely.bounds(np.asarray(polygons, dtype=object)).reshape(-1, 4)
+    else:
+        bounds = np.array([polygon.bounds for polygon in polygons], dtype=np.float64).reshape(-1, 4)
+    return {'polygons': polygons, 'cell_ids': cell_ids, 'bounds': bounds}
+
+
+def mesh_grid(hdf_file, area, resolution):
+    """
+    Defines a north-up grid covering the mesh of a 2D flow area at the given resolution.
+
+    Parameters:
+        hdf_file (h5py.File): Open plan or geometry HDF file.
+        area (str): Name of the 2D flow area.
+        resolution (float): Pixel size.
+
+    Returns:
+        tuple: (transform, width, height)
+    """
+    facepoints = hdf_file[geometry_path(area, 'FacePoints Coordinate')][()]
+    x_min, y_min = facepoints.min(axis=0)
+    x_max, y_max = facepoints.max(axis=0)
+    width = max(int(np.ceil((x_max - x_min) / resolution)), 1)
+    height = max(int(np.ceil((y_max - y_min) / resolution)), 1)
+    return from_origin(x_min, y_max, resolution, resolution), width, height
+
+
+def build_pixel_cell_index(hdf_file, area, transform, width, height, shapes=None):
+    """
+    Burns the cell polygons into a sparse pixel -> cell index.
+
+    A pixel belongs to the cell whose polygon contains the pixel center, so the mesh tiles
+    the grid without holes or overlaps. The grid is rasterized whole (4 bytes per pixel) and
+    the index keeps 12 bytes per covered pixel, so large grids should be indexed in strips.
+
+    Parameters:
+        hdf_file (h5py.File): Open plan or geometry HDF file.
+        area (str): Name of the 2D flow area.
+        transform (affine.Affine): Affine transform of the output grid.
+        width (int): Number of columns in the output grid.
+        height (int): Number of rows in the output grid.
+        shapes (dict): Preloaded cell polygons from read_cell_shapes; only the cells whose
+            bounds overlap the grid are burned. Read from the file when None.
+
+    Returns:
+        dict: 'pixels' (sorted flat pixel indexes covered by the mesh), 'cells' (cell index of
+        each of those pixels), and the grid 'transform', 'width' and 'height'.
+    """
+    if shapes is None:
+        polygons, cell_ids = read_cell_polygons(hdf_file, area)
+    else:
+        # Cells whose bounding box overlaps the grid extent
+        x0, y1 = transform * (0, 0)
+        x1, y0 = transform * (width, height)
+        bounds = shapes['bounds']
+        overlap = np.flatnonzero((bounds[:, 0] < max(x0, x1)) & (bounds[:, 2] > min(x0, x1))
+                                 & (bounds[:, 1] < max(y0, y1)) & (bounds[:, 3] > min(y0, y1)))
+        polygons = [shapes['polygons'][i] for i in overlap]
+        cell_ids = shapes['cell_ids'][overlap]
+    if not polygons:
+        return {'pixels': np.empty(0, dtype=np.int64), 'cells': np.empty(0, dtype=np.int32),
+                'transform': transform, 'width': width, 'height': height}
+    cell_grid = rasterize(
+        zip(polygons, cell_ids.astype(np.int32)),
+        out_shape=(height, width),
+        transform=transform,
+        fill=-1,  # Pixels outside the mesh
+        all_touched=False,  # Pixel centers decide the owning cell
+        dtype='int32'
+    ).ravel()
+
+    pixels = np.flatnonzero(cell_grid >= 0)
+    return {
+        'pixels': pixels.astype(np.int64),
+        'cells': cell_grid[pixels],
+        'transform': transform,
+        'width': width,
+        'height': height,
+    }
+
+
+def index_cache_path(cache_dir, geometry_key, area, transform, width, height):
+    # Cache files are keyed by the geometry hash and the exact grid they were built for
+    grid_key = hashlib.sha1(f'{tuple(transform)[:6]}{width}x{height}'.encode()).hexdigest()[:12]
+    safe_area = ''.join(c if c.isalnum() else '_' for c in area)
+    return os.path.join(cache_dir, f"{geometry_key[:16]}_{safe_area}_{grid_key}.npz")
+
+
+def load_or_build_index(hdf_file, area, resolution=None, cache_dir=None, transform=None, width=None, height=None,
+                        shapes=None, geometry_key=None, verbose=True):
+    """
+    Returns the pixel -> cell index of a 2D flow area, building and saving it on first use.
+
+    Parameters:
+        hdf_file (h5py.File): Open plan or geometry HDF file.
+        area (str): Name of the 2D flow area.
+        resolution (float): Pixel size of a grid covering the mesh. Ignored when transform,
+            width and height are given.
+        cache_dir (str): Folder for persisted indexes. Defaults to a 'mesh_index_cache' folder
+            next to the HDF file.
+        transform (affine.Affine): Optional grid transform, e.g. to match a terrain raster.
+        width (int): Optional grid width.
+        height (int): Optional grid height.
+        shapes (dict or callable): Preloaded cell polygons (read_cell_shapes), or a function
+            returning them, called only if the index has to be built.
+        geometry_key (str): Precomputed geometry_hash of the area, to skip rehashing the mesh
+            when many grids of one area are indexed.
+        verbose (bool): Print when an index is built and saved.
+
+    Returns:
+        dict: The index, as returned by build_pixel_cell_index.
+    """
+    if transform is None:
+        transform, width, height = mesh_grid(hdf_file, area, resolution)
+    if cache_dir is None:
+        cache_dir = os.path.join(os.path.dirname(os.path.abspath(hdf_file.filename)), DEFAULT_CACHE_DIR_NAME)
+
+    geometry_key = geometry_key or geometry_hash(hdf_file, area)
+    cache_path = index_cache_path(cache_dir, geometry_key, area, transform, width, height)
+    if os.path.exists(cache_path):
+        with np.load(cache_path) as cached:
+            return {
+                'pixels': cached['pixels'],
+                'cells': cached['cells'],
+                'transform': Affine(*cached['transform']),
+                'width': int(cached['width']),
+                'height': int(cached['height']),
+            }
+
+    if verbose:
+        print(f"Building pixel -> cell index for {area} ({height} x {width} pixels)")
+    index = build_pixel_cell_index(hdf_file, area, transform, width, height,
+                                   shapes=shapes() if callable(shapes) else shapes)
+
+    # Written under a temporary name and renamed, so parallel workers sharing the geometry never
+    # load a half-written index
+    os.makedirs(cache_dir, exist_ok=True)
+    handle, temp_path = tempfile.mkstemp(dir=cache_dir, suffix='.npz')
+    try:
+        with os.fdopen(handle, 'wb') as file:
+            np.savez(file, pixels=index['pixels'], cells=index['cells'],
+                     transform=np.array(tuple(transform)[:6]), width=width, height=height)
+        os.replace(temp_path, cache_path)
+    except BaseException:
+        if os.path.exists(temp_path):
+            os.remove(temp_path)
+        raise
+    if verbose:
+        print(f"Saved pixel -> cell index: {cache_path}")
+    return index
+
+
+def gather_cell_values(index, values, nodata=np.nan, dtype='float32'):
+    """
+    Rasterizes a result vector with a prebuilt pixel -> cell index.
+
+    Parameters:
+        index (dict): Pixel -> cell index from load_or_build_index.
+        values (np.ndarray): One value per cell of the 2D flow area.
+        nodata (float): Value for pixels outside the mesh.
+        dtype (str): Data type of the output array.
+
+    Returns:
+        np.ndarray: The (height, width) raster.
+    """
+    raster = np.full(index['height'] * index['width'], nodata, dtype=dtype)
+    raster[index['pixels']] = np.asarray(values)[index['cells']]
+    return raster.reshape(index['height'], index['width'])
+
+
+def rasterize_mesh_values(hdf_path, area, values, resolution, output_path, cache_dir=None, nodata=np.nan, cog=True):
+    """
+    Rasterizes one value per cell onto the mesh polygons and saves it as a GeoTIFF.
+
+    Parameters:
+        hdf_path (str): Path to the plan HDF file.
+        area (str): Name of the 2D flow area.
+        values (np.ndarray): One value per cell.
+        resolution (float): Pixel size.
+        output_path (str): Path of the output GeoTIFF.
+        cache_dir (str): Folder for persisted pixel -> cell indexes.
+        nodata (float): Value for pixels outside the mesh.
+        cog (bool): Write a Cloud-Optimized GeoTIFF, see raster_writer.write_raster.
+    """
+    with h5py.File(hdf_path, 'r') as hdf_file:
+        index = load_or_build_index(hdf_file, area, resolution, cache_dir)
+        crs = crs_from_hdf(hdf_file)
+
+    raster = gather_cell_values(index, values, nodata=nodata)
+    write_raster(output_path, raster, index['transform'], crs=crs, nodata=nodata, cog=cog)
+
+
+if __name__ == "__main__":
+    # Rasterize the maximum water surface of a plan onto the mesh polygons
+    hdf_path = r"C:\ATD\Hydraulic Models\Bennett_Test\MW_Valleys.p01.hdf"
+    output_path = r"C:\ATD\Hydraulic Models\Bennett_Test\Output_HDF\Max_Water_Surface_Mesh.tif"
+    area = "MW_Valley"
+    resolution = 1
+
+    with h5py.File(hdf_path, 'r') as hdf_file:
+        max_ws = hdf_file[summary_path(area, 'Maximum Water Surface')][0, :]
+    rasterize_mesh_values(hdf_path, area, max_ws, resolution, output_path)
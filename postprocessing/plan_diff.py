@@ -0,0 +1,264 @@
+"""
+Cell-level differences between plans that share a geometry.
+
+Compares plans (a roughness or boundary condition change against a baseline, or every plan
+of a batch against the next) cell by cell instead of side by side in RAS Mapper. For every
+pair and variable (maximum water surface, maximum depth, time of maximum, arrival time) the
+difference is written as a raster or a point file, and a summary row records how many cells
+changed beyond a tolerance, the RMS and largest difference, and how many cells flipped
+between wet and dry.
+
+Any number of pairs runs in one call: the geometry, its pixel indices and every plan's
+values are read once and reused by every pair the plan takes part in.
+
+Usage:
+    python -m postprocessing.plan_diff ME_Valleys.p01.hdf "C:\\ATD\\Hydraulic Models\\Bennett_MC\\ME" out_dir --area ME_Valley
+"""
+
+import argparse
+import csv
+import os
+from collections import OrderedDict
+
+import numpy as np
+
+from postprocessing.batch_extract import find_plan_hdfs, plan_output_names
+from postprocessing.geometry_cache import load_geometry
+from postprocessing.mesh_rasterizer import gather_cell_values, load_or_build_index
+from postprocessing.point_export import export_points_table
+from postprocessing.ras_hdf import RasPlanResults
+from postprocessing.raster_writer import crs_from_hdf, write_raster
+from postprocessing.time_series_reducer import DEFAULT_WET_DEPTH, reduce_dataset
+
+# Variables that can be differenced and how each is read
+#   max_wse          Summary 'Maximum Water Surface', value row
+#   max_depth        max_wse - 'Cells Minimum Elevation'
+#   time_of_max_wse  Summary 'Maximum Water Surface', time row (days)
+#   arrival_time     First timestep the cell is wet, from the 'Water Surface' time series (days)
+DIFF_VARIABLES = ('max_wse', 'max_depth', 'time_of_max_wse', 'arrival_time')
+DEFAULT_DIFF_VARIABLES = ('max_wse', 'max_depth')
+
+# Differences at or below this are not counted as changed (model units, days for times)
+DEFAULT_TOLERANCE = 0.01
+
+# Cells per block when differencing
+DEFAULT_BLOCK_SIZE = 1000000
+
+# Plans whose values are kept in memory while pairs are processed
+DEFAULT_PLAN_CACHE_SIZE = 8
+
+
+def read_diff_values(plan, area, variables, min_elevation, wet_depth=DEFAULT_WET_DEPTH):
+    """
+    Reads the per-cell values of a plan that the differences are computed from.
+
+    Parameters:
+        plan (RasPlanResults): Open plan.
+        area (str): Name of the 2D flow area.
+        variables (tuple): Names from DIFF_VARIABLES.
+        min_elevation (np.ndarray): Cell minimum elevations, shared by every plan of the geometry.
+            None (not in the plan) allows only the water surface variables.
+        wet_depth (float): Depth at which a cell counts as wet.
+
+    Returns:
+        dict: {variable: values} plus 'wet' (boolean, cell wet at its maximum water surface;
+        None without minimum elevations).
+    """
+    unknown = set(variables) - set(DIFF_VARIABLES)
+    if unknown:
+        raise ValueError(f"Unknown diff variables {sorted(unknown)}. Expected any of {DIFF_VARIABLES}.")
+
+    summary = plan.summary(area, 'Maximum Water Surface')
+    max_wse = np.asarray(summary[0, :] if summary.ndim == 2 else summary[()], dtype=np.float64)
+    if min_elevation is None:
+        needs_depth = [variable for variable in variables if variable in ('max_depth', 'arrival_time')]
+        if needs_depth:
+            raise KeyError(f"Cells Minimum Elevation of {area} is needed for {', '.join(needs_depth)}.")
+        depth = None
+    else:
+        depth = max_wse - min_elevation
+
+    values = {'wet': None if depth is None else depth > wet_depth}
+    if 'max_wse' in variables:
+        values['max_wse'] = max_wse
+    if 'max_depth' in variables:
+        values['max_depth'] = np.maximum(depth, 0.0)
+    if 'time_of_max_wse' in variables:
+        values['time_of_max_wse'] = (np.asarray(summary[1, :], dtype=np.float64) if summary.ndim == 2
+                                     else np.full(max_wse.shape, np.nan))
+    if 'arrival_time' in variables:
+        first_wet = reduce_dataset(plan.time_series(area, 'Water Surface', access='timestep'),
+                                   wet_reference=np.asarray(min_elevation),
+                                   wet_depth=wet_depth)['index_of_first_wet']
+        times = plan.times if plan.times is not None else np.arange(first_wet.max() + 1, dtype=np.float64)
+        values['arrival_time'] = np.where(first_wet >= 0, times[np.maximum(first_wet, 0)], np.nan)
+    return values
+
+
+def diff_statistics(base, other, tolerance=DEFAULT_TOLERANCE, block_size=DEFAULT_BLOCK_SIZE):
+    """
+    Differences two value arrays block by block and summarizes the change.
+
+    Parameters:
+        base (np.ndarray): Values of the base plan.
+        other (np.ndarray): Values of the compared plan.
+        tolerance (float): Differences at or below this are not counted as changed.
+        block_size (int): Cells per block.
+
+    Returns:
+        tuple: (difference, statistics) where difference = other - base (NaN where either is
+        NaN) and statistics holds 'compared_cells', 'changed_cells', 'rms', 'max_abs' and 'mean'.
+    """
+    difference = np.empty(len(base), dtype=np.float64)
+    compared = changed = 0
+    sum_squares = total = 0.0
+    max_abs = 0.0
+    for start in range(0, len(base), block_size):
+        stop = min(start + block_size, len(base))
+        block = np.subtract(other[start:stop], base[start:stop], dtype=np.float64)
+        difference[start:stop] = block
+        finite = block[np.isfinite(block)]
+        compared += finite.size
+        changed += int(np.count_nonzero(np.abs(finite) > tolerance))
+        sum_squares += float(np.dot(finite, finite))
+        total += float(finite.sum())
+        if finite.size:
+            max_abs = max(max_abs, float(np.abs(finite).max()))
+
+    statistics = {
+        'compared_cells': compared,
+        'changed_cells': changed,
+        'rms': float(np.sqrt(sum_squares / compared)) if compared else np.nan,
+        'max_abs': max_abs if compared else np.nan,
+        'mean': total / compared if compared else np.nan,
+    }
+    return difference, statistics
+
+
+def baseline_pairs(baseline, hdf_paths):
+    # Every plan against one baseline plan
+    return [(baseline, hdf_path) for hdf_path in hdf_paths if os.path.abspath(hdf_path) != os.path.abspath(baseline)]
+
+
+def consecutive_pairs(hdf_paths):
+    # Every plan against the next one, e.g. the steps of a flow ladder
+    return list(zip(hdf_paths[:-1], hdf_paths[1:]))
+
+
+def diff_plans(pairs, output_dir, area, variables=DEFAULT_DIFF_VARIABLES, tolerance=DEFAULT_TOLERANCE,
+               products=('raster',), resolution=1, wet_depth=DEFAULT_WET_DEPTH, cache_dir=None,
+               plan_cache_size=DEFAULT_PLAN_CACHE_SIZE, points_format='.parquet', cog=True, compress='DEFLATE'):
+    """
+    Differences any number of plan pairs and writes difference products plus a summary table.
+
+    Parameters:
+        pairs (list): (base_hdf_path, other_hdf_path) tuples, see baseline_pairs and
+            consecutive_pairs. Pairs whose plans have different geometries are skipped.
+        output_dir (str): Output folder.
+        area (str): Name of the 2D flow area.
+        variables (tuple): Names from DIFF_VARIABLES.
+        tolerance (float or dict): Change threshold, or {variable: threshold}.
+        products (tuple): 'raster' (one GeoTIFF per pair and variable, plus the wet/dry
+            change) and/or 'points' (one point file per pair, every difference as a column).
+        resolution (float): Raster resolution.
+        wet_depth (float): Depth at which a cell counts as wet.
+        cache_dir (str): Folder for the geometry cache and the pixel -> cell index.
+        plan_cache_size (int): Plans whose values are kept in memory between pairs.
+        points_format (str): '.parquet' or '.fgb'.
+        cog (bool): Write Cloud-Optimized GeoTIFFs.
+        compress (str): Raster compression.
+
+    Returns:
+        list: Summary rows (dicts), also written to 'diff_summary.csv' in output_dir.
+    """
+    os.makedirs(output_dir, exist_ok=True)
+    names = {hdf_path: name for name, hdf_path in plan_output_names(sorted({path for pair in pairs for path in pair}))}
+    plan_values = OrderedDict()
+    grids = {}
+    rows = []
+
+    def values_of(hdf_path):
+        # Values of a plan, read once while it stays among the most recently used plans
+        if hdf_path in plan_values:
+            plan_values.move_to_end(hdf_path)
+            return plan_values[hdf_path]
+        with RasPlanResults(hdf_path) as plan:
+            # The geometry (and its pixel index) is loaded from the first plan that uses it
+            geometry = load_geometry(plan, area, cache_dir)
+            fingerprint = geometry['fingerprint']
+            if fingerprint not in grids:
+                grids[fingerprint] = {
+                    'geometry': geometry,
+                    'crs': crs_from_hdf(plan),
+                    'index': load_or_build_index(plan, area, resolution, cache_dir) if 'raster' in products else None,
+                }
+            entry = {
+                'fingerprint': fingerprint,
+                'values': read_diff_values(plan, area, variables, geometry['min_elevation'], wet_depth),
+            }
+        plan_values[hdf_path] = entry
+        if len(plan_values) > plan_cache_size:
+            plan_values.popitem(last=False)
+        return entry
+
+    for base_path, other_path in pairs:
+        pair_name = f"{names[other_path]}_vs_{names[base_path]}"
+        base, other = values_of(base_path), values_of(other_path)
+        if base['fingerprint'] != other['fingerprint']:
+            print(f"Warning: {base_path} and {other_path} do not share a geometry, skipping.")
+            continue
+        grid = grids[base['fingerprint']]
+
+        differences = {}
+        for variable in variables:
+            threshold = tolerance.get(variable, DEFAULT_TOLERANCE) if isinstance(tolerance, dict) else tolerance
+            difference, statistics = diff_statistics(base['values'][variable], other['values'][variable], threshold)
+            differences[f"{variable}_diff"] = difference
+            rows.append({'pair': pair_name, 'base': base_path, 'other': other_path, 'variable': variable,
+                         'tolerance': threshold, **statistics})
+
+        # Wet/dry flips: +1 newly wet, -1 newly dry, 0 unchanged (skipped without minimum elevations)
+        if base['values']['wet'] is not None:
+            wet_change = other['values']['wet'].astype(np.int8) - base['values']['wet'].astype(np.int8)
+            differences['wet_dry_change'] = wet_change.astype(np.float32)
+            newly_wet, newly_dry = int(np.count_nonzero(wet_change > 0)), int(np.count_nonzero(wet_change < 0))
+            for row in rows[len(rows) - len(variables):]:
+                row.update(newly_wet=newly_wet, newly_dry=newly_dry)
+            print(f"{pair_name}: {newly_wet} cells newly wet, {newly_dry} newly dry")
+
+        if 'raster' in products:
+            for name, difference in differences.items():
+                write_raster(os.path.join(output_dir, f"{pair_name}_{name}.tif"),
+                             gather_cell_values(grid['index'], difference), grid['index']['transform'],
+                             crs=grid['crs'], cog=cog, compress=compress)
+        if 'points' in products:
+            geometry = grid['geometry']
+            export_points_table(geometry['x_coords'], geometry['y_coords'], differences,
+                                os.path.join(output_dir, f"{pair_name}{points_format}"), crs=grid['crs'])
+
+    summary_path = os.path.join(output_dir, 'diff_summary.csv')
+    if rows:
+        with open(summary_path, 'w', newline='') as file:
+            writer = csv.DictWriter(file, fieldnames=list(rows[0]))
+            writer.writeheader()
+            writer.writerows(rows)
+        print(f"Saved diff summary: {summary_path}")
+    return rows
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Cell-level differences between HEC-RAS plans.")
+    parser.add_argument("baseline", help="Baseline plan HDF, or 'consecutive' to compare each plan with the next")
+    parser.add_argument("source", help="Project directory or glob of .p##.hdf files to compare")
+    parser.add_argument("output_dir", help="Output folder")
+    parser.add_argument("--area", required=True, help="2D flow area name")
+    parser.add_argument("--variables", nargs="+", choices=DIFF_VARIABLES, default=list(DEFAULT_DIFF_VARIABLES))
+    parser.add_argument("--tolerance", type=float, default=DEFAULT_TOLERANCE, help="Change threshold")
+    parser.add_argument("--products", nargs="+", choices=("raster", "points"), default=["raster"])
+    parser.add_argument("--resolution", type=float, default=1, help="Raster resolution")
+    args = parser.parse_args()
+
+    hdf_paths = find_plan_hdfs(args.source)
+    pairs = consecutive_pairs(hdf_paths) if args.baseline == 'consecutive' else baseline_pairs(args.baseline, hdf_paths)
+    diff_plans(pairs, args.output_dir, args.area, tuple(args.variables), args.tolerance, tuple(args.products),
+               args.resolution, cache_dir=os.path.join(args.output_dir, 'geometry_cache'))
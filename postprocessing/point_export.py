@@ -0,0 +1,185 @@
+"""
+Columnar point export of 2D cell results (GeoParquet or FlatGeobuf).
+
+Shapefiles are slow to write, capped at 2 GB, limited to 10-character column names and hold
+one attribute table per file, so every variable used to get its own file. Here all value
+columns (max WSE, max depth, time of max, ...) go into a single file. Point geometry is
+encoded as WKB with NumPy in one vectorized step, and rows are streamed in batches (Parquet
+row groups, FlatGeobuf features through an Arrow stream), so millions of cells are never
+held in memory twice.
+"""
+
+import json
+import os
+
+import numpy as np
+import pyarrow as pa
+import pyarrow.parquet as pq
+
+# Output drivers by file extension
+DRIVERS = {'.parquet': 'GeoParquet', '.geoparquet': 'GeoParquet', '.fgb': 'FlatGeobuf', '.shp': 'ESRI Shapefile'}
+
+# Rows per Parquet row group / Arrow batch
+DEFAULT_BATCH_SIZE = 500000
+
+# Little-endian WKB Point: byte order, geometry type, x, y
+_WKB_POINT = np.dtype([('byte_order', 'u1'), ('geometry_type', '<u4'), ('x', '<f8'), ('y', '<f8')])
+
+
+def points_to_wkb(x_coords, y_coords):
+    """
+    Encodes point coordinates as a WKB binary Arrow array without building geometry objects.
+
+    Parameters:
+        x_coords (np.ndarray): X coordinates.
+        y_coords (np.ndarray): Y coordinates.
+
+    Returns:
+        pyarrow.BinaryArray: One 21-byte WKB Point per coordinate pair.
+    """
+    count = len(x_coords)
+    records = np.empty(count, dtype=_WKB_POINT)
+    records['byte_order'] = 1
+    records['geometry_type'] = 1
+    records['x'] = x_coords
+    records['y'] = y_coords
+    offsets = np.arange(0, (count + 1) * _WKB_POINT.itemsize, _WKB_POINT.itemsize, dtype=np.int32)
+    return pa.Array.from_buffers(pa.binary(), count, [None, pa.py_buffer(offsets), pa.py_buffer(records.tobytes())])
+
+
+def record_batches(x_coords, y_coords, columns, batch_size=DEFAULT_BATCH_SIZE):
+    """
+    Yields Arrow record batches of value columns plus a WKB 'geometry' column.
+
+    Parameters:
+        x_coords (np.ndarray): X coordinates of the points.
+        y_coords (np.ndarray): Y coordinates of the points.
+        columns (dict): {column name: array of values}, all the same length as the coordinates.
+        batch_size (int): Rows per batch.
+
+    Yields:
+        pyarrow.RecordBatch
+    """
+    names = list(columns) + ['geometry']
+    for start in range(0, len(x_coords), batch_size):
+        stop = min(start + batch_size, len(x_coords))
+        arrays = [pa.array(np.asarray(values[start:stop])) for values in columns.values()]
+        arrays.append(points_to_wkb(x_coords[start:stop], y_coords[start:stop]))
+        yield pa.RecordBatch.from_arrays(arrays, names=names)
+
+
+def geoparquet_metadata(x_coords, y_coords, crs=None):
+    # 'geo' file metadata as defined by the GeoParquet 1.0 specification
+    column = {
+        'encoding': 'WKB',
+        'geometry_types': ['Point'],
+        'bbox': [float(np.min(x_coords)), float(np.min(y_coords)), float(np.max(x_coords)), float(np.max(y_coords))],
+    }
+    if crs is not None:
+        from pyproj import CRS
+        column['crs'] = CRS.from_user_input(crs).to_json_dict()
+    return {'version': '1.0.0', 'primary_column': 'geometry', 'columns': {'geometry': column}}
+
+
+def write_geoparquet(x_coords, y_coords, columns, output_path, crs=None, batch_size=DEFAULT_BATCH_SIZE,
+                     compression='zstd'):
+    """
+    Writes points and value columns to a GeoParquet file, one row group per batch.
+
+    Parameters:
+        x_coords (np.ndarray): X coordinates of the points.
+        y_coords (np.ndarray): Y coordinates of the points.
+        columns (dict): {column name: array of values}.
+        output_path (str): Path of the .parquet file.
+        crs (str): CRS of the coordinates (WKT, PROJ string or EPSG code), stored as PROJJSON.
+        batch_size (int): Rows per row group.
+        compression (str): Parquet compression codec.
+    """
+    writer = None
+    try:
+        for batch in record_batches(x_coords, y_coords, columns, batch_size):
+            if writer is None:
+                metadata = {b'geo': json.dumps(geoparquet_metadata(x_coords, y_coords, crs)).encode()}
+                writer = pq.ParquetWriter(output_path, batch.schema.with_metadata(metadata), compression=compression)
+            writer.write_batch(batch)
+    finally:
+        if writer is not None:
+            writer.close()
+
+
+def write_flatgeobuf(x_coords, y_coords, columns, output_path, crs=None, batch_size=DEFAULT_BATCH_SIZE,
+                     spatial_index=False):
+    """
+    Writes points and value columns to a FlatGeobuf file, streaming batches to GDAL.
+
+    Requires pyogrio with GDAL 3.8 or newer for the Arrow stream; otherwise the file is
+    written through geopandas in one piece. Without a spatial index the features stay in cell
+    order and GDAL writes them as they arrive; building the index makes GDAL buffer and
+    reorder every feature.
+
+    Parameters:
+        x_coords (np.ndarray): X coordinates of the points.
+        y_coords (np.ndarray): Y coordinates of the points.
+        columns (dict): {column name: array of values}.
+        output_path (str): Path of the .fgb file.
+        crs (str): CRS of the coordinates.
+        batch_size (int): Rows per batch.
+        spatial_index (bool): Build the packed Hilbert R-tree index.
+    """
+    layer_options = {'SPATIAL_INDEX': 'YES' if spatial_index else 'NO'}
+    try:
+        from pyogrio.raw import write_arrow
+    except ImportError:
+        write_arrow = None
+
+    if write_arrow is not None:
+        batches = record_batches(x_coords, y_coords, columns, batch_size)
+        first = next(batches)
+        reader = pa.RecordBatchReader.from_batches(first.schema, _chain(first, batches))
+        write_arrow(reader, output_path, driver='FlatGeobuf', geometry_name='geometry',
+                    geometry_type='Point', crs=crs, layer_options=layer_options)
+        return
+
+    import geopandas as gpd
+    gdf = gpd.GeoDataFrame(columns, geometry=gpd.points_from_xy(x_coords, y_coords), crs=crs)
+    gdf.to_file(output_path, driver='FlatGeobuf', **layer_options)
+
+
+def _chain(first, rest):
+    # Puts the batch that was taken to read the schema back in front of the stream
+    yield first
+    for batch in rest:
+        yield batch
+
+
+def export_points_table(x_coords, y_coords, columns, output_path, crs=None, batch_size=DEFAULT_BATCH_SIZE):
+    """
+    Writes cell points with any number of value columns to a single file.
+
+    The format follows the extension: .parquet (GeoParquet), .fgb (FlatGeobuf), or .shp for
+    the legacy shapefile (column names are truncated to 10 characters).
+
+    Parameters:
+        x_coords (np.ndarray): X coordinates of the points.
+        y_coords (np.ndarray): Y coordinates of the points.
+        columns (dict): {column name: array of values}, e.g. {'max_wse': ..., 'max_depth': ...}.
+        output_path (str): Output file path.
+        crs (str): CRS of the coordinates.
+        batch_size (int): Rows per row group or batch.
+    """
+    driver = DRIVERS.get(os.path.splitext(output_path)[1].lower())
+    if driver is None:
+        raise ValueError(f"Unsupported point output '{output_path}'. Expected one of {tuple(DRIVERS)}.")
+
+    x_coords = np.asarray(x_coords, dtype=np.float64)
+    y_coords = np.asarray(y_coords, dtype=np.float64)
+    if driver == 'GeoParquet':
+        write_geoparquet(x_coords, y_coords, columns, output_path, crs, batch_size)
+    elif driver == 'FlatGeobuf':
+        write_flatgeobuf(x_coords, y_coords, columns, output_path, crs, batch_size)
+    else:
+        import geopandas as gpd
+        gdf = gpd.GeoDataFrame(columns, geometry=gpd.points_from_xy(x_coords, y_coords), crs=crs)
+        gdf.to_file(output_path)
+
+    print(f"Saved points ({driver}, {len(x_coords)} rows, {len(columns)} columns): {output_path}")
@@ -0,0 +1,385 @@
+"""
+Shared locations and small helpers for reading HEC-RAS plan result HDF files (.p##.hdf),
+and RasPlanResults, a reader that opens a plan once and serves its datasets lazily.
+"""
+
+import hashlib
+from collections import OrderedDict
+
+import h5py
+import numpy as np
+
+# Group holding the mesh of every 2D flow area
+GEOMETRY_2D_PATH = 'Geometry/2D Flow Areas'
+
+# Groups holding the unsteady results
+BASE_OUTPUT_PATH = 'Results/Unsteady/Output/Output Blocks/Base Output'
+SUMMARY_2D_PATH = f'{BASE_OUTPUT_PATH}/Summary Output/2D Flow Areas'
+TIME_SERIES_PATH = f'{BASE_OUTPUT_PATH}/Unsteady Time Series'
+TIME_SERIES_2D_PATH = f'{TIME_SERIES_PATH}/2D Flow Areas'
+
+# Group whose 'Solution' attribute tells how the unsteady computation ended
+UNSTEADY_SUMMARY_PATH = 'Results/Unsteady/Summary'
+
+
+def geometry_path(area, name):
+    # Path of a geometry dataset of a 2D flow area, e.g. 'Cells Center Coordinate'
+    return f'{GEOMETRY_2D_PATH}/{area}/{name}'
+
+
+def time_series_path(area, variable):
+    # Path of an unsteady time series dataset of a 2D flow area, e.g. 'Water Surface'
+    return f'{TIME_SERIES_2D_PATH}/{area}/{variable}'
+
+
+def summary_path(area, variable):
+    # Path of a summary output dataset of a 2D flow area, e.g. 'Maximum Water Surface'
+    return f'{SUMMARY_2D_PATH}/{area}/{variable}'
+
+
+def solution_status(hdf_file):
+    # 'Solution' attribute of the unsteady summary, e.g. 'Unsteady Finished Successfully', None if absent
+    summary = hdf_file.get(UNSTEADY_SUMMARY_PATH)
+    if summary is None or 'Solution' not in summary.attrs:
+        return None
+    value = summary.attrs['Solution']
+    return value.decode(errors='replace') if isinstance(value, bytes) else str(value)
+
+
+# Geometry datasets that define the mesh of a 2D flow area; hashing them identifies the geometry
+MESH_DATASETS = ('FacePoints Coordinate', 'Cells FacePoint Indexes')
+
+
+def geometry_hash(hdf_file, area, datasets=MESH_DATASETS):
+    """
+    Hashes the mesh datasets of a 2D flow area.
+
+    Plans that share a geometry file produce the same hash, so anything derived from the mesh
+    only (cell polygons, pixel indexes) can be computed once and reused by every plan.
+
+    Parameters:
+        hdf_file (h5py.File): Open plan or geometry HDF file.
+        area (str): Name of the 2D flow area.
+        datasets (tuple): Geometry datasets to include in the hash.
+
+    Returns:
+        str: Hex digest identifying the geometry.
+    """
+    digest = hashlib.sha1(area.encode())
+    for name in datasets:
+        values = np.ascontiguousarray(hdf_file[geometry_path(area, name)][()])
+        digest.update(f'{name}{values.shape}{values.dtype.str}'.encode())
+        digest.update(values.tobytes())
+    return digest.hexdigest()
+
+
+def list_2d_flow_areas(hdf_file):
+    """
+    Lists the 2D flow areas of a plan or geometry HDF file.
+
+    Parameters:
+        hdf_file (h5py.File): Open plan or geometry HDF file.
+
+    Returns:
+        list: Area names, in the order HEC-RAS stores them.
+    """
+    if GEOMETRY_2D_PATH not in hdf_file:
+        return []
+    group = hdf_file[GEOMETRY_2D_PATH]
+
+    # The 'Attributes' table lists the areas in mesh order; fall back to the area subgroups
+    if 'Attributes' in group and 'Name' in (group['Attributes'].dtype.names or ()):
+        names = [name.decode().strip() if isinstance(name, bytes) else str(name).strip()
+                 for name in group['Attributes']['Name']]
+        return [name for name in names if name in group]
+    return [name for name in group if 'Cells Center Coordinate' in group[name]]
+
+
+def list_result_variables(hdf_file, area):
+    """
+    Lists the result datasets of a 2D flow area.
+
+    Parameters:
+        hdf_file (h5py.File): Open plan HDF file.
+        area (str): Name of the 2D flow area.
+
+    Returns:
+        dict: 'summary' and 'time_series' lists of dataset names, e.g. 'Maximum Water Surface'
+        and 'Water Surface'.
+    """
+    variables = {}
+    for key, root in (('summary', SUMMARY_2D_PATH), ('time_series', TIME_SERIES_2D_PATH)):
+        group = hdf_file.get(f'{root}/{area}')
+        variables[key] = [] if group is None else [
+            name for name, item in group.items() if getattr(item, 'ndim', 0) in (1, 2)]
+    return variables
+
+
+def read_projection(hdf_file):
+    """
+    Reads the coordinate system of a plan or geometry HDF file.
+
+    Parameters:
+        hdf_file (h5py.File): Open plan or geometry HDF file.
+
+    Returns:
+        str: WKT of the projection stored in the root 'Projection' attribute, or None if the
+        project has no projection set.
+    """
+    projection = hdf_file.attrs.get('Projection')
+    if projection is None:
+        return None
+    if isinstance(projection, np.ndarray):
+        projection = projection.item() if projection.size else b''
+    projection = projection.decode() if isinstance(projection, bytes) else str(projection)
+    return projection.strip() or None
+
+
+def read_time_values(hdf_file):
+    """
+    Reads the output times of the unsteady time series.
+
+    Parameters:
+        hdf_file (h5py.File): Open plan HDF file.
+
+    Returns:
+        np.ndarray: Output times in days since the start of the simulation, or None if the
+        plan has no unsteady time series.
+    """
+    time_path = f'{TIME_SERIES_PATH}/Time'
+    if time_path not in hdf_file:
+        return None
+    return np.asarray(hdf_file[time_path][()], dtype=np.float64)
+
+
+def read_time_stamps(hdf_file):
+    """
+    Reads the output date stamps of the unsteady time series.
+
+    Parameters:
+        hdf_file (h5py.File): Open plan HDF file.
+
+    Returns:
+        list: Date stamps as strings, e.g. '01JAN2020 12:00:00', or None if the plan has none.
+    """
+    stamp_path = f'{TIME_SERIES_PATH}/Time Date Stamp'
+    if stamp_path not in hdf_file:
+        return None
+    return [stamp.decode().strip() if isinstance(stamp, bytes) else str(stamp).strip()
+            for stamp in hdf_file[stamp_path][()]]
+
+
+# Chunk cache layouts: 'timestep' reads whole rows (all cells of one or a few timesteps),
+# 'timeseries' reads whole columns (every timestep of a few cells)
+ACCESS_PATTERNS = ('timestep', 'timeseries')
+
+# Chunk cache given to every dataset of an open plan, and the most a tuned dataset may get
+DEFAULT_CHUNK_CACHE_MB = 16
+MAX_CHUNK_CACHE_MB = 256
+
+# Decoded geometry and time arrays kept per open plan
+DEFAULT_LRU_SIZE = 16
+
+
+class RasPlanResults:
+    """
+    Reader for one plan result HDF file (.p##.hdf).
+
+    The file is opened once. Areas, variables and timestamps are resolved once, result
+    datasets are returned as lazy h5py views that support NumPy slicing, and decoded geometry
+    and time arrays are kept in a bounded LRU cache. Datasets opened through time_series get
+    an HDF5 chunk cache sized for how they will be read, so a chunk is not decompressed again
+    for every timestep or every cell.
+
+    The object can be passed wherever an open h5py.File is expected (indexing, 'in', get,
+    attrs and filename are forwarded to the file).
+
+    Usage:
+        with RasPlanResults(hdf_path) as plan:
+            x_coords, y_coords = plan.cell_centers('ME_Valley')
+            water_surface = plan.time_series('ME_Valley', 'Water Surface')
+            last_step = water_surface[-1, :]
+    """
+
+    def __init__(self, hdf_path, lru_size=DEFAULT_LRU_SIZE, chunk_cache_mb=DEFAULT_CHUNK_CACHE_MB):
+        """
+        Parameters:
+            hdf_path (str): Path to the plan HDF file.
+            lru_size (int): Number of decoded geometry and time arrays kept in memory.
+            chunk_cache_mb (float): Default HDF5 chunk cache per dataset, in megabytes.
+        """
+        self.hdf_path = hdf_path
+        self.lru_size = lru_size
+        self.file = h5py.File(hdf_path, 'r', rdcc_nbytes=int(chunk_cache_mb * 1024 * 1024))
+        self._cache = OrderedDict()
+        self._variables = {}
+        self._areas = None
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        self.close()
+
+    def close(self):
+        self._cache.clear()
+        self.file.close()
+
+    # h5py.File look-alike, so module functions that take an open file accept a plan too
+    def __getitem__(self, path):
+        return self.file[path]
+
+    def __contains__(self, path):
+        return path in self.file
+
+    def get(self, path, default=None):
+        return self.file.get(path, default)
+
+    @property
+    def attrs(self):
+        return self.file.attrs
+
+    @property
+    def filename(self):
+        return self.file.filename
+
+    def _cached(self, key, load):
+        # Bounded LRU: the least recently used array is dropped once lru_size is reached
+        if key in self._cache:
+            self._cache.move_to_end(key)
+            return self._cache[key]
+        value = load()
+        self._cache[key] = value
+        if len(self._cache) > self.lru_size:
+            self._cache.popitem(last=False)
+        return value
+
+    @property
+    def areas(self):
+        # 2D flow area names, resolved once
+        if self._areas is None:
+            self._areas = list_2d_flow_areas(self.file)
+        return self._areas
+
+    def variables(self, area):
+        """
+        Returns the 'summary' and 'time_series' result variables of a 2D flow area.
+        """
+        if area not in self._variables:
+            self._variables[area] = list_result_variables(self.file, area)
+        return self._variables[area]
+
+    @property
+    def times(self):
+        # Output times in days, cached
+        return self._cached(('times',), lambda: read_time_values(self.file))
+
+    @property
+    def timestamps(self):
+        # Output date stamps as strings, cached
+        return self._cached(('timestamps',), lambda: read_time_stamps(self.file))
+
+    @property
+    def projection(self):
+        return read_projection(self.file)
+
+    def geometry(self, area, name):
+        """
+        Returns a decoded geometry dataset of a 2D flow area, e.g. 'Cells Minimum Elevation'.
+
+        Parameters:
+            area (str): Name of the 2D flow area.
+            name (str): Geometry dataset name.
+
+        Returns:
+            np.ndarray: The dataset, read once and then served from the LRU cache.
+        """
+        return self._cached(('geometry', area, name), lambda: self.file[geometry_path(area, name)][()])
+
+    def cell_centers(self, area):
+        # X and Y coordinates of the cell centers
+        coords = self.geometry(area, 'Cells Center Coordinate')
+        return coords[:, 0], coords[:, 1]
+
+    def bounds(self, area):
+        # (x_min, y_min, x_max, y_max) of the cell centers
+        def load():
+            coords = self.geometry(area, 'Cells Center Coordinate')
+            (x_min, y_min), (x_max, y_max) = coords.min(axis=0), coords.max(axis=0)
+            return x_min, y_min, x_max, y_max
+        return self._cached(('bounds', area), load)
+
+    def summary(self, area, variable):
+        """
+        Returns a lazy view of a Summary Output dataset, e.g. 'Maximum Water Surface'.
+        """
+        return self.file[summary_path(area, variable)]
+
+    def summary_values(self, area, variable):
+        # The value row of a summary dataset; row 1, when present, holds the time of the value
+        dataset = self.summary(area, variable)
+        return dataset[()] if dataset.ndim == 1 else dataset[0, :]
+
+    def time_series(self, area, variable, access='timestep', cache_mb=None):
+        """
+        Returns a lazy view of an Unsteady Time Series dataset with a chunk cache tuned for access.
+
+        Parameters:
+            area (str): Name of the 2D flow area.
+            variable (str): Time series variable, e.g. 'Water Surface'.
+            access (str): 'timestep' to read whole timesteps (rows), 'timeseries' to read every
+                timestep of selected cells (columns).
+            cache_mb (float): Chunk cache for this dataset. Defaults to one full row (or column)
+                of chunks, capped at MAX_CHUNK_CACHE_MB.
+
+        Returns:
+            h5py.Dataset: (time x cells) view; slicing reads only the requested part.
+        """
+        if access not in ACCESS_PATTERNS:
+            raise ValueError(f"Unknown access pattern '{access}'. Expected one of {ACCESS_PATTERNS}.")
+        path = time_series_path(area, variable)
+        dataset = self.file[path]
+        if dataset.chunks is None or dataset.ndim != 2:
+            return dataset
+
+        # Chunks needed to serve one row (all cells) or one column (all timesteps) of the dataset
+        (n_times, n_columns), (chunk_times, chunk_columns) = dataset.shape, dataset.chunks
+        chunk_bytes = chunk_times * chunk_columns * dataset.dtype.itemsize
+        # HDF5 ignores the access property list of a dataset that is already open
+        del dataset
+        if access == 'timestep':
+            n_chunks = -(-n_columns // chunk_columns)
+        else:
+            n_chunks = -(-n_times // chunk_times)
+        if cache_mb is None:
+            cache_bytes = min(n_chunks * chunk_bytes, MAX_CHUNK_CACHE_MB * 1024 * 1024)
+        else:
+            cache_bytes = int(cache_mb * 1024 * 1024)
+
+        # Slot count well above the number of cached chunks (HDF5 recommends ~100x, odd)
+        n_slots = max(n_chunks * 100, 521) | 1
+        access_list = h5py.h5p.create(h5py.h5p.DATASET_ACCESS)
+        access_list.set_chunk_cache(n_slots, max(cache_bytes, chunk_bytes), 1.0)
+        return h5py.Dataset(h5py.h5d.open(self.file.id, path.encode(), dapl=access_list))
+
+    def timestep(self, area, variable, index):
+        # Every cell of one timestep
+        return self.time_series(area, variable, 'timestep')[index, :]
+
+    def cell_series(self, area, variable, cells):
+        """
+        Returns every timestep of selected cells.
+
+        Parameters:
+            area (str): Name of the 2D flow area.
+            variable (str): Time series variable.
+            cells (list): Cell indices, in any order and with repeats.
+
+        Returns:
+            np.ndarray: (time x len(cells)) array in the order of cells.
+        """
+        # h5py reads a list of columns only when the indices are increasing and unique
+        cells = np.asarray(cells, dtype=np.int64)
+        unique_cells, inverse = np.unique(cells, return_inverse=True)
+        values = self.time_series(area, variable, 'timeseries')[:, unique_cells]
+        return values[:, inverse]
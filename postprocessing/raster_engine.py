@@ -0,0 +1,203 @@
+"""
+Vectorized rasterization of 2D cell values.
+
+Cell center coordinates are mapped straight to pixel indices with NumPy arithmetic
+against the affine transform of the output grid, so no shapely geometry is built and
+nothing is handed to rasterio one cell at a time. Pixels hit by several cells are
+combined with a reduction rule and pixels that no cell falls into are left as nodata.
+"""
+
+import numpy as np
+
+# Reduction rules understood by burn_cell_values
+REDUCTIONS = ("max", "min", "mean", "last")
+
+
+def cells_to_pixel_indices(x_coords, y_coords, transform, width, height):
+    """
+    Maps cell center coordinates to the row and column of the pixel that contains them.
+
+    Parameters:
+        x_coords (np.ndarray): X coordinates of the cell centers.
+        y_coords (np.ndarray): Y coordinates of the cell centers.
+        transform (affine.Affine): Affine transform of the output grid (north-up).
+        width (int): Number of columns in the output grid.
+        height (int): Number of rows in the output grid.
+
+    Returns:
+        tuple: (rows, cols, inside) where rows and cols are int64 pixel indices of the
+        cells that fall inside the grid and inside is the boolean mask of those cells.
+    """
+    x_coords = np.asarray(x_coords, dtype=np.float64)
+    y_coords = np.asarray(y_coords, dtype=np.float64)
+
+    # Invert the north-up transform: col = (x - x0) / a, row = (y - y0) / e (e is negative)
+    cols = np.floor((x_coords - transform.c) / transform.a).astype(np.int64)
+    rows = np.floor((y_coords - transform.f) / transform.e).astype(np.int64)
+
+    # Cells falling outside the grid are dropped, the same as a point outside the raster extent
+    inside = (cols >= 0) & (cols < width) & (rows >= 0) & (rows < height)
+    return rows[inside], cols[inside], inside
+
+
+def reduce_by_pixel(flat_index, values, reduction="max"):
+    """
+    Combines the values of cells that share a pixel.
+
+    Parameters:
+        flat_index (np.ndarray): Flattened (row-major) pixel index of every cell.
+        values (np.ndarray): Cell values, same length as flat_index.
+        reduction (str): One of 'max', 'min', 'mean' or 'last'. 'last' keeps the value of the
+            cell that comes last in the input order, which is what rasterio's burn order produced.
+
+    Returns:
+        tuple: (pixels, reduced) with the unique flat pixel indices and their reduced values.
+    """
+    if reduction not in REDUCTIONS:
+        raise ValueError(f"Unknown reduction '{reduction}'. Expected one of {REDUCTIONS}.")
+    if flat_index.size == 0:
+        return flat_index, values
+
+    # A stable sort keeps the original cell order inside each pixel group
+    order = np.argsort(flat_index, kind="stable")
+    sorted_index = flat_index[order]
+    sorted_values = values[order]
+
+    # Start position of every run of identical pixel indices
+    starts = np.flatnonzero(np.concatenate(([True], sorted_index[1:] != sorted_index[:-1])))
+    pixels = sorted_index[starts]
+
+    if reduction == "max":
+        reduced = np.maximum.reduceat(sorted_values, starts)
+    elif reduction == "min":
+        reduced = np.minimum.reduceat(sorted_values, starts)
+    elif reduction == "mean":
+        counts = np.diff(np.append(starts, sorted_values.size))
+        reduced = np.add.reduceat(sorted_values.astype(np.float64), starts) / counts
+    else:
+        # Last element of each run
+        ends = np.append(starts[1:], sorted_values.size) - 1
+        reduced = sorted_values[ends]
+
+    return pixels, reduced
+
+
+def burn_cell_values(rows, cols, values, out_shape, reduction="max", nodata=np.nan, dtype="float32"):
+    """
+    Burns cell values into a new array, reducing cells that share a pixel.
+
+    Parameters:
+        rows (np.ndarray): Pixel row of every cell.
+        cols (np.ndarray): Pixel column of every cell.
+        values (np.ndarray): Cell values.
+        out_shape (tuple): (height, width) of the output array.
+        reduction (str): Rule for pixels hit by several cells ('max', 'min', 'mean', 'last').
+        nodata (float): Value written to pixels that no cell falls into.
+        dtype (str): Data type of the output array.
+
+    Returns:
+        np.ndarray: The rasterized array.
+    """
+    height, width = out_shape
+    values = np.asarray(values)
+
+    # Cells without a value (NaN) must not win a pixel over cells that have one
+    valid = np.isfinite(values)
+    flat_index = rows[valid] * width + cols[valid]
+    pixels, reduced = reduce_by_pixel(flat_index, values[valid], reduction)
+
+    raster = np.full(height * width, nodata, dtype=dtype)
+    raster[pixels] = reduced
+    return raster.reshape(height, width)
+
+
+def rasterize_cell_values(x_coords, y_coords, data, transform, width, height, reduction="max",
+                          nodata=np.nan, dtype="float32"):
+    """
+    Rasterizes cell center values onto the grid described by transform, width and height.
+
+    Parameters:
+        x_coords (np.ndarray): X coordinates of the cell centers.
+        y_coords (np.ndarray): Y coordinates of the cell centers.
+        data (np.ndarray): Value of every cell.
+        transform (affine.Affine): Affine transform of the output grid.
+        width (int): Number of columns in the output grid.
+        height (int): Number of rows in the output grid.
+        reduction (str): Rule for pixels hit by several cells ('max', 'min', 'mean', 'last').
+        nodata (float): Value written to empty pixels.
+        dtype (str): Data type of the output array.
+
+    Returns:
+        np.ndarray: The rasterized (height, width) array.
+    """
+    rows, cols, inside = cells_to_pixel_indices(x_coords, y_coords, transform, width, height)
+    data = np.asarray(data)[inside]
+    return burn_cell_values(rows, cols, data, (height, width), reduction=reduction, nodata=nodata, dtype=dtype)
+
+
+def build_tile_index(rows, cols, width, height, tile_size):
+    """
+    Buckets cells by the square tile of the grid they fall in.
+
+    Parameters:
+        rows (np.ndarray): Pixel row of every cell.
+        cols (np.ndarray): Pixel column of every cell.
+        width (int): Number of columns in the grid.
+        height (int): Number of rows in the grid.
+        tile_size (int): Tile edge in pixels.
+
+    Returns:
+        dict: 'order' (cell indexes sorted by tile, original order kept inside a tile),
+        'offsets' (start of every tile's cells in 'order'), 'tile_size', 'tiles_across',
+        'tiles_down', 'width' and 'height'.
+    """
+    tiles_across = -(-width // tile_size)
+    tiles_down = -(-height // tile_size)
+    tile_ids = (rows // tile_size) * tiles_across + cols // tile_size
+
+    # Stable, so cells of a tile keep their input order and 'last' matches the full-grid result
+    order = np.argsort(tile_ids, kind='stable')
+    counts = np.bincount(tile_ids, minlength=tiles_across * tiles_down)
+    offsets = np.concatenate(([0], np.cumsum(counts)))
+    return {
+        'order': order,
+        'offsets': offsets,
+        'tile_size': tile_size,
+        'tiles_across': tiles_across,
+        'tiles_down': tiles_down,
+        'width': width,
+        'height': height,
+    }
+
+
+def iter_tile_rasters(tile_index, rows, cols, values, reduction="max", nodata=np.nan, dtype="float32"):
+    """
+    Rasterizes cells one tile at a time.
+
+    Parameters:
+        tile_index (dict): Index from build_tile_index.
+        rows (np.ndarray): Pixel row of every cell.
+        cols (np.ndarray): Pixel column of every cell.
+        values (np.ndarray): Cell values.
+        reduction (str): Rule for pixels hit by several cells.
+        nodata (float): Value for empty pixels.
+        dtype (str): Data type of the tiles.
+
+    Yields:
+        tuple: ((col_off, row_off, width, height), tile array) for every tile of the grid, in
+        row-major order. Tiles without cells are yielded filled with nodata.
+    """
+    tile_size = tile_index['tile_size']
+    order, offsets = tile_index['order'], tile_index['offsets']
+    for tile_row in range(tile_index['tiles_down']):
+        row_off = tile_row * tile_size
+        tile_height = min(tile_size, tile_index['height'] - row_off)
+        for tile_col in range(tile_index['tiles_across']):
+            col_off = tile_col * tile_size
+            tile_width = min(tile_size, tile_index['width'] - col_off)
+
+            tile_id = tile_row * tile_index['tiles_across'] + tile_col
+            cells = order[offsets[tile_id]:offsets[tile_id + 1]]
+            tile = burn_cell_values(rows[cells] - row_off, cols[cells] - col_off, values[cells],
+                                    (tile_height, tile_width), reduction=reduction, nodata=nodata, dtype=dtype)
+            yield (col_off, row_off, tile_width, tile_height), tile
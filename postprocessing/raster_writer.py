@@ -0,0 +1,195 @@
+"""
+Writes result rasters as tiled, compressed GeoTIFFs or Cloud-Optimized GeoTIFFs (COG).
+
+Plain striped, uncompressed GeoTIFFs at 1 m over a valley are large and slow to open in GIS.
+Rasters written here are tiled, compressed with DEFLATE or ZSTD plus a floating-point
+predictor, carry internal overviews, and can hold several variables or timesteps as named
+bands of one file. The CRS is taken from the plan HDF instead of being hard-coded.
+"""
+
+import os
+import tempfile
+
+import numpy as np
+import rasterio
+from rasterio.enums import Resampling
+from rasterio.shutil import copy as copy_raster
+from rasterio.windows import Window
+
+from postprocessing.ras_hdf import read_projection
+from postprocessing.raster_engine import build_tile_index, cells_to_pixel_indices, iter_tile_rasters
+
+# CRS used before it was read from the HDF; still the fallback when a project has none
+DEFAULT_CRS = '+proj=utm +zone=13 +datum=NAD83 +units=m +no_defs +ellps=GRS80 +towgs84=0,0,0'
+
+# Compression codecs that work with the floating-point predictor
+COMPRESSIONS = ('DEFLATE', 'ZSTD', 'LZW')
+
+
+def crs_from_hdf(hdf_file, default=DEFAULT_CRS):
+    """
+    Returns the CRS of a plan HDF file, falling back to a default when the project has none.
+
+    Parameters:
+        hdf_file (h5py.File): Open plan HDF file.
+        default (str): CRS returned when the HDF has no 'Projection' attribute.
+
+    Returns:
+        str: WKT or PROJ string.
+    """
+    projection = read_projection(hdf_file)
+    if projection is None:
+        print(f"Warning: no projection in {hdf_file.filename}, using {default}")
+        return default
+    return projection
+
+
+def overview_factors(width, height, blocksize):
+    # Halve the raster until it fits in one block
+    factors = []
+    factor = 2
+    while max(width, height) / factor >= blocksize / 2 and factor <= 2 ** 12:
+        factors.append(factor)
+        factor *= 2
+    return factors
+
+
+def write_raster(output_path, bands, transform, crs=DEFAULT_CRS, nodata=np.nan, band_names=None, cog=True,
+                 compress='DEFLATE', blocksize=512, resampling='average', dtype='float32'):
+    """
+    Writes one or more bands to a tiled, compressed GeoTIFF with internal overviews.
+
+    Parameters:
+        output_path (str): Path of the output .tif file.
+        bands (np.ndarray or list): A (height, width) array, a (count, height, width) array, or a
+            list of (height, width) arrays, one per band.
+        transform (affine.Affine): Affine transform of the grid.
+        crs (str): Coordinate reference system (WKT, PROJ string or EPSG code).
+        nodata (float): Nodata value.
+        band_names (list): Optional description of every band, e.g. variable names or timestamps.
+        cog (bool): Write a Cloud-Optimized GeoTIFF. Otherwise a tiled GeoTIFF with the same
+            compression and internal overviews is written.
+        compress (str): 'DEFLATE', 'ZSTD' or 'LZW'.
+        blocksize (int): Tile size in pixels (multiple of 16).
+        resampling (str): Resampling used for the overviews.
+        dtype (str): Data type of the bands.
+    """
+    bands = np.asarray(bands, dtype=dtype) if not isinstance(bands, list) else bands
+    if isinstance(bands, np.ndarray) and bands.ndim == 2:
+        bands = bands[np.newaxis]
+    height, width = bands[0].shape
+
+    def write_bands(dst):
+        for band_index, band in enumerate(bands, start=1):
+            dst.write(np.asarray(band, dtype=dtype), band_index)
+
+    write_tiled(output_path, write_bands, height, width, len(bands), transform, crs, nodata, band_names,
+                cog, compress, blocksize, resampling, dtype)
+
+
+def write_cells_windowed(output_path, x_coords, y_coords, data, transform, width, height, crs=DEFAULT_CRS,
+                         nodata=np.nan, reduction='max', cog=True, compress='DEFLATE', blocksize=512,
+                         resampling='average', dtype='float32'):
+    """
+    Rasterizes cell values one tile window at a time, so the full grid is never held in memory.
+
+    A bucket index over the cell centers (cells sorted by the tile they fall in) lets every
+    window touch only its own cells. Peak memory is one tile plus the index, and the pixel
+    values are identical to rasterize_cell_values on the full grid.
+
+    Parameters:
+        output_path (str): Path of the output .tif file.
+        x_coords (np.ndarray): X coordinates of the cell centers.
+        y_coords (np.ndarray): Y coordinates of the cell centers.
+        data (np.ndarray): Value of every cell.
+        transform (affine.Affine): Affine transform of the grid.
+        width (int): Number of columns in the grid.
+        height (int): Number of rows in the grid.
+        crs (str): Coordinate reference system.
+        nodata (float): Value for empty pixels.
+        reduction (str): Rule for pixels hit by several cells ('max', 'min', 'mean', 'last').
+        cog (bool): Write a Cloud-Optimized GeoTIFF.
+        compress (str): 'DEFLATE', 'ZSTD' or 'LZW'.
+        blocksize (int): Tile size in pixels; also the window size.
+        resampling (str): Resampling used for the overviews.
+        dtype (str): Data type of the band.
+    """
+    rows, cols, inside = cells_to_pixel_indices(x_coords, y_coords, transform, width, height)
+    data = np.asarray(data)[inside]
+    tile_index = build_tile_index(rows, cols, width, height, blocksize)
+
+    def write_windows(dst):
+        for window, tile in iter_tile_rasters(tile_index, rows, cols, data, reduction, nodata, dtype):
+            dst.write(tile, 1, window=Window(*window))
+
+    write_tiled(output_path, write_windows, height, width, 1, transform, crs, nodata, None,
+                cog, compress, blocksize, resampling, dtype)
+
+
+def write_tiled(output_path, write_bands, height, width, count, transform, crs=DEFAULT_CRS, nodata=np.nan,
+                band_names=None, cog=True, compress='DEFLATE', blocksize=512, resampling='average', dtype='float32'):
+    """
+    Creates a tiled, compressed GeoTIFF (or COG) and lets a callback fill in the bands.
+
+    Parameters:
+        output_path (str): Path of the output .tif file.
+        write_bands (callable): Called with the open rasterio dataset to write the pixel data,
+            whole bands or window by window.
+        height (int): Number of rows.
+        width (int): Number of columns.
+        count (int): Number of bands.
+        Remaining parameters: see write_raster.
+    """
+    compress = compress.upper()
+    if compress not in COMPRESSIONS:
+        raise ValueError(f"Unsupported compression '{compress}'. Expected one of {COMPRESSIONS}.")
+
+    profile = {
+        'driver': 'GTiff',
+        'height': height,
+        'width': width,
+        'count': count,
+        'dtype': dtype,
+        'crs': crs,
+        'transform': transform,
+        'nodata': nodata,
+        'tiled': True,
+        'blockxsize': blocksize,
+        'blockysize': blocksize,
+        'compress': compress,
+        'predictor': 3 if np.dtype(dtype).kind == 'f' else 2,
+        'BIGTIFF': 'IF_SAFER',
+    }
+
+    # A COG is produced by copying a finished GeoTIFF, so the bands go to a temporary file first
+    target_path = output_path
+    if cog:
+        handle, target_path = tempfile.mkstemp(suffix='.tif', dir=os.path.dirname(os.path.abspath(output_path)))
+        os.close(handle)
+
+    try:
+        with rasterio.open(target_path, 'w', **profile) as dst:
+            write_bands(dst)
+            if band_names is not None:
+                for band_index, band_name in enumerate(band_names, start=1):
+                    dst.set_band_description(band_index, str(band_name))
+            if not cog:
+                dst.build_overviews(overview_factors(width, height, blocksize), Resampling[resampling])
+                dst.update_tags(ns='rio_overview', resampling=resampling)
+
+        if cog:
+            copy_raster(
+                target_path, output_path,
+                driver='COG',
+                COMPRESS=compress,
+                PREDICTOR='FLOATING_POINT' if np.dtype(dtype).kind == 'f' else 'STANDARD',
+                BLOCKSIZE=blocksize,
+                OVERVIEWS='AUTO',
+                OVERVIEW_RESAMPLING=resampling.upper(),
+                BIGTIFF='IF_SAFER',
+            )
+    finally:
+        if cog and os.path.exists(target_path):
+            os.remove(target_path)
+
+    print(f"Saved raster: {output_path}")
@@ -1,10 +1,13 @@
 import os
 from osgeo import gdal
-import h5py
 import numpy as np
-from shapely.geometry import Point
 import geopandas as gpd
 
+from postprocessing.geometry_cache import load_geometry
+from postprocessing.point_export import DRIVERS, export_points_table
+from postprocessing.ras_hdf import RasPlanResults, geometry_path
+from postprocessing.time_series_reducer import reduce_dataset
+
 def extract_plan_title_from_file(filepath):
 
     with open(filepath, 'r') as file:
@@ -17,9 +20,20 @@ def extract_plan_title_from_file(filepath):
                 break  # Stop after the first match is found
         return plan_title
 
-def get_georeferencing_info(hdf_file):
+def get_georeferencing_info(hdf_file, cache_dir=None, area='ME_Valley'):
+    # Use the shared geometry cache when one is given; plans that share a geometry file
+    # then read the coordinates memory-mapped instead of decompressing them again
+    if cache_dir is not None:
+        geometry = load_geometry(hdf_file, area, cache_dir)
+        return (geometry['x_coords'], geometry['y_coords']) + geometry['bounds']
+
+    # An open RasPlanResults keeps the decoded coordinates and bounds for later calls
+    if isinstance(hdf_file, RasPlanResults):
+        x_coords, y_coords = hdf_file.cell_centers(area)
+        return (x_coords, y_coords) + hdf_file.bounds(area)
+
     # Get the coordinates of the cells
-    coords = hdf_file['Geometry/2D Flow Areas/ME_Valley/Cells Center Coordinate'][()]
+    coords = hdf_file[geometry_path(area, 'Cells Center Coordinate')][()]
     x_coords, y_coords = coords[:, 0], coords[:, 1]
     
     # Calculate the bounding box of the grid
@@ -29,32 +43,34 @@ def get_georeferencing_info(hdf_file):
     return x_coords, y_coords, x_min, y_min, x_max, y_max
 
 def export_as_points(x_coords, y_coords, data, output_dir, filename):
-    # Convert the coordinates and data into a GeoDataFrame
-    gdf = gpd.GeoDataFrame({
-        'value': data,
-        'geometry': [Point(x, y) for x, y in zip(x_coords, y_coords)]
-    })
-    
-    # Save to a shapefile
-    gdf.to_file(output_path)
-    print(f"Saved point shapefile: {output_path}")
+    # output_dir may already be the full output path (.shp, .parquet or .fgb), as passed by
+    # extract_and_save_rasters; the module-level output_path only exists when run as a script
+    if os.path.splitext(output_dir)[1].lower() in DRIVERS:
+        output_path = output_dir
+    else:
+        output_path = os.path.join(output_dir, filename + '.shp')
+
+    # Build the point geometry with the vectorized constructor and save it; GeoParquet and
+    # FlatGeobuf outputs are streamed in batches
+    export_points_table(x_coords, y_coords, {'value': data}, output_path)
 
 
-def extract_and_save_rasters(hdf_path, output_path):
-    with h5py.File(hdf_path, 'r') as hdf_file:
+def extract_and_save_rasters(hdf_path, output_path, cache_dir=None):
+    with RasPlanResults(hdf_path) as plan:
         # Get georeferencing info
-        x_coords, y_coords, x_min, y_min, x_max, y_max = get_georeferencing_info(hdf_file)
+        x_coords, y_coords, x_min, y_min, x_max, y_max = get_georeferencing_info(plan, cache_dir)
         
-        # Navigate to the specific group containing potential raster data
-        dataset = hdf_file['Results/Unsteady/Output/Output Blocks/Base Output/Unsteady Time Series/2D Flow Areas/ME_Valley/Water Surface']
-        #dataset = hdf_file['Results/Unsteady/Output/Output Blocks/Base Output/Unsteady Time Series/2D Flow Areas/MW_Valley/Water Surface']
+        # Lazy view of the water surface time series, with a chunk cache for whole-timestep reads
+        dataset = plan.time_series('ME_Valley', 'Water Surface', access='timestep')
+        #dataset = plan.time_series('MW_Valley', 'Water Surface', access='timestep')
         
         # Check if it's 2D data
         if len(dataset.shape) == 2:
             print(f"Processing dataset: Water Surface, Shape: {dataset.shape}, Dtype: {dataset.dtype}")
             
-            # Extract the maximum value across all time steps
-            data = np.max(dataset, axis=0)  # Max over the time dimension (axis 0)
+            # Extract the maximum value across all time steps, streaming the dataset in
+            # chunk-aligned slabs instead of loading the whole time x cells array
+            data = reduce_dataset(dataset)['max']
             
             # Export the data as points
             export_as_points(x_coords, y_coords, data, output_path, "Max_Water_Surface_All_TimeSteps")
@@ -83,4 +99,4 @@ if __name__ == "__main__":
         plan_file = hdf_path.split(".")[0] + "." +  hdf_path.split(".")[1]
         plan_title = extract_plan_title_from_file(plan_file)
         output_path = os.path.join(output_dir, plan_title + ".shp")
-        extract_and_save_rasters(hdf_path, output_path)
+        extract_and_save_rasters(hdf_path, output_path, cache_dir=os.path.join(output_dir, "geometry_cache"))
@@ -1,16 +1,30 @@
-import h5py
 import numpy as np
-import rasterio
 from rasterio.transform import from_bounds
-from rasterio.features import rasterize
-from shapely.geometry import Point
-import geopandas as gpd
 import os
 
+from postprocessing.geometry_cache import load_geometry
+from postprocessing.ras_hdf import RasPlanResults, geometry_path
+from postprocessing.raster_engine import rasterize_cell_values
+from postprocessing.raster_writer import DEFAULT_CRS, crs_from_hdf, write_cells_windowed, write_raster
+
+# Grids larger than this (float32 bytes) are rasterized and written one tile window at a time
+WINDOWED_THRESHOLD_MB = 512
+
 # Function to retrieve georeferencing information from the HDF5 file
-def get_georeferencing_info(hdf_file):
+def get_georeferencing_info(hdf_file, cache_dir=None, area='MW_Valley'):
+    # Serve the coordinates and bounding box from the shared geometry cache when one is given,
+    # so plans that use the same geometry file do not decompress it again
+    if cache_dir is not None:
+        geometry = load_geometry(hdf_file, area, cache_dir)
+        return (geometry['x_coords'], geometry['y_coords']) + geometry['bounds']
+
+    # An open RasPlanResults keeps the decoded coordinates and bounds for later calls
+    if isinstance(hdf_file, RasPlanResults):
+        x_coords, y_coords = hdf_file.cell_centers(area)
+        return (x_coords, y_coords) + hdf_file.bounds(area)
+
     # Extract the coordinates of cell centers from the HDF5 file
-    coords = hdf_file['Geometry/2D Flow Areas/MW_Valley/Cells Center Coordinate'][()]
+    coords = hdf_file[geometry_path(area, 'Cells Center Coordinate')][()]
     x_coords, y_coords = coords[:, 0], coords[:, 1]
     
     # Calculate the bounding box of the grid based on the min and max coordinates
@@ -20,13 +34,8 @@ def get_georeferencing_info(hdf_file):
     return x_coords, y_coords, x_min, y_min, x_max, y_max
 
 # Function to rasterize point data and save it as a GeoTIFF file
-def rasterize_points(x_coords, y_coords, data, x_min, y_min, x_max, y_max, resolution, output_dir, filename):
-    # Create a GeoDataFrame from the x, y coordinates and corresponding data values
-    gdf = gpd.GeoDataFrame({
-        'value': data,
-        'geometry': [Point(x, y) for x, y in zip(x_coords, y_coords)]
-    })
-    
+def rasterize_points(x_coords, y_coords, data, x_min, y_min, x_max, y_max, resolution, output_dir, filename,
+                     reduction="max", nodata=np.nan, crs=None, cog=True, compress="DEFLATE", windowed=None):
     # Define the dimensions of the output raster based on the resolution and bounding box
     width = int((x_max - x_min) / resolution)
     height = int((y_max - y_min) / resolution)
@@ -34,46 +43,47 @@ def rasterize_points(x_coords, y_coords, data, x_min, y_min, x_max, y_max, resol
     # Define the affine transform for the raster based on the bounding box and raster dimensions
     transform = from_bounds(x_min, y_min, x_max, y_max, width, height)
     
-    # Rasterize the points into a 2D array, filling cells with the 'value' from the GeoDataFrame
-    raster = rasterize(
-        [(geom, value) for geom, value in zip(gdf.geometry, gdf['value'])],
-        out_shape=(height, width),
-        transform=transform,
-        fill=0,  # Fill value for empty cells; can be changed to a nodata value if needed
-        all_touched=True,  # Ensures that all pixels touched by geometries are rasterized
-        dtype='float32'  # Data type for the raster; 'float32' to match typical DEM formats
-    )
-    
     # Define the path for the output raster file
     output_raster_path = f"{output_dir}/{filename}.tif"
+
+    # Very large grids are never allocated in full: cells are bucketed by tile and every
+    # block window is rasterized and written on its own (same pixel values either way)
+    if windowed is None:
+        windowed = height * width * 4 > WINDOWED_THRESHOLD_MB * 1024 ** 2
+    if windowed:
+        write_cells_windowed(output_raster_path, x_coords, y_coords, data, transform, width, height,
+                             crs=crs or DEFAULT_CRS, nodata=nodata, reduction=reduction, cog=cog, compress=compress)
+        return
     
-    # Save the rasterized data to a GeoTIFF file
-    with rasterio.open(
-        output_raster_path, 'w',
-        driver='GTiff',
-        height=height,
-        width=width,
-        count=1,  # Number of bands in the raster; 1 for single-band raster
-        dtype='float32',  # Data type for the raster
-        crs='+proj=utm +zone=13 +datum=NAD83 +units=m +no_defs +ellps=GRS80 +towgs84=0,0,0',  # Coordinate reference system (CRS)
-        transform=transform,
-        nodata=0  # Define nodata value; this should match the fill value used in rasterize
-    ) as dst:
-        dst.write(raster, 1)  # Write the raster data to the file
+    # Map the cell centers straight to pixel indices and burn their values into the grid.
+    # Pixels hit by several cells are combined with 'reduction' (max, mean, last), and
+    # pixels that no cell falls into are left as nodata
+    raster = rasterize_cell_values(
+        x_coords, y_coords, data,
+        transform, width, height,
+        reduction=reduction,
+        nodata=nodata,
+        dtype='float32'  # Data type for the raster; 'float32' to match typical DEM formats
+    )
     
-    # Print confirmation message indicating the location of the saved raster
-    print(f"Saved raster: {output_raster_path}")
+    # Save the rasterized data as a tiled, compressed GeoTIFF with internal overviews
+    # (a Cloud-Optimized GeoTIFF unless cog is False)
+    write_raster(output_raster_path, raster, transform, crs=crs or DEFAULT_CRS, nodata=nodata, cog=cog,
+                 compress=compress)
 
 # Main function to extract data from the HDF5 file and save it as rasters
-def extract_and_save_rasters(hdf_path, output_dir, resolution):
-    # Open the HDF5 file in read mode
-    with h5py.File(hdf_path, 'r') as hdf_file:
+def extract_and_save_rasters(hdf_path, output_dir, resolution, cache_dir=None):
+    # Open the plan HDF5 file once; datasets are read lazily through the plan reader
+    with RasPlanResults(hdf_path) as plan:
         # Retrieve georeferencing information (coordinates and bounding box)
-        x_coords, y_coords, x_min, y_min, x_max, y_max = get_georeferencing_info(hdf_file)
+        x_coords, y_coords, x_min, y_min, x_max, y_max = get_georeferencing_info(plan, cache_dir)
+
+        # Coordinate system of the project, from the HDF 'Projection' attribute
+        crs = crs_from_hdf(plan)
         
         # Navigate to the dataset containing the desired raster data
-        dataset = hdf_file['Results/Unsteady/Output/Output Blocks/Base Output/Summary Output/2D Flow Areas/MW_Valley/Maximum Water Surface']
-        #dataset = hdf_file['Results/Unsteady/Output/Output Blocks/Base Output/Unsteady Time Series/2D Flow Areas/MW_Valley/Water Surface']
+        dataset = plan.summary('MW_Valley', 'Maximum Water Surface')
+        #dataset = plan.time_series('MW_Valley', 'Water Surface')
         
         # Check if the dataset contains 2D data (e.g., time x cells)
         if len(dataset.shape) == 2:
@@ -83,7 +93,8 @@ def extract_and_save_rasters(hdf_path, output_dir, resolution):
             data = dataset[-1, :]  # '-1' accesses the last time step
             
             # Rasterize the extracted data and save it as a GeoTIFF
-            rasterize_points(x_coords, y_coords, data, x_min, y_min, x_max, y_max, resolution, output_dir, "Max_Water_Surface_TimeStep_Last")
+            rasterize_points(x_coords, y_coords, data, x_min, y_min, x_max, y_max, resolution, output_dir, "Max_Water_Surface_TimeStep_Last",
+                             crs=crs)
 
 
 if __name__ == "__main__":
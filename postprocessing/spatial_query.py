@@ -0,0 +1,254 @@
+"""
+Point and profile-line queries of 2D results across many plans.
+
+A KD-tree over the cell centers is built once per geometry and pickled into the geometry
+cache entry (see geometry_cache), so later plans and later runs that share the geometry
+only load it. Points (gauges, structures) and polylines sampled at a fixed spacing (cross
+sections, profiles) are snapped to their nearest cell, and only those cell columns are read
+from each plan HDF with one fancy-index hyperslab read per variable. Results come back as
+tidy pandas DataFrames, one row per plan, point and timestep.
+"""
+
+import os
+import pickle
+import tempfile
+
+import numpy as np
+import pandas as pd
+from scipy.spatial import cKDTree
+
+from postprocessing.batch_extract import plan_output_names
+from postprocessing.geometry_cache import load_geometry
+from postprocessing.ras_hdf import RasPlanResults
+
+# Time series read by default
+DEFAULT_QUERY_VARIABLES = ('Water Surface', 'Depth')
+
+# File name of the persisted tree inside a geometry cache entry
+TREE_FILE_NAME = 'cell_tree.pkl'
+
+# Trees already loaded in this process, keyed by geometry cache entry
+_trees = {}
+
+
+def load_cell_tree(plan, area, cache_dir=None):
+    """
+    Returns the KD-tree over the cell centers of a 2D flow area, building it on first use.
+
+    Parameters:
+        plan (RasPlanResults): Open plan.
+        area (str): Name of the 2D flow area.
+        cache_dir (str): Geometry cache folder, see geometry_cache.load_geometry.
+
+    Returns:
+        dict: 'tree' (scipy.spatial.cKDTree over the real cells) and 'cells' (cell index of
+        every tree point). Perimeter ghost cells (fewer than 3 face points) are left out.
+    """
+    geometry = load_geometry(plan, area, cache_dir)
+    tree_path = os.path.join(geometry['folder'], TREE_FILE_NAME)
+    if tree_path in _trees:
+        return _trees[tree_path]
+
+    if os.path.exists(tree_path):
+        with open(tree_path, 'rb') as file:
+            cell_tree = pickle.load(file)
+    else:
+        print(f"Building cell search tree for {area}: {tree_path}")
+        vertex_counts = (plan.geometry(area, 'Cells FacePoint Indexes') >= 0).sum(axis=1)
+        cells = np.flatnonzero(vertex_counts >= 3)
+        cell_tree = {'tree': cKDTree(np.asarray(geometry['coords'])[cells]), 'cells': cells}
+
+        # Written under a temporary name and renamed, so a concurrent reader never sees half a file
+        handle, temp_path = tempfile.mkstemp(dir=geometry['folder'], suffix='.tmp')
+        with os.fdopen(handle, 'wb') as file:
+            pickle.dump(cell_tree, file, protocol=pickle.HIGHEST_PROTOCOL)
+        os.replace(temp_path, tree_path)
+
+    _trees[tree_path] = cell_tree
+    return cell_tree
+
+
+def locate_cells(plan, area, x_coords, y_coords, cache_dir=None, max_distance=None):
+    """
+    Finds the cell nearest to every point.
+
+    Parameters:
+        plan (RasPlanResults): Open plan.
+        area (str): Name of the 2D flow area.
+        x_coords (array-like): X coordinates of the points.
+        y_coords (array-like): Y coordinates of the points.
+        cache_dir (str): Geometry cache folder.
+        max_distance (float): Points farther than this from any cell center get cell -1.
+
+    Returns:
+        tuple: (cells, distances) arrays, one entry per point.
+    """
+    cell_tree = load_cell_tree(plan, area, cache_dir)
+    points = np.column_stack([np.asarray(x_coords, dtype=np.float64), np.asarray(y_coords, dtype=np.float64)])
+    bound = np.inf if max_distance is None else max_distance
+    distances, nearest = cell_tree['tree'].query(points, distance_upper_bound=bound)
+
+    # cKDTree reports misses with an index one past the last point
+    found = nearest < len(cell_tree['cells'])
+    cells = np.full(len(points), -1, dtype=np.int64)
+    cells[found] = cell_tree['cells'][nearest[found]]
+    return cells, distances
+
+
+def sample_polyline(vertices, spacing):
+    """
+    Places points along a polyline at a fixed spacing, always including both ends.
+
+    Parameters:
+        vertices (array-like): (n, 2) polyline vertices.
+        spacing (float): Distance between samples along the line.
+
+    Returns:
+        tuple: (x_coords, y_coords, stations) where stations is the distance along the line.
+    """
+    vertices = np.asarray(vertices, dtype=np.float64)
+    segment_lengths = np.hypot(*np.diff(vertices, axis=0).T)
+    vertex_stations = np.concatenate(([0.0], np.cumsum(segment_lengths)))
+    stations = np.arange(0.0, vertex_stations[-1], spacing)
+    stations = np.append(stations, vertex_stations[-1])
+    return (np.interp(stations, vertex_stations, vertices[:, 0]),
+            np.interp(stations, vertex_stations, vertices[:, 1]),
+            stations)
+
+
+def read_cell_values(plan, area, variable, cells, summary=False):
+    """
+    Reads the values of selected cells.
+
+    Parameters:
+        plan (RasPlanResults): Open plan.
+        area (str): Name of the 2D flow area.
+        variable (str): Time series variable, or Summary Output variable when summary is True.
+        cells (np.ndarray): Cell indices, any order, repeats allowed, no -1.
+        summary (bool): Read a Summary Output variable.
+
+    Returns:
+        np.ndarray: (timesteps x cells) for a time series, (cells,) for a summary variable.
+    """
+    if summary:
+        # Only the requested columns of the value row
+        unique_cells, inverse = np.unique(cells, return_inverse=True)
+        dataset = plan.summary(area, variable)
+        values = dataset[unique_cells] if dataset.ndim == 1 else dataset[0, unique_cells]
+        return values[inverse]
+    return plan.cell_series(area, variable, cells)
+
+
+def query_points(hdf_paths, area, x_coords, y_coords, variables=DEFAULT_QUERY_VARIABLES, point_ids=None,
+                 summary=False, cache_dir=None, max_distance=None, extra_columns=None):
+    """
+    Samples result variables at points across many plans.
+
+    Parameters:
+        hdf_paths (list): Plan HDF files.
+        area (str): Name of the 2D flow area.
+        x_coords (array-like): X coordinates of the points.
+        y_coords (array-like): Y coordinates of the points.
+        variables (tuple): Time series variables (or Summary Output variables when summary is
+            True). Variables missing from a plan are left empty for that plan; a plan with
+            no time axis and none of the variables raises a ValueError.
+        point_ids (list): Name of every point, e.g. gauge IDs. Defaults to 0..n-1.
+        summary (bool): Sample Summary Output variables, one row per plan and point.
+        cache_dir (str): Geometry cache folder.
+        max_distance (float): Points farther than this from every cell are dropped.
+        extra_columns (dict): Additional per-point columns, e.g. {'station': stations}.
+
+    Returns:
+        pandas.DataFrame: Columns 'plan' (see batch_extract.plan_output_names), 'point', 'x',
+        'y', 'cell', any extra columns, 'time' and 'timestamp' (time series only), and one
+        column per variable.
+    """
+    x_coords = np.asarray(x_coords, dtype=np.float64)
+    y_coords = np.asarray(y_coords, dtype=np.float64)
+    point_ids = np.arange(len(x_coords)) if point_ids is None else np.asarray(point_ids)
+    extra_columns = extra_columns or {}
+
+    # Plans are labelled by title, told apart by plan number when titles repeat
+    frames = []
+    for plan_name, hdf_path in plan_output_names(hdf_paths):
+        with RasPlanResults(hdf_path) as plan:
+            cells, _ = locate_cells(plan, area, x_coords, y_coords, cache_dir, max_distance)
+            inside = cells >= 0
+            if not inside.any():
+                print(f"Warning: no point lies within {max_distance} of a cell of {area} in {hdf_path}.")
+                continue
+            columns = {
+                'plan': plan_name,
+                'point': point_ids[inside],
+                'x': x_coords[inside],
+                'y': y_coords[inside],
+                'cell': cells[inside],
+            }
+            columns.update({name: np.asarray(values)[inside] for name, values in extra_columns.items()})
+
+            available = plan.variables(area)['summary' if summary else 'time_series']
+            values = {}
+            for variable in variables:
+                if variable not in available:
+                    print(f"Warning: {variable} not found for {area} in {hdf_path}, skipping.")
+                    continue
+                values[variable] = read_cell_values(plan, area, variable, cells[inside], summary)
+
+            if summary:
+                frames.append(pd.DataFrame({**columns, **values}))
+                continue
+
+            # Long format: every point repeated for every timestep. Without a time axis in the
+            # file the timestep count comes from the values, so at least one must exist
+            if plan.times is None and not values:
+                raise ValueError(f"None of the variables {', '.join(variables)} exist for {area} in {hdf_path}.")
+            n_times = len(plan.times) if plan.times is not None else next(iter(values.values())).shape[0]
+            n_points = int(inside.sum())
+            frame = {name: np.tile(value, n_times) if isinstance(value, np.ndarray) else value
+                     for name, value in columns.items()}
+            frame['time'] = np.repeat(plan.times if plan.times is not None else np.arange(n_times), n_points)
+            if plan.timestamps is not None:
+                frame['timestamp'] = np.repeat(np.asarray(plan.timestamps), n_points)
+            for variable, array in values.items():
+                frame[variable] = array.ravel()
+            frames.append(pd.DataFrame(frame))
+
+    return pd.concat(frames, ignore_index=True) if frames else pd.DataFrame()
+
+
+def query_polyline(hdf_paths, area, vertices, spacing, variables=DEFAULT_QUERY_VARIABLES, summary=False,
+                   cache_dir=None, max_distance=None):
+    """
+    Samples result variables along a polyline (cross section or profile) across many plans.
+
+    Parameters:
+        hdf_paths (list): Plan HDF files.
+        area (str): Name of the 2D flow area.
+        vertices (array-like): (n, 2) polyline vertices.
+        spacing (float): Distance between samples along the line.
+        variables (tuple): Variables to sample, see query_points.
+        summary (bool): Sample Summary Output variables (e.g. 'Maximum Water Surface').
+        cache_dir (str): Geometry cache folder.
+        max_distance (float): Samples farther than this from every cell are dropped.
+
+    Returns:
+        pandas.DataFrame: As query_points, plus a 'station' column (distance along the line).
+    """
+    x_coords, y_coords, stations = sample_polyline(vertices, spacing)
+    return query_points(hdf_paths, area, x_coords, y_coords, variables, summary=summary, cache_dir=cache_dir,
+                        max_distance=max_distance, extra_columns={'station': stations})
+
+
+if __name__ == "__main__":
+    from postprocessing.batch_extract import find_plan_hdfs
+
+    hdf_paths = find_plan_hdfs(r"C:\ATD\Hydraulic Models\Bennett_MC\ME")
+    area = "ME_Valley"
+
+    # Water surface and depth hydrographs at two gauges, then the maximum water surface profile
+    # along a cross section sampled every 2 m
+    gauges = query_points(hdf_paths, area, [512300.0, 512850.0], [4201200.0, 4201750.0], point_ids=['G1', 'G2'])
+    gauges.to_csv(r"C:\ATD\Hydraulic Models\Bennett_MC\ME\gauges.csv", index=False)
+    profile = query_polyline(hdf_paths, area, [(512000.0, 4201000.0), (512400.0, 4201300.0)], 2.0,
+                             variables=('Maximum Water Surface',), summary=True)
+    profile.to_csv(r"C:\ATD\Hydraulic Models\Bennett_MC\ME\profile.csv", index=False)
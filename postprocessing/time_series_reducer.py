@@ -0,0 +1,190 @@
+"""
+Single-pass, memory-bounded reduction of 2D unsteady time series output.
+
+The (time x cells) datasets under 'Unsteady Time Series' are walked in hyperslabs that are
+aligned to the HDF chunk layout, so every chunk is decompressed exactly once and only one
+slab is held in memory at a time. Maximum, minimum, mean, time of maximum and time of first
+wet are accumulated per cell (or per face) while the slabs stream past. Peak memory is set
+by max_memory_mb and does not grow with the number of timesteps.
+"""
+
+import numpy as np
+
+from postprocessing.ras_hdf import geometry_path, read_time_values, time_series_path
+
+# Variables reduced by default, in the order they are read
+DEFAULT_VARIABLES = ('Water Surface', 'Depth', 'Face Velocity')
+
+# Face velocities are signed by face normal, so they are reduced by magnitude
+ABSOLUTE_VARIABLES = ('Face Velocity',)
+
+# Depth above which a cell counts as wet
+DEFAULT_WET_DEPTH = 0.001
+
+# Slab buffer size used when no memory limit is given
+DEFAULT_MAX_MEMORY_MB = 256
+
+
+def hyperslab_shape(dataset, max_memory_mb=DEFAULT_MAX_MEMORY_MB):
+    """
+    Chooses a (time, column) slab shape that is a whole number of chunks and fits the memory limit.
+
+    Parameters:
+        dataset (h5py.Dataset): 2D (time x cells) dataset.
+        max_memory_mb (float): Memory budget for one slab, in megabytes.
+
+    Returns:
+        tuple: (time_block, column_block)
+    """
+    n_times, n_columns = dataset.shape
+    # Contiguous datasets are stored row by row, which behaves like one chunk per timestep
+    chunk_times, chunk_columns = dataset.chunks or (1, n_columns)
+    budget = max(int(max_memory_mb * 1024 * 1024 // dataset.dtype.itemsize), 1)
+
+    # Widest column block made of whole chunks that still leaves room for one chunk row of time
+    column_block = max(budget // chunk_times // chunk_columns, 1) * chunk_columns
+    column_block = min(column_block, n_columns)
+
+    # Deepest time block made of whole chunks that fits next to that column block
+    time_block = max(budget // column_block // chunk_times, 1) * chunk_times
+    time_block = min(time_block, n_times)
+    return time_block, column_block
+
+
+def iter_hyperslabs(dataset, max_memory_mb=DEFAULT_MAX_MEMORY_MB):
+    """
+    Reads a 2D dataset slab by slab, reusing one buffer.
+
+    Slabs are yielded time block by time block and, inside each, column block by column
+    block, so the whole dataset is read once in storage order.
+
+    Parameters:
+        dataset (h5py.Dataset): 2D (time x cells) dataset.
+        max_memory_mb (float): Memory budget for the slab buffer, in megabytes.
+
+    Yields:
+        tuple: (t0, c0, slab) where slab is a view of the buffer holding dataset[t0:t1, c0:c1].
+        The view is overwritten by the next slab.
+    """
+    n_times, n_columns = dataset.shape
+    time_block, column_block = hyperslab_shape(dataset, max_memory_mb)
+    buffer = np.empty((time_block, column_block), dtype=dataset.dtype)
+
+    for t0 in range(0, n_times, time_block):
+        t1 = min(t0 + time_block, n_times)
+        for c0 in range(0, n_columns, column_block):
+            c1 = min(c0 + column_block, n_columns)
+            dataset.read_direct(buffer, np.s_[t0:t1, c0:c1], np.s_[0:t1 - t0, 0:c1 - c0])
+            yield t0, c0, buffer[:t1 - t0, :c1 - c0]
+
+
+def reduce_dataset(dataset, wet_reference=None, wet_depth=DEFAULT_WET_DEPTH, absolute=False,
+                   max_memory_mb=DEFAULT_MAX_MEMORY_MB):
+    """
+    Computes per-column statistics of a (time x cells) dataset in one pass.
+
+    Parameters:
+        dataset (h5py.Dataset): 2D (time x cells) dataset.
+        wet_reference (np.ndarray): Per-column value a cell must exceed by wet_depth to count as
+            wet (the cell minimum elevation for water surfaces, zeros for depths). None skips the
+            time of first wet.
+        wet_depth (float): Depth above wet_reference at which a cell counts as wet.
+        absolute (bool): Reduce the magnitude of the values (for signed face velocities).
+        max_memory_mb (float): Memory budget for one slab, in megabytes.
+
+    Returns:
+        dict: 'max', 'min', 'mean' arrays, and 'index_of_max' / 'index_of_first_wet' timestep
+        indices (-1 where a cell is never wet).
+    """
+    n_times, n_columns = dataset.shape
+    maximum = np.full(n_columns, -np.inf)
+    minimum = np.full(n_columns, np.inf)
+    total = np.zeros(n_columns)
+    index_of_max = np.zeros(n_columns, dtype=np.int64)
+    index_of_first_wet = np.full(n_columns, -1, dtype=np.int64) if wet_reference is not None else None
+
+    for t0, c0, slab in iter_hyperslabs(dataset, max_memory_mb):
+        c1 = c0 + slab.shape[1]
+        if absolute:
+            slab = np.abs(slab)
+        columns = np.arange(slab.shape[1])
+
+        # Maximum and the timestep it first occurs at
+        slab_argmax = np.argmax(slab, axis=0)
+        slab_max = slab[slab_argmax, columns]
+        is_new_max = slab_max > maximum[c0:c1]
+        maximum[c0:c1][is_new_max] = slab_max[is_new_max]
+        index_of_max[c0:c1][is_new_max] = t0 + slab_argmax[is_new_max]
+
+        np.minimum(minimum[c0:c1], slab.min(axis=0), out=minimum[c0:c1])
+        total[c0:c1] += slab.sum(axis=0, dtype=np.float64)
+
+        # First timestep the cell is wet, only for cells that have not been wet yet
+        if index_of_first_wet is not None:
+            wet = slab > (wet_reference[c0:c1] + wet_depth)
+            first_wet = np.argmax(wet, axis=0)
+            newly_wet = (index_of_first_wet[c0:c1] < 0) & wet.any(axis=0)
+            index_of_first_wet[c0:c1][newly_wet] = t0 + first_wet[newly_wet]
+
+    return {
+        'max': maximum,
+        'min': minimum,
+        'mean': total / max(n_times, 1),
+        'index_of_max': index_of_max,
+        'index_of_first_wet': index_of_first_wet,
+    }
+
+
+def reduce_time_series(hdf_file, area, variables=DEFAULT_VARIABLES, wet_depth=DEFAULT_WET_DEPTH,
+                       max_memory_mb=DEFAULT_MAX_MEMORY_MB):
+    """
+    Reduces several unsteady time series variables of a 2D flow area, one pass per dataset.
+
+    Parameters:
+        hdf_file (h5py.File): Open plan HDF file.
+        area (str): Name of the 2D flow area.
+        variables (tuple): Time series variables to reduce. Variables missing from the plan
+            output are skipped with a warning.
+        wet_depth (float): Depth at which a cell counts as wet.
+        max_memory_mb (float): Memory budget for one slab, in megabytes.
+
+    Returns:
+        dict: {variable: statistics} where statistics holds 'max', 'min', 'mean',
+        'time_of_max' and 'time_of_first_wet' (NaN where never wet, None for face variables).
+        Times are in the units of the plan's Time dataset (days).
+    """
+    times = read_time_values(hdf_file)
+    min_elevation_path = geometry_path(area, 'Cells Minimum Elevation')
+    min_elevation = hdf_file[min_elevation_path][()] if min_elevation_path in hdf_file else None
+
+    results = {}
+    for variable in variables:
+        path = time_series_path(area, variable)
+        if path not in hdf_file:
+            print(f"Warning: {variable} not found for {area}, skipping.")
+            continue
+        dataset = hdf_file[path]
+
+        # Cells are wet once the water surface is above the cell minimum elevation, or the depth above zero
+        if variable == 'Water Surface':
+            wet_reference = min_elevation
+        elif variable == 'Depth':
+            wet_reference = np.zeros(dataset.shape[1])
+        else:
+            wet_reference = None
+
+        print(f"Reducing dataset: {variable}, Shape: {dataset.shape}, Chunks: {dataset.chunks}")
+        stats = reduce_dataset(dataset, wet_reference=wet_reference, wet_depth=wet_depth,
+                               absolute=variable in ABSOLUTE_VARIABLES, max_memory_mb=max_memory_mb)
+
+        if times is None:
+            times = np.arange(dataset.shape[0], dtype=np.float64)
+        stats['time_of_max'] = times[stats['index_of_max']]
+        if stats['index_of_first_wet'] is not None:
+            first_wet = stats['index_of_first_wet']
+            stats['time_of_first_wet'] = np.where(first_wet >= 0, times[np.maximum(first_wet, 0)], np.nan)
+        else:
+            stats['time_of_first_wet'] = None
+        results[variable] = stats
+
+    return results
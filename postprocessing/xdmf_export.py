@@ -0,0 +1,374 @@
+"""
+ParaView output of the full 2D time series without copying the results.
+
+save_results_pyhmt.convert_HEC_RAS_to_VTK writes one VTK file holding a full copy of the mesh
+and data, and only of the last timestep. Here an XDMF descriptor (.xdmf) points ParaView
+straight at the datasets inside the plan HDF:
+
+    geometry     'FacePoints Coordinate' of every 2D flow area
+    cells        every cell-sized time series (Water Surface, Depth, ...), one hyperslab per
+                 timestep, in a temporal collection
+    faces        every face-sized time series (Face Velocity, ...) on the face polylines
+                 ('Faces FacePoint Indexes'), also read in place
+    summary      the value row of every cell-sized summary variable
+
+Only the cell connectivity has to be written, because 'Cells FacePoint Indexes' is padded
+with -1. It goes into a small sidecar .h5 next to the .xdmf, in XDMF mixed-topology form:
+[polygon type, vertex count, vertex ids...] per cell. Perimeter ghost cells (1 or 2 face
+points) become poly-vertices and polylines, so the cell count still matches the result columns.
+
+write_vtkhdf writes a standalone VTKHDF file instead, for when the results have to travel
+without the plan HDF. It stores the mesh once and the selected timesteps as VTKHDF steps.
+
+Usage:
+    python -m postprocessing.xdmf_export ME_Valleys.p01.hdf
+    python -m postprocessing.xdmf_export ME_Valleys.p01.hdf --vtkhdf --timesteps -1
+"""
+
+import argparse
+import hashlib
+import os
+import tempfile
+import xml.etree.ElementTree as ET
+
+import h5py
+import numpy as np
+
+from postprocessing.ras_hdf import RasPlanResults, geometry_hash, geometry_path
+
+# XDMF mixed-topology element types
+XDMF_POLYVERTEX = 1
+XDMF_POLYLINE = 2
+XDMF_POLYGON = 3
+
+# VTK cell types of the same elements (VTKHDF)
+VTK_POLY_VERTEX = 2
+VTK_POLY_LINE = 4
+VTK_POLYGON = 7
+
+# Timesteps copied per block when writing VTKHDF
+DEFAULT_TIME_BLOCK = 64
+
+
+def cell_vertex_counts(cell_facepoints):
+    # Face points per cell; the rows are padded with -1 after the last face point
+    return (cell_facepoints >= 0).sum(axis=1)
+
+
+def mixed_topology(cell_facepoints):
+    """
+    Converts the padded cell -> face point table to an XDMF mixed-topology array.
+
+    Parameters:
+        cell_facepoints (np.ndarray): 'Cells FacePoint Indexes' (cells x max face points).
+
+    Returns:
+        np.ndarray: int64 array of [type, count, ids...] records, one per cell.
+    """
+    counts = cell_vertex_counts(cell_facepoints)
+    types = np.where(counts >= 3, XDMF_POLYGON, np.where(counts == 2, XDMF_POLYLINE, XDMF_POLYVERTEX))
+    record_sizes = counts + 2
+    offsets = np.cumsum(record_sizes) - record_sizes
+
+    topology = np.empty(int(record_sizes.sum()), dtype=np.int64)
+    topology[offsets] = types
+    topology[offsets + 1] = counts
+    valid = cell_facepoints >= 0
+    positions = offsets[:, None] + 2 + np.arange(cell_facepoints.shape[1])
+    topology[positions[valid]] = cell_facepoints[valid]
+    return topology
+
+
+def hdf_reference(hdf_path, xdmf_dir, dataset_path):
+    # 'file:/path' reference, relative to the .xdmf so the pair can be moved together
+    try:
+        file_path = os.path.relpath(hdf_path, xdmf_dir)
+    except ValueError:
+        # Different drive on Windows
+        file_path = os.path.abspath(hdf_path)
+    return f"{file_path.replace(os.sep, '/')}:{dataset_path}"
+
+
+def number_type(dtype):
+    # XDMF NumberType and Precision of a NumPy dtype
+    dtype = np.dtype(dtype)
+    if dtype.kind == 'f':
+        return {'NumberType': 'Float', 'Precision': str(dtype.itemsize)}
+    if dtype.kind == 'u':
+        return {'NumberType': 'UInt', 'Precision': str(dtype.itemsize)}
+    return {'NumberType': 'Int', 'Precision': str(dtype.itemsize)}
+
+
+def data_item(parent, reference, shape, dtype):
+    # DataItem reading a whole HDF dataset
+    item = ET.SubElement(parent, 'DataItem', Format='HDF', Dimensions=' '.join(map(str, shape)),
+                         **number_type(dtype))
+    item.text = reference
+    return item
+
+
+def row_item(parent, reference, shape, dtype, row):
+    # DataItem reading one row of a 2D HDF dataset (one timestep, or the value row of a summary)
+    slab = ET.SubElement(parent, 'DataItem', ItemType='HyperSlab', Dimensions=f"1 {shape[1]}")
+    selection = ET.SubElement(slab, 'DataItem', Format='XML', Dimensions='3 2')
+    selection.text = f"{row} 0 1 1 1 {shape[1]}"
+    data_item(slab, reference, shape, dtype)
+    return slab
+
+
+def add_attribute(grid, dataset, center='Cell'):
+    # Scalar attribute named after the dataset; its DataItem is added by the caller
+    return ET.SubElement(grid, 'Attribute', Name=dataset.name.rsplit('/', 1)[-1], AttributeType='Scalar',
+                         Center=center)
+
+
+def write_topology_sidecar(plan, areas, output_dir):
+    """
+    Writes the mixed cell topology of every 2D flow area to a sidecar HDF file.
+
+    The sidecar is named after the hash of the meshes ('geometry_<hash>.topology.h5'), so
+    plans of one geometry exported to the same folder share a single sidecar, written once.
+
+    Parameters:
+        plan (RasPlanResults): Open plan.
+        areas (list): 2D flow areas.
+        output_dir (str): Folder of the sidecar (the folder of the .xdmf).
+
+    Returns:
+        tuple: (sidecar path, {area: (topology length, number of cells)})
+    """
+    hashes = {area: geometry_hash(plan, area) for area in areas}
+    key = hashlib.sha1(''.join(f"{area}:{hashes[area]};" for area in sorted(areas)).encode()).hexdigest()[:16]
+    sidecar_path = os.path.join(output_dir, f"geometry_{key}.topology.h5")
+    if os.path.exists(sidecar_path):
+        with h5py.File(sidecar_path, 'r') as sidecar:
+            if all(area in sidecar and sidecar[area].attrs.get('geometry_hash') == hashes[area] for area in areas):
+                return sidecar_path, {area: (sidecar[area]['cells'].shape[0], int(sidecar[area].attrs['n_cells']))
+                                      for area in areas}
+
+    # Written under a temporary name, so plans exported at the same time never see half a file
+    sizes = {}
+    handle, temp_path = tempfile.mkstemp(dir=output_dir, suffix='.tmp')
+    os.close(handle)
+    with h5py.File(temp_path, 'w') as sidecar:
+        for area in areas:
+            cell_facepoints = plan.geometry(area, 'Cells FacePoint Indexes')
+            group = sidecar.create_group(area)
+            group.create_dataset('cells', data=mixed_topology(cell_facepoints), compression='gzip')
+            group.attrs['geometry_hash'] = hashes[area]
+            group.attrs['n_cells'] = len(cell_facepoints)
+            sizes[area] = (group['cells'].shape[0], len(cell_facepoints))
+    os.replace(temp_path, sidecar_path)
+    return sidecar_path, sizes
+
+
+def indent_xml(element, level=0):
+    # Pretty-prints an element tree in place, like ET.indent (which needs Python 3.9)
+    padding = '\n' + '  ' * level
+    if len(element):
+        if not (element.text or '').strip():
+            element.text = padding + '  '
+        for child in element:
+            indent_xml(child, level + 1)
+        if not (child.tail or '').strip():
+            child.tail = padding
+    if level and not (element.tail or '').strip():
+        element.tail = padding
+
+
+def write_xdmf(hdf_path, output_path=None, areas=None, variables=None, faces=True, summary=True):
+    """
+    Writes an XDMF descriptor that exposes a plan's mesh and full time series to ParaView.
+
+    Parameters:
+        hdf_path (str): Path to the plan HDF file.
+        output_path (str): .xdmf path. Defaults to the plan HDF path with '.xdmf'. The
+            topology sidecar is written next to it, shared by plans of the same geometry (see
+            write_topology_sidecar).
+        areas (list): 2D flow areas. None exports every area.
+        variables (list): Time series variables. None exports every variable.
+        faces (bool): Also expose face-sized time series on a grid of face polylines.
+        summary (bool): Also expose the cell-sized summary variables.
+
+    Returns:
+        str: Path of the .xdmf file.
+    """
+    if output_path is None:
+        output_path = os.path.splitext(hdf_path)[0] + '.xdmf'
+    xdmf_dir = os.path.dirname(os.path.abspath(output_path))
+
+    root = ET.Element('Xdmf', Version='3.0')
+    domain = ET.SubElement(root, 'Domain')
+
+    with RasPlanResults(hdf_path) as plan:
+        areas = plan.areas if areas is None else areas
+        sidecar_path, topology_sizes = write_topology_sidecar(plan, areas, xdmf_dir)
+        times = plan.times
+
+        for area in areas:
+            facepoints = plan[geometry_path(area, 'FacePoints Coordinate')]
+            topology_length, n_cells = topology_sizes[area]
+            face_facepoints = plan.get(geometry_path(area, 'Faces FacePoint Indexes'))
+            n_faces = face_facepoints.shape[0] if face_facepoints is not None else None
+
+            # Shared geometry and topologies, referenced by every timestep
+            geometry = ET.SubElement(domain, 'Geometry', Name=f"{area}_points", GeometryType='XY')
+            data_item(geometry, hdf_reference(hdf_path, xdmf_dir, facepoints.name), facepoints.shape,
+                      facepoints.dtype)
+            cells_topology = ET.SubElement(domain, 'Topology', Name=f"{area}_cells", TopologyType='Mixed',
+                                           NumberOfElements=str(n_cells))
+            data_item(cells_topology, hdf_reference(sidecar_path, xdmf_dir, f"/{area}/cells"), (topology_length,),
+                      np.int64)
+            if faces and n_faces is not None:
+                faces_topology = ET.SubElement(domain, 'Topology', Name=f"{area}_faces", TopologyType='Polyline',
+                                               NodesPerElement='2', NumberOfElements=str(n_faces))
+                data_item(faces_topology, hdf_reference(hdf_path, xdmf_dir, face_facepoints.name),
+                          face_facepoints.shape, face_facepoints.dtype)
+
+            # Time series, split by the mesh element they belong to
+            cell_series, face_series = [], []
+            for variable in plan.variables(area)['time_series']:
+                if variables is not None and variable not in variables:
+                    continue
+                dataset = plan.time_series(area, variable)
+                if dataset.ndim != 2:
+                    continue
+                if dataset.shape[1] == n_cells:
+                    cell_series.append(dataset)
+                elif faces and dataset.shape[1] == n_faces:
+                    face_series.append(dataset)
+
+            for kind, series in (('cells', cell_series), ('faces', face_series)):
+                if not series:
+                    continue
+                n_times = series[0].shape[0]
+                collection = ET.SubElement(domain, 'Grid', Name=f"{area}_{kind}", GridType='Collection',
+                                           CollectionType='Temporal')
+                for step in range(n_times):
+                    grid = ET.SubElement(collection, 'Grid', Name=f"{area}_{kind}_{step}", GridType='Uniform')
+                    ET.SubElement(grid, 'Time', Value=repr(float(times[step]) if times is not None else float(step)))
+                    ET.SubElement(grid, 'Topology', Reference='XML').text = \
+                        f"/Xdmf/Domain/Topology[@Name=\"{area}_{kind}\"]"
+                    ET.SubElement(grid, 'Geometry', Reference='XML').text = \
+                        f"/Xdmf/Domain/Geometry[@Name=\"{area}_points\"]"
+                    for dataset in series:
+                        if dataset.shape[0] != n_times:
+                            continue
+                        row_item(add_attribute(grid, dataset), hdf_reference(hdf_path, xdmf_dir, dataset.name),
+                                 dataset.shape, dataset.dtype, step)
+
+            if summary:
+                summaries = [plan.summary(area, variable) for variable in plan.variables(area)['summary']]
+                summaries = [dataset for dataset in summaries if dataset.shape[-1] == n_cells]
+                if summaries:
+                    grid = ET.SubElement(domain, 'Grid', Name=f"{area}_summary", GridType='Uniform')
+                    ET.SubElement(grid, 'Topology', Reference='XML').text = \
+                        f"/Xdmf/Domain/Topology[@Name=\"{area}_cells\"]"
+                    ET.SubElement(grid, 'Geometry', Reference='XML').text = \
+                        f"/Xdmf/Domain/Geometry[@Name=\"{area}_points\"]"
+                    for dataset in summaries:
+                        attribute = add_attribute(grid, dataset)
+                        reference = hdf_reference(hdf_path, xdmf_dir, dataset.name)
+                        if dataset.ndim == 2:
+                            row_item(attribute, reference, dataset.shape, dataset.dtype, 0)
+                        else:
+                            data_item(attribute, reference, dataset.shape, dataset.dtype)
+
+    tree = ET.ElementTree(root)
+    if hasattr(ET, 'indent'):
+        ET.indent(tree)
+    else:
+        indent_xml(root)
+    with open(output_path, 'wb') as file:
+        file.write(b'<?xml version="1.0" ?>\n<!DOCTYPE Xdmf SYSTEM "Xdmf.dtd" []>\n')
+        tree.write(file, encoding='utf-8', xml_declaration=False)
+    print(f"Saved XDMF: {output_path}")
+    return output_path
+
+
+def write_vtkhdf(hdf_path, output_path, area, variables=None, timesteps=None, time_block=DEFAULT_TIME_BLOCK):
+    """
+    Writes one 2D flow area and its cell time series to a standalone VTKHDF file.
+
+    Parameters:
+        hdf_path (str): Path to the plan HDF file.
+        output_path (str): .vtkhdf path.
+        area (str): Name of the 2D flow area.
+        variables (list): Cell-sized time series variables. None writes every one.
+        timesteps (list): Timestep indices (negative counts from the end). None writes all.
+        time_block (int): Timesteps copied per read.
+
+    Returns:
+        str: Path of the .vtkhdf file.
+    """
+    with RasPlanResults(hdf_path) as plan:
+        cell_facepoints = plan.geometry(area, 'Cells FacePoint Indexes')
+        facepoints = plan.geometry(area, 'FacePoints Coordinate')
+        n_cells, n_points = len(cell_facepoints), len(facepoints)
+
+        counts = cell_vertex_counts(cell_facepoints)
+        valid = cell_facepoints >= 0
+        types = np.where(counts >= 3, VTK_POLYGON, np.where(counts == 2, VTK_POLY_LINE, VTK_POLY_VERTEX))
+        datasets = [plan.time_series(area, variable) for variable in plan.variables(area)['time_series']
+                    if variables is None or variable in variables]
+        datasets = [dataset for dataset in datasets if dataset.ndim == 2 and dataset.shape[1] == n_cells]
+        n_times = datasets[0].shape[0] if datasets else 0
+        steps = np.arange(n_times) if timesteps is None else np.unique(np.asarray(timesteps) % max(n_times, 1))
+        times = plan.times if plan.times is not None else np.arange(n_times, dtype=np.float64)
+
+        with h5py.File(output_path, 'w') as output:
+            root = output.create_group('VTKHDF')
+            root.attrs['Version'] = np.array([2, 0], dtype=np.int64)
+            root.attrs.create('Type', np.bytes_('UnstructuredGrid'),
+                              dtype=h5py.string_dtype('ascii', len('UnstructuredGrid')))
+
+            # The mesh is stored once; every step points at the same partition
+            root['NumberOfPoints'] = np.array([n_points], dtype=np.int64)
+            root['NumberOfCells'] = np.array([n_cells], dtype=np.int64)
+            root['NumberOfConnectivityIds'] = np.array([int(counts.sum())], dtype=np.int64)
+            root['Points'] = np.column_stack([facepoints, np.zeros(n_points)])
+            root['Connectivity'] = cell_facepoints[valid].astype(np.int64)
+            root['Offsets'] = np.concatenate(([0], np.cumsum(counts))).astype(np.int64)
+            root['Types'] = types.astype(np.uint8)
+
+            step_group = root.create_group('Steps')
+            step_group.attrs['NSteps'] = len(steps)
+            step_group['Values'] = times[steps] if len(steps) else np.zeros(0)
+            for name in ('PartOffsets', 'PointOffsets', 'CellOffsets', 'ConnectivityIdOffsets'):
+                step_group.create_dataset(name, data=np.zeros(len(steps), dtype=np.int64))
+            step_group['NumberOfParts'] = np.ones(len(steps), dtype=np.int64)
+
+            # Cell data: the selected timesteps one after another, copied in blocks of timesteps
+            cell_data = root.create_group('CellData')
+            data_offsets = step_group.create_group('CellDataOffsets')
+            for dataset in datasets:
+                name = dataset.name.rsplit('/', 1)[-1]
+                target = cell_data.create_dataset(name, shape=(len(steps) * n_cells,), dtype=dataset.dtype,
+                                                  chunks=(min(n_cells, 1 << 20),) if len(steps) else None)
+                for start in range(0, len(steps), time_block):
+                    block_steps = steps[start:start + time_block]
+                    target[start * n_cells:(start + len(block_steps)) * n_cells] = dataset[block_steps, :].ravel()
+                data_offsets[name] = np.arange(len(steps), dtype=np.int64) * n_cells
+
+    print(f"Saved VTKHDF: {output_path}")
+    return output_path
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="ParaView output of HEC-RAS 2D results.")
+    parser.add_argument("hdf_path", help="Plan HDF file")
+    parser.add_argument("--output", default=None, help="Output .xdmf (or .vtkhdf prefix)")
+    parser.add_argument("--area", action="append", default=None, help="2D flow area (repeatable); default all")
+    parser.add_argument("--variables", nargs="+", default=None, help="Time series variables; default all")
+    parser.add_argument("--vtkhdf", action="store_true", help="Write standalone VTKHDF files instead of XDMF")
+    parser.add_argument("--timesteps", nargs="+", type=int, default=None, help="VTKHDF timesteps; default all")
+    args = parser.parse_args()
+
+    if args.vtkhdf:
+        prefix = os.path.splitext(args.output or args.hdf_path)[0]
+        with RasPlanResults(args.hdf_path) as plan:
+            areas = plan.areas if args.area is None else args.area
+        for area in areas:
+            write_vtkhdf(args.hdf_path, f"{prefix}_{area}.vtkhdf", area, args.variables, args.timesteps)
+    else:
+        write_xdmf(args.hdf_path, args.output, args.area, args.variables)
@@ -0,0 +1,295 @@
+"""
+Offset-indexed, memory-mapped access to large HEC-RAS geometry files (.g##).
+
+Geometry files with 2D flow area perimeters, breaklines and many cross sections run to
+hundreds of MB, and every script that inspected one read it whole. GeometryIndex memory-maps
+the file and finds the start of every section (river reach, cross section or other node,
+junction, storage or 2D flow area, connection, breakline, BC line, land-cover and Manning
+region tables) with one regular-expression pass over the mapped bytes. The byte offsets are
+saved to '<file>.index.json' beside the geometry and reused while its size and modification
+time match, so reading a section afterwards is one slice of the mapping.
+
+Edits rewrite only the bytes affected when they can: a section replaced by text of the same
+length is written in place. Otherwise the edited file is written beside the original and
+renamed over it, and the offsets of the sections after each edit are shifted.
+
+Usage:
+    geometry = GeometryIndex(r"C:\\ATD\\Hydraulic Models\\Bennett_MC\\ME\\ME_Valleys.g01")
+    geometry.title                                            # 'ME_Valleys'
+    text = geometry.read('node', ('Bennett', 'Main', '1000'))
+    geometry.replace('node', ('Bennett', 'Main', '1000'), text.replace('.035', '.045'))
+"""
+
+import json
+import mmap
+import os
+import re
+import shutil
+import tempfile
+
+# Keys that start a section -> section kind. A section runs up to the next section's key line
+SECTION_KEYS = {
+    'River Reach': 'reach',
+    'Type RM Length L Ch R': 'node',
+    'Junct Name': 'junction',
+    'Storage Area': 'storage_area',
+    'Connection': 'connection',
+    'BreakLine Name': 'breakline',
+    'BC Line Name': 'bc_line',
+    'LCMann Time': 'land_cover',
+    'LCMann Region Name': 'manning_region',
+}
+
+SECTION_PATTERN = re.compile(
+    rb'^(' + b'|'.join(re.escape(key.encode()) for key in SECTION_KEYS) + rb')[ \t]*=([^\r\n]*)', re.MULTILINE)
+
+# One byte per character, so byte offsets and string lengths agree
+ENCODING = 'latin-1'
+
+INDEX_VERSION = 1
+
+
+def section_key(kind, value, reach):
+    """
+    Lookup key of a section from the value of its key line.
+
+    Parameters:
+        kind (str): Section kind, see SECTION_KEYS.
+        value (str): Value after '=' on the key line.
+        reach (tuple): (river, reach) of the enclosing reach, for nodes.
+
+    Returns:
+        tuple or str: (river, reach) for reaches, (river, reach, station) for nodes, None for
+        the land-cover table (one per file), the stripped name for every other kind.
+    """
+    if kind == 'land_cover':
+        return None
+    parts = [part.strip() for part in value.split(',')]
+    if kind == 'reach':
+        return (parts[0], parts[1] if len(parts) > 1 else '')
+    if kind == 'node':
+        return tuple(reach or ('', '')) + (parts[1] if len(parts) > 1 else '',)
+    return parts[0]
+
+
+class GeometryIndex:
+    """
+    Byte-offset index of the sections of a geometry file, read through a memory map.
+
+    Attributes:
+        sections (list): One dict per section in file order with 'kind', 'key', 'start' and
+            'end' (byte offsets; end is exclusive). The header (the key=value block before the
+            first section) is the section of kind 'header'.
+    """
+
+    def __init__(self, geometry_path, use_index=True):
+        """
+        Parameters:
+            geometry_path (str): Geometry file (.g##).
+            use_index (bool): Read and write the offset index beside the file.
+        """
+        self.geometry_path = os.path.abspath(geometry_path)
+        self.index_path = self.geometry_path + '.index.json' if use_index else None
+        self.sections = []
+        self._lookup = {}
+        self._file = None
+        self._map = None
+        self._stat = None
+        self._open()
+        if not self._read_index():
+            self._build()
+            self._write_index()
+
+    # Memory map
+    def _open(self):
+        self._file = open(self.geometry_path, 'rb')
+        stat = os.fstat(self._file.fileno())
+        self._stat = (stat.st_size, stat.st_mtime_ns)
+        # An empty file cannot be mapped
+        self._map = mmap.mmap(self._file.fileno(), 0, access=mmap.ACCESS_READ) if stat.st_size else b''
+
+    def close(self):
+        # Releases the mapping; it must be released before the file is resized on Windows
+        if isinstance(self._map, mmap.mmap):
+            self._map.close()
+        if self._file is not None:
+            self._file.close()
+        self._map = self._file = None
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+    # Index
+    def _build(self):
+        sections = []
+        reach = None
+        for match in SECTION_PATTERN.finditer(self._map):
+            kind = SECTION_KEYS[match.group(1).decode(ENCODING)]
+            key = section_key(kind, match.group(2).decode(ENCODING), reach)
+            if kind == 'reach':
+                reach = key
+            sections.append({'kind': kind, 'key': key, 'start': match.start()})
+        sections.insert(0, {'kind': 'header', 'key': None, 'start': 0})
+        for section, following in zip(sections, sections[1:] + [{'start': self._stat[0]}]):
+            section['end'] = following['start']
+        self._set_sections(sections)
+
+    def _set_sections(self, sections):
+        self.sections = sections
+        # The first section of a kind and key wins if a name repeats
+        self._lookup = {}
+        for number, section in enumerate(sections):
+            self._lookup.setdefault((section['kind'], section['key']), number)
+
+    def _read_index(self):
+        # True if a saved index matching the file's size and modification time was loaded
+        if self.index_path is None or not os.path.exists(self.index_path):
+            return False
+        try:
+            with open(self.index_path, 'r') as file:
+                index = json.load(file)
+        except (OSError, ValueError):
+            return False
+        if index.get('version') != INDEX_VERSION or (index.get('size'), index.get('mtime_ns')) != self._stat:
+            return False
+        self._set_sections([{'kind': kind, 'key': tuple(key) if isinstance(key, list) else key,
+                             'start': start, 'end': end} for kind, key, start, end in index['sections']])
+        return True
+
+    def _write_index(self):
+        if self.index_path is None:
+            return
+        index = {'version': INDEX_VERSION, 'size': self._stat[0], 'mtime_ns': self._stat[1],
+                 'sections': [[section['kind'], section['key'], section['start'], section['end']]
+                              for section in self.sections]}
+        try:
+            handle, temp_path = tempfile.mkstemp(dir=os.path.dirname(self.index_path), suffix='.tmp')
+            with os.fdopen(handle, 'w') as file:
+                json.dump(index, file)
+            os.replace(temp_path, self.index_path)
+        except OSError as e:
+            print(f"Warning: could not save the geometry index {self.index_path}: {e}")
+
+    # Queries
+    def keys(self, kind):
+        # Keys of every section of a kind, in file order
+        return [section['key'] for section in self.sections if section['kind'] == kind]
+
+    def section(self, kind, key=None):
+        # Offsets of a section, see self.sections
+        number = self._lookup.get((kind, tuple(key) if isinstance(key, list) else key))
+        if number is None:
+            raise KeyError(f"No {kind} section {key!r} in {self.geometry_path}.")
+        return self.sections[number]
+
+    def read(self, kind, key=None):
+        """
+        Returns the text of one section, including its key line.
+
+        Parameters:
+            kind (str): Section kind, e.g. 'node', 'storage_area' or 'header'.
+            key: Section key, see section_key; None for the header.
+        """
+        section = self.section(kind, key)
+        return self._map[section['start']:section['end']].decode(ENCODING)
+
+    def lines(self, kind, key=None):
+        return self.read(kind, key).splitlines(keepends=True)
+
+    @property
+    def header(self):
+        # {key: value} of the header block
+        header = {}
+        for line in self.lines('header'):
+            if '=' in line:
+                key, value = line.rstrip('\r\n').split('=', 1)
+                header.setdefault(key.strip(), value.strip())
+        return header
+
+    @property
+    def title(self):
+        return self.header.get('Geom Title')
+
+    # Edits
+    def replace(self, kind, key, text):
+        """
+        Replaces the text of one section, see replace_many.
+        """
+        self.replace_many({(kind, key): text})
+
+    def replace_many(self, replacements):
+        """
+        Replaces the text of several sections in one pass over the file.
+
+        If every new text has the length of the text it replaces, the bytes are overwritten in
+        place. Otherwise the file is written to a temporary file beside it and renamed over it,
+        so an interruption leaves the original file intact. A replacement must start with the
+        key line of the section it replaces and hold no other section.
+
+        Parameters:
+            replacements (dict): {(kind, key): new text}.
+        """
+        edits = sorted(((self.section(kind, key), text.encode(ENCODING))
+                        for (kind, key), text in replacements.items()), key=lambda edit: edit[0]['start'])
+        if not edits:
+            return
+        for section, data in edits:
+            self._check_key_line(section, data)
+        if all(len(data) == section['end'] - section['start'] for section, data in edits):
+            self.close()
+            try:
+                with open(self.geometry_path, 'r+b') as file:
+                    for section, data in edits:
+                        file.seek(section['start'])
+                        file.write(data)
+            finally:
+                self._open()
+        else:
+            self._rewrite(edits)
+        self._write_index()
+
+    def _check_key_line(self, section, data):
+        # The saved offsets and keys stay valid only if the new text keeps the section's key line
+        reach = section['key'][:2] if section['kind'] == 'node' else None
+        matches = list(SECTION_PATTERN.finditer(data))
+        found = [(SECTION_KEYS[match.group(1).decode(ENCODING)],
+                  section_key(SECTION_KEYS[match.group(1).decode(ENCODING)], match.group(2).decode(ENCODING), reach))
+                 for match in matches]
+        expected = [] if section['kind'] == 'header' else [(section['kind'], section['key'])]
+        if found != expected or (matches and matches[0].start() != 0):
+            raise ValueError(f"The new text of {section['kind']} section {section['key']!r} must keep the "
+                             f"section's key line (none for the header) and hold no other section; found {found}.")
+
+    def _rewrite(self, edits):
+        # Writes the edited file under a temporary name, renames it over the original and shifts
+        # the offsets of the sections after each edit
+        handle, temp_path = tempfile.mkstemp(dir=os.path.dirname(self.geometry_path), suffix='.tmp')
+        try:
+            with os.fdopen(handle, 'wb') as file:
+                position = 0
+                for section, data in edits:
+                    file.write(self._map[position:section['start']])
+                    file.write(data)
+                    position = section['end']
+                file.write(self._map[position:])
+            shutil.copymode(self.geometry_path, temp_path)
+            # The mapping must be released before the file is replaced on Windows
+            self.close()
+            os.replace(temp_path, self.geometry_path)
+        except BaseException:
+            if os.path.exists(temp_path):
+                os.remove(temp_path)
+            raise
+        finally:
+            if self._file is None:
+                self._open()
+
+        shift = 0
+        changed = {id(section): len(data) - (section['end'] - section['start']) for section, data in edits}
+        for section in self.sections:
+            section['start'] += shift
+            shift += changed.get(id(section), 0)
+            section['end'] += shift
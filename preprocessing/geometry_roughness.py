@@ -0,0 +1,222 @@
+"""
+Manning's n editing directly in HEC-RAS geometry files (.g##).
+
+Monte Carlo roughness studies used to set n through the HEC-RAS Controller one cross section
+at a time (Geometry_SetManningsN) and then save the project, so every realization cost one COM
+round-trip per cross section. GeometryRoughness parses the geometry file once: the '#Mann='
+breakpoint tables of every 1D cross section are gathered into flat arrays, each breakpoint
+tagged as left overbank, channel or right overbank from the cross section's 'Bank Sta=' line,
+and the 2D land-cover overrides ('LCMann Table=') are read as name/value pairs. A realization
+is then one vectorized assignment over the n array, and writing it only re-formats the n
+fields; stations and every other line of the file are copied as they were.
+
+Usage:
+    roughness = GeometryRoughness(r"C:\\ATD\\Hydraulic Models\\Bennett_MC\\ME\\ME_Valleys.g01")
+    roughness.write(r"C:\\ATD\\Hydraulic Models\\Bennett_MC\\ME\\ME_Valleys.g02",
+                    channel_n=0.045, left_n=0.1, right_n=0.1)
+"""
+
+import os
+
+import numpy as np
+
+from preprocessing.ras_tables import (FIELD_WIDTH, fields_to_lines, fields_to_values, format_fields, header_count,
+                                      split_fixed_width, table_layout, table_line_count)
+from preprocessing.ras_project import write_atomic
+
+# Breakpoint regions of a cross section, see GeometryRoughness.regions
+LEFT_OVERBANK = 0
+CHANNEL = 1
+RIGHT_OVERBANK = 2
+
+# Decimals written for n values (HEC-RAS shows 3, the 8-character field holds 4)
+N_DECIMALS = 4
+
+
+class GeometryRoughness:
+    """
+    Manning's n tables of a geometry file, parsed once and rewritten per realization.
+
+    Attributes:
+        cross_sections (list): One dict per cross section with a '#Mann=' table: 'river',
+            'reach', 'station', 'bank_stations' ((left, right) or None), 'index' (line of the
+            '#Mann=' key), 'n_lines', 'start' and 'count' (its breakpoints in the flat arrays).
+        stations, n_values (np.ndarray): Breakpoint stations and n of all cross sections, in
+            file order.
+        regions (np.ndarray): LEFT_OVERBANK, CHANNEL or RIGHT_OVERBANK per breakpoint. A
+            breakpoint's n applies from its station to the next one, so breakpoints left of
+            the left bank station are left overbank and those at or right of the right bank
+            station are right overbank. Cross sections without bank stations are all channel.
+        land_cover (dict): 2D land-cover overrides {name: n}, in file order.
+    """
+
+    def __init__(self, geometry_path):
+        """
+        Parameters:
+            geometry_path (str): Geometry file (.g##).
+        """
+        self.geometry_path = geometry_path
+        with open(geometry_path, 'r', errors='replace') as file:
+            self.lines = file.readlines()
+        self.cross_sections = []
+        self.land_cover = {}
+        self._land_cover_lines = {}
+        self._parse()
+
+    def _parse(self):
+        per_entry, per_line = table_layout('#Mann')
+        river = reach = station = None
+        current = None
+        fields = []
+        start = 0
+        index = 0
+        while index < len(self.lines):
+            line = self.lines[index]
+            key, _, value = line.partition('=')
+            key = key.strip()
+            if key == 'River Reach':
+                parts = value.split(',')
+                river, reach = parts[0].strip(), (parts[1].strip() if len(parts) > 1 else '')
+            elif key == 'Type RM Length L Ch R':
+                # Type 1 is a cross section; bridges, culverts, ... (2-6) start a new node as well
+                parts = value.split(',')
+                station = parts[1].strip() if len(parts) > 1 else None
+                current = None
+            elif key == '#Mann':
+                count = header_count(line)
+                n_lines = table_line_count(count * per_entry, per_line)
+                block = split_fixed_width(self.lines[index + 1:], count * per_entry, per_line=per_line)
+                current = {'river': river, 'reach': reach, 'station': station, 'bank_stations': None,
+                           'index': index, 'n_lines': n_lines, 'start': start, 'count': count}
+                self.cross_sections.append(current)
+                fields.append(block)
+                start += count
+                index += n_lines
+            elif key == 'Bank Sta' and current is not None:
+                left, right = value.split(',')[:2]
+                current['bank_stations'] = (float(left), float(right))
+            elif key == 'LCMann Table':
+                for offset in range(1, header_count(line) + 1):
+                    name, _, n = self.lines[index + offset].rstrip('\r\n').rpartition(',')
+                    self.land_cover[name] = float(n)
+                    self._land_cover_lines[name] = index + offset
+                index += header_count(line)
+            index += 1
+
+        # (breakpoints, 3) raw fields: station, n and the unused third value of each triple
+        self._fields = (np.concatenate(fields) if fields else np.empty(0, dtype=f'S{FIELD_WIDTH}')).reshape(-1, 3)
+        self.stations = fields_to_values(self._fields[:, 0])
+        self.n_values = fields_to_values(self._fields[:, 1])
+        self.counts = np.array([xs['count'] for xs in self.cross_sections], dtype=np.int64)
+
+        left = np.full(len(self.cross_sections), -np.inf)
+        right = np.full(len(self.cross_sections), np.inf)
+        for number, xs in enumerate(self.cross_sections):
+            if xs['bank_stations'] is not None:
+                left[number], right[number] = xs['bank_stations']
+        left, right = np.repeat(left, self.counts), np.repeat(right, self.counts)
+        self.regions = np.where(self.stations < left, LEFT_OVERBANK,
+                                np.where(self.stations < right, CHANNEL, RIGHT_OVERBANK)).astype(np.int8)
+
+    def _per_breakpoint(self, value):
+        # A scalar, or one value per cross section, broadcast to every breakpoint
+        value = np.asarray(value, dtype=np.float64)
+        if value.ndim == 0:
+            return np.full(self.stations.size, float(value))
+        if value.shape != (len(self.cross_sections),):
+            raise ValueError(f"Expected a scalar or {len(self.cross_sections)} values (one per cross section), "
+                             f"got shape {value.shape}.")
+        return np.repeat(value, self.counts)
+
+    def realization(self, channel_n=None, left_n=None, right_n=None, factor=None, n_values=None):
+        """
+        Computes the breakpoint n values of one realization.
+
+        Parameters:
+            channel_n, left_n, right_n: n of the channel and overbank breakpoints; a scalar or
+                one value per cross section. None keeps the file's values for that region.
+            factor: Multiplier applied after the above (scalar or one per cross section).
+            n_values (array-like): Breakpoint n values to start from instead of the file's.
+
+        Returns:
+            np.ndarray: n per breakpoint, in the order of self.stations.
+        """
+        n = self.n_values.copy() if n_values is None else np.asarray(n_values, dtype=np.float64).copy()
+        if n.shape != self.n_values.shape:
+            raise ValueError(f"Expected {self.n_values.size} breakpoint values, got shape {n.shape}.")
+        for region, value in ((LEFT_OVERBANK, left_n), (CHANNEL, channel_n), (RIGHT_OVERBANK, right_n)):
+            if value is not None:
+                mask = self.regions == region
+                n[mask] = self._per_breakpoint(value)[mask]
+        if factor is not None:
+            n *= self._per_breakpoint(factor)
+        return n
+
+    def render(self, n_values=None, land_cover_n=None, **realization):
+        """
+        Returns the lines of the geometry file with new n values.
+
+        Parameters:
+            n_values (array-like): Breakpoint n values to start from, see realization().
+            land_cover_n (dict): New n of 2D land-cover overrides {name: n}; others are kept.
+            **realization: channel_n, left_n, right_n, factor, see realization().
+
+        Returns:
+            list: Lines of the new file.
+        """
+        n = self.realization(n_values=n_values, **realization)
+        per_line = table_layout('#Mann')[1]
+
+        # Only n fields whose value changed are re-formatted, all at once
+        fields = self._fields.astype(f'U{FIELD_WIDTH}')
+        changed = ~np.isclose(n, self.n_values, rtol=0, atol=1e-9)
+        if changed.any():
+            fields[changed, 1] = format_fields(n[changed], max_decimals=N_DECIMALS)
+        fields = fields.ravel()
+
+        lines = list(self.lines)
+        for xs in self.cross_sections:
+            block = fields_to_lines(fields[xs['start'] * 3:(xs['start'] + xs['count']) * 3], per_line)
+            lines[xs['index'] + 1:xs['index'] + 1 + xs['n_lines']] = block
+        for name, value in (land_cover_n or {}).items():
+            if name not in self._land_cover_lines:
+                raise KeyError(f"Land cover '{name}' has no override in {self.geometry_path}.")
+            lines[self._land_cover_lines[name]] = f"{name},{round(float(value), N_DECIMALS)}\n"
+        return lines
+
+    def write(self, output_path, n_values=None, land_cover_n=None, **realization):
+        """
+        Writes a realization-specific geometry file (atomically), see render().
+
+        Parameters:
+            output_path (str): Geometry file to write; may be the parsed file itself.
+
+        Returns:
+            str: output_path.
+        """
+        write_atomic(output_path, self.render(n_values, land_cover_n, **realization))
+        return output_path
+
+
+def write_realization_geometries(geometry_path, output_paths, land_cover_n=None, **samples):
+    """
+    Writes one geometry file per realization from a single parse of the source geometry.
+
+    Parameters:
+        geometry_path (str): Source geometry file (.g##).
+        output_paths (list): One output path per realization.
+        land_cover_n (list): Optional {name: n} per realization for 2D land-cover overrides.
+        **samples: channel_n, left_n, right_n or factor, each of shape (realizations,) or
+            (realizations, cross sections).
+
+    Returns:
+        list: The written paths.
+    """
+    roughness = GeometryRoughness(geometry_path)
+    written = []
+    for number, output_path in enumerate(output_paths):
+        realization = {key: np.asarray(value)[number] for key, value in samples.items() if value is not None}
+        written.append(roughness.write(output_path, land_cover_n=land_cover_n[number] if land_cover_n else None,
+                                       **realization))
+        print(f"Wrote {os.path.basename(output_path)} ({number + 1} of {len(output_paths)})")
+    return written
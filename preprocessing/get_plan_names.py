@@ -1,5 +1,8 @@
 import os
 
+from preprocessing.ras_project import get_project
+
+
 def extract_plan_title_from_file(filepath):
 
     with open(filepath, 'r') as file:
@@ -13,16 +16,12 @@ def extract_plan_title_from_file(filepath):
         return plan_title
 
 def extract_plan_titles_from_dir(directory):
+    # Plan titles from the project index (see ras_project), keyed by plan file name
+    project = get_project(directory, refresh=True)
     plan_titles = {}
-
-    # Iterate through all files in the directory
-    for filename in os.listdir(directory):
-        # Skip files that end with .hdr and files that do not match the '*.p*' pattern
-        if filename.endswith(".hdr") or not any(filename.endswith(ext) for ext in [f".p{str(i).zfill(2)}" for i in range(100)]):
-            continue
-        file_path = os.path.join(directory, filename)
-        plan_titles[filename] = extract_plan_title_from_file(file_path)
-               
+    for ext, title in project.titles('p').items():
+        if title is not None:
+            plan_titles[os.path.basename(project.path(ext))] = os.path.splitext(title)[0]
     return plan_titles
 
 def main():
@@ -0,0 +1,202 @@
+"""
+Plan and flow number allocation that is safe across processes.
+
+Scenario generators used to pick 'highest plan number + 1' separately for the .u## and the
+.p## they write, so two generators running on one project at the same time could take the
+same number, or a flow and its plan could end up with different numbers. NumberAllocator
+hands out numbers under an advisory lock file and reserves a number for every file kind at
+once (the .u## and the .p## of a scenario share one number). Reservations are kept in a
+small ledger next to the .prj until the files exist, so a number handed to one generator is
+never handed to another while it is still writing.
+
+Numbers go up to 99 by default. HEC-RAS also reads 3-digit extensions (.p100 to .p999), which
+the extended range (max_number=EXTENDED_MAX_NUMBER) uses once 01-99 are taken.
+
+Usage:
+    allocator = NumberAllocator(r"C:\\ATD\\Hydraulic Models\\Bennett_MC\\ME\\ME_Valleys.prj")
+    numbers = allocator.reserve(3)          # e.g. [14, 15, 16], free as u## and p##
+    ... write ME_Valleys.u14 / .p14, ... and register them in the .prj ...
+    allocator.release(numbers)
+"""
+
+import json
+import os
+import socket
+import tempfile
+import time
+from contextlib import contextmanager
+
+from preprocessing.ras_project import get_project
+
+# Highest number of the standard and the extended (3-digit) range
+MAX_NUMBER = 99
+EXTENDED_MAX_NUMBER = 999
+
+# File kinds reserved together by default: a flow file and the plan that runs it
+PAIRED_KINDS = ('u', 'p')
+
+# Seconds to wait for the lock, and age after which a lock left by a crashed process is broken
+LOCK_TIMEOUT_SECONDS = 60
+STALE_LOCK_SECONDS = 300
+
+# Seconds after which a reservation whose files never appeared is given up
+RESERVATION_TTL_SECONDS = 3600
+
+
+def file_extension(kind, number):
+    # 'p05' for 5, 'p105' for 105
+    return f"{kind}{number:02d}"
+
+
+class NumberAllocator:
+    """
+    Hands out plan/flow numbers of a project under an advisory lock file.
+
+    The lock is a '<project>.alloc.lock' file created with O_CREAT | O_EXCL, which is atomic
+    on local and network drives on Windows and Linux alike. It is held only while numbers are
+    picked or the .prj is rewritten, never while scenario files are written.
+    """
+
+    def __init__(self, prj_path, max_number=MAX_NUMBER, lock_timeout=LOCK_TIMEOUT_SECONDS,
+                 reservation_ttl=RESERVATION_TTL_SECONDS):
+        """
+        Parameters:
+            prj_path (str): Path to the .prj file.
+            max_number (int): Highest number handed out (MAX_NUMBER or EXTENDED_MAX_NUMBER).
+            lock_timeout (float): Seconds to wait for the lock before giving up.
+            reservation_ttl (float): Seconds after which an unused reservation expires.
+        """
+        if not 1 <= max_number <= EXTENDED_MAX_NUMBER:
+            raise ValueError(f"max_number must be between 1 and {EXTENDED_MAX_NUMBER}, got {max_number}.")
+        self.prj_path = os.path.abspath(prj_path)
+        self.max_number = max_number
+        self.lock_timeout = lock_timeout
+        self.reservation_ttl = reservation_ttl
+        base = os.path.splitext(self.prj_path)[0]
+        self.lock_path = base + '.alloc.lock'
+        self.ledger_path = base + '.reservations.json'
+        self._lock_depth = 0
+
+    @contextmanager
+    def lock(self):
+        """
+        Holds the project's allocation lock. Re-entrant within one allocator.
+        """
+        if self._lock_depth == 0:
+            self._acquire()
+        self._lock_depth += 1
+        try:
+            yield
+        finally:
+            self._lock_depth -= 1
+            if self._lock_depth == 0:
+                os.remove(self.lock_path)
+
+    def _acquire(self):
+        deadline = time.monotonic() + self.lock_timeout
+        delay = 0.01
+        while True:
+            try:
+                handle = os.open(self.lock_path, os.O_CREAT | os.O_EXCL | os.O_WRONLY)
+            except FileExistsError:
+                self._break_stale_lock()
+                if time.monotonic() > deadline:
+                    raise TimeoutError(f"Could not lock {self.lock_path} within {self.lock_timeout} s. "
+                                       f"Delete it if no generator is running on this project.")
+                time.sleep(delay)
+                delay = min(delay * 2, 0.5)
+                continue
+            with os.fdopen(handle, 'w') as file:
+                json.dump({'host': socket.gethostname(), 'pid': os.getpid(), 'time': time.time()}, file)
+            return
+
+    def _break_stale_lock(self):
+        # A lock older than STALE_LOCK_SECONDS was left behind by a process that died
+        try:
+            if time.time() - os.path.getmtime(self.lock_path) > STALE_LOCK_SECONDS:
+                print(f"Warning: removing stale lock {self.lock_path}")
+                os.remove(self.lock_path)
+        except FileNotFoundError:
+            pass
+
+    def _read_ledger(self):
+        # Live reservations {extension: {'host', 'pid', 'time'}}; expired ones are dropped
+        try:
+            with open(self.ledger_path, 'r') as file:
+                ledger = json.load(file)
+        except (FileNotFoundError, ValueError):
+            return {}
+        now = time.time()
+        return {ext: entry for ext, entry in ledger.items() if now - entry['time'] < self.reservation_ttl}
+
+    def _write_ledger(self, ledger):
+        if not ledger:
+            if os.path.exists(self.ledger_path):
+                os.remove(self.ledger_path)
+            return
+        handle, temp_path = tempfile.mkstemp(dir=os.path.dirname(self.ledger_path), suffix='.tmp')
+        with os.fdopen(handle, 'w') as file:
+            json.dump(ledger, file, indent=1)
+        os.replace(temp_path, self.ledger_path)
+
+    def _free_numbers(self, project, ledger, count, kinds, start=None):
+        # The lowest count numbers from start up to max_number that no file or reservation uses
+        number = project.next_number('p') if start is None else start
+        numbers = []
+        while len(numbers) < count and number <= self.max_number:
+            extensions = [file_extension(kind, number) for kind in kinds]
+            if not any(project.exists(ext) or ext in ledger for ext in extensions):
+                numbers.append(number)
+            number += 1
+        return numbers
+
+    def reserve(self, count=1, kinds=PAIRED_KINDS, start=None):
+        """
+        Reserves numbers that are free for every kind at once.
+
+        Parameters:
+            count (int): How many numbers to reserve.
+            kinds (tuple): File kinds that must all be free, e.g. ('u', 'p').
+            start (int): Lowest number to consider. Defaults to one past the highest plan,
+                so new plans always sort after the existing ones.
+
+        Returns:
+            list: The reserved numbers, ascending.
+        """
+        with self.lock():
+            # Files written by other generators since the project was indexed are picked up here
+            project = get_project(self.prj_path, refresh=True)
+            ledger = self._read_ledger()
+            numbers = self._free_numbers(project, ledger, count, kinds, start)
+            if len(numbers) < count:
+                raise ValueError(f"Only {len(numbers)} of {count} numbers are free up to {self.max_number} in "
+                                 f"{self.prj_path}. Use max_number={EXTENDED_MAX_NUMBER} for 3-digit numbers.")
+
+            entry = {'host': socket.gethostname(), 'pid': os.getpid(), 'time': time.time()}
+            for number in numbers:
+                for kind in kinds:
+                    ledger[file_extension(kind, number)] = entry
+            self._write_ledger(ledger)
+        return numbers
+
+    def release(self, numbers, kinds=PAIRED_KINDS):
+        """
+        Drops reservations, once their files exist or were abandoned.
+
+        Parameters:
+            numbers (list): Numbers returned by reserve.
+            kinds (tuple): The kinds they were reserved for.
+        """
+        with self.lock():
+            ledger = self._read_ledger()
+            for number in numbers:
+                for kind in kinds:
+                    ledger.pop(file_extension(kind, number), None)
+            self._write_ledger(ledger)
+
+    def peek(self, count=1, kinds=PAIRED_KINDS):
+        """
+        Returns the numbers reserve would hand out, without reserving them (for dry runs).
+        May return fewer than count numbers when the range is full.
+        """
+        return self._free_numbers(get_project(self.prj_path, refresh=True), self._read_ledger(), count, kinds)
@@ -0,0 +1,363 @@
+"""
+Indexed model of a HEC-RAS project folder (.prj, .p##, .u##, .g##, .f##).
+
+The scripts that generate and update plans used to rescan the project folder with glob or
+os.listdir and re-read whole files every time they needed a title or the next free plan
+number. RasProject parses the .prj and the header of every plan, flow and geometry file once
+and answers title, numbering and cross-reference queries from memory.
+
+Only the leading key=value block of a file is read (a geometry file stops being parsed at
+its first coordinate line), and the parsed headers are saved to a JSON index next to the
+.prj, keyed by file size and modification time. Reopening the project only stats the folder
+and re-reads the files that changed since.
+
+Usage:
+    project = get_project(r"C:\\ATD\\Hydraulic Models\\Bennett_MC\\ME\\ME_Valleys.prj")
+    project.title('p01')            # 'ME_1cms'
+    project.next_number('p')        # 14
+    project.plan_files('u01')       # ['p01', 'p05']
+"""
+
+import json
+import os
+import re
+import tempfile
+
+# File kinds of a project: extension letter -> title key
+FILE_KINDS = {
+    'p': 'Plan Title',
+    'u': 'Flow Title',
+    'f': 'Flow Title',
+    'g': 'Geom Title',
+}
+
+# Project files, e.g. ME_Valleys.p01 (not .p01.hdf, .p01.tmp.hdf, ...)
+PROJECT_FILE_PATTERN = re.compile(r'^(?P<base>.+)\.(?P<kind>[pufg])(?P<number>\d{2,3})$', re.IGNORECASE)
+
+# Header keys kept in the index
+HEADER_KEYS = ('Plan Title', 'Short Identifier', 'Flow Title', 'Geom Title', 'Program Version', 'Geom File',
+               'Flow File')
+
+# Lines read at most from the top of a file when looking for its header
+HEADER_MAX_LINES = 200
+
+# .prj keys that list the project's files, and the extension letter each one refers to
+PRJ_FILE_KEYS = {'Plan File': 'p', 'Unsteady File': 'u', 'Flow File': 'f', 'Geom File': 'g'}
+
+INDEX_VERSION = 1
+
+# Projects already opened in this process, keyed by .prj path
+_projects = {}
+
+
+def parse_header(file_path, max_lines=HEADER_MAX_LINES):
+    """
+    Reads the leading key=value block of a HEC-RAS text file.
+
+    Parameters:
+        file_path (str): Plan, flow or geometry file.
+        max_lines (int): Lines read at most.
+
+    Returns:
+        dict: First value of every key, stripped. Reading stops at the first line that is
+        not key=value (e.g. hydrograph or coordinate data).
+    """
+    header = {}
+    with open(file_path, 'r', errors='replace') as file:
+        for line_number, line in enumerate(file):
+            if line_number >= max_lines or '=' not in line:
+                break
+            key, value = line.rstrip('\r\n').split('=', 1)
+            header.setdefault(key.strip(), value.strip())
+    return header
+
+
+def parse_prj(prj_path):
+    """
+    Reads a .prj file.
+
+    Parameters:
+        prj_path (str): Path to the .prj file.
+
+    Returns:
+        dict: 'title', 'current_plan' and 'files' ({kind: [extensions in .prj order]}).
+    """
+    project = {'title': None, 'current_plan': None, 'files': {kind: [] for kind in FILE_KINDS}}
+    with open(prj_path, 'r', errors='replace') as file:
+        for line in file:
+            if '=' not in line:
+                continue
+            key, value = line.rstrip('\r\n').split('=', 1)
+            key, value = key.strip(), value.strip()
+            if key == 'Proj Title':
+                project['title'] = value
+            elif key == 'Current Plan':
+                project['current_plan'] = value
+            elif key in PRJ_FILE_KEYS and value:
+                project['files'][PRJ_FILE_KEYS[key]].append(value)
+    return project
+
+
+def find_prj(directory):
+    """
+    Finds the .prj of a project folder.
+
+    Parameters:
+        directory (str): Project folder.
+
+    Returns:
+        str: Path of the .prj file, or None. Shapefile projections (.prj files without a
+        'Proj Title=' line) are ignored.
+    """
+    for entry in sorted(os.scandir(directory), key=lambda entry: entry.name):
+        if entry.is_file() and entry.name.lower().endswith('.prj'):
+            with open(entry.path, 'r', errors='replace') as file:
+                if file.readline().startswith('Proj Title='):
+                    return entry.path
+    return None
+
+
+def write_atomic(file_path, lines):
+    """
+    Writes lines to a file through a temporary file in the same folder and a rename, so the
+    file is either fully updated or left untouched.
+
+    Parameters:
+        file_path (str): Destination file.
+        lines (list): Lines to write.
+    """
+    handle, temp_path = tempfile.mkstemp(dir=os.path.dirname(os.path.abspath(file_path)), suffix='.tmp')
+    try:
+        with os.fdopen(handle, 'w') as file:
+            file.writelines(lines)
+        os.replace(temp_path, file_path)
+    except BaseException:
+        if os.path.exists(temp_path):
+            os.remove(temp_path)
+        raise
+
+
+class RasProject:
+    """
+    In-memory index of a HEC-RAS project folder.
+
+    Every project file (.p##, .u##, .f##, .g##) of the folder that shares the .prj base name
+    is indexed by its extension ('p01', 'u03', ...) with its path, number and header. Files
+    written by this package are added with record() instead of rescanning the folder; files
+    changed by HEC-RAS or by hand are picked up by refresh().
+
+    Usage:
+        project = RasProject(r"C:\\ATD\\Hydraulic Models\\Bennett_MC\\ME")
+        for ext, title in project.titles('p').items():
+            print(ext, title)
+    """
+
+    def __init__(self, path, use_index=True):
+        """
+        Parameters:
+            path (str): .prj file or project folder.
+            use_index (bool): Read and write the JSON header index next to the .prj.
+        """
+        if os.path.isdir(path):
+            self.directory = os.path.abspath(path)
+            self.prj_path = find_prj(self.directory)
+        else:
+            self.directory = os.path.dirname(os.path.abspath(path))
+            self.prj_path = os.path.abspath(path)
+        self.base_name = os.path.splitext(os.path.basename(self.prj_path))[0] if self.prj_path else None
+        self.index_path = (os.path.join(self.directory, f"{self.base_name}.ras_index.json")
+                           if use_index and self.prj_path else None)
+        self.prj = None
+        self.files = {}
+        self._prj_stat = None
+        self.refresh()
+
+    def refresh(self):
+        """
+        Brings the index up to date: stats the folder once and re-reads only the headers of
+        files that are new or whose size or modification time changed.
+        """
+        cached = self._read_index()
+        files = {}
+        for entry in os.scandir(self.directory):
+            match = PROJECT_FILE_PATTERN.match(entry.name)
+            if not match or not entry.is_file():
+                continue
+            if self.base_name is not None and match.group('base') != self.base_name:
+                continue
+            stat = entry.stat()
+            ext = f"{match.group('kind').lower()}{match.group('number')}"
+            previous = self.files.get(ext) or cached.get(entry.name)
+            if previous and previous['size'] == stat.st_size and previous['mtime_ns'] == stat.st_mtime_ns:
+                files[ext] = previous
+            else:
+                files[ext] = self._file_entry(entry.path, stat)
+        # The index is rewritten only when an entry differs from what it holds
+        by_name = {entry['name']: entry for entry in files.values()}
+        changed = by_name.keys() != cached.keys() or any(cached[name] != entry for name, entry in by_name.items())
+        self.files = files
+
+        if self.prj_path is not None:
+            stat = os.stat(self.prj_path)
+            prj_stat = (stat.st_size, stat.st_mtime_ns)
+            if self.prj is None or prj_stat != self._prj_stat:
+                self.prj = parse_prj(self.prj_path)
+                self._prj_stat = prj_stat
+        if changed:
+            self._write_index()
+
+    def record(self, file_path):
+        """
+        Adds or updates one file in the index after it was written, without rescanning.
+
+        Parameters:
+            file_path (str): Project file (or the .prj itself) that was just written.
+        """
+        file_path = os.path.abspath(file_path)
+        if self.prj_path is not None and file_path == self.prj_path:
+            stat = os.stat(file_path)
+            self.prj = parse_prj(file_path)
+            self._prj_stat = (stat.st_size, stat.st_mtime_ns)
+            return
+        match = PROJECT_FILE_PATTERN.match(os.path.basename(file_path))
+        if not match:
+            raise ValueError(f"Not a HEC-RAS project file: {file_path}")
+        ext = f"{match.group('kind').lower()}{match.group('number')}"
+        self.files[ext] = self._file_entry(file_path, os.stat(file_path))
+        self._write_index()
+
+    # Queries
+    def path(self, ext):
+        # Path of a project file from its extension, e.g. 'p01'
+        entry = self.files.get(ext.lower().lstrip('.'))
+        return entry['path'] if entry else None
+
+    def exists(self, ext):
+        return ext.lower().lstrip('.') in self.files
+
+    def header(self, ext):
+        return self.files[ext.lower().lstrip('.')]['header']
+
+    def title(self, ext):
+        # Plan, flow or geometry title, None if the file has none
+        ext = ext.lower().lstrip('.')
+        return self.files[ext]['header'].get(FILE_KINDS[ext[0]]) if ext in self.files else None
+
+    def titles(self, kind=None):
+        """
+        Returns {extension: title} of every file of a kind ('p', 'u', 'f', 'g'), or of every
+        project file when kind is None, ordered by extension.
+        """
+        return {ext: self.title(ext) for ext in sorted(self.files) if kind is None or ext[0] == kind}
+
+    def numbers(self, kind):
+        # Numbers in use by files of a kind, sorted, e.g. [1, 2, 5] for p01, p02, p05
+        return sorted(entry['number'] for ext, entry in self.files.items() if ext[0] == kind)
+
+    def next_number(self, kind):
+        # One past the highest number in use by files of a kind
+        numbers = self.numbers(kind)
+        return numbers[-1] + 1 if numbers else 1
+
+    def plan_flow(self, plan_ext):
+        # Flow file extension a plan runs, e.g. 'u01'
+        return self.header(plan_ext).get('Flow File')
+
+    def plan_geometry(self, plan_ext):
+        # Geometry file extension a plan runs, e.g. 'g01'
+        return self.header(plan_ext).get('Geom File')
+
+    def plan_files(self, ext):
+        """
+        Returns the plans (extensions) that run a flow or geometry file.
+
+        Parameters:
+            ext (str): Flow or geometry extension, e.g. 'u01' or 'g02'.
+        """
+        key = 'Geom File' if ext.lower().startswith('g') else 'Flow File'
+        return [plan for plan in sorted(self.files) if plan[0] == 'p'
+                and self.files[plan]['header'].get(key, '').lower() == ext.lower()]
+
+    def registered(self, kind):
+        # Extensions of a kind that the .prj lists, in .prj order
+        return list(self.prj['files'][kind]) if self.prj else []
+
+    @property
+    def current_plan(self):
+        return self.prj['current_plan'] if self.prj else None
+
+    @property
+    def project_title(self):
+        return self.prj['title'] if self.prj else None
+
+    # Index file
+    def _file_entry(self, file_path, stat):
+        match = PROJECT_FILE_PATTERN.match(os.path.basename(file_path))
+        try:
+            header = parse_header(file_path)
+        except OSError:
+            header = {}
+        return {
+            'path': os.path.abspath(file_path),
+            'name': os.path.basename(file_path),
+            'number': int(match.group('number')),
+            'size': stat.st_size,
+            'mtime_ns': stat.st_mtime_ns,
+            'header': {key: value for key, value in header.items() if key in HEADER_KEYS},
+        }
+
+    def _read_index(self):
+        # Cached entries by file name; an unreadable or outdated index is ignored
+        if self.index_path is None or not os.path.exists(self.index_path):
+            return {}
+        try:
+            with open(self.index_path, 'r') as file:
+                index = json.load(file)
+        except (OSError, ValueError):
+            return {}
+        if index.get('version') != INDEX_VERSION:
+            return {}
+        files = index.get('files', {})
+        for entry in files.values():
+            entry['path'] = os.path.join(self.directory, entry['name'])
+        return files
+
+    def _write_index(self):
+        # Written under a temporary name and renamed, so a concurrent reader never sees half a file
+        if self.index_path is None:
+            return
+        files = {entry['name']: {key: value for key, value in entry.items() if key != 'path'}
+                 for entry in self.files.values()}
+        try:
+            handle, temp_path = tempfile.mkstemp(dir=self.directory, suffix='.tmp')
+            with os.fdopen(handle, 'w') as file:
+                json.dump({'version': INDEX_VERSION, 'files': files}, file, indent=1)
+            os.replace(temp_path, self.index_path)
+        except OSError as e:
+            print(f"Warning: could not save the project index {self.index_path}: {e}")
+
+
+def get_project(path, refresh=False):
+    """
+    Returns the RasProject of a .prj file or project folder, opened once per process.
+
+    Parameters:
+        path (str): .prj file or project folder.
+        refresh (bool): Re-stat the folder to pick up files changed outside this process.
+
+    Returns:
+        RasProject: The project.
+    """
+    # A folder and its .prj share one project; both keys are kept so neither is resolved twice
+    key = os.path.abspath(path)
+    project = _projects.get(key)
+    if project is None:
+        prj_path = find_prj(key) if os.path.isdir(key) else key
+        project = _projects.get(prj_path)
+        if project is None:
+            project = RasProject(prj_path if prj_path is not None else key)
+            _projects[prj_path if prj_path is not None else key] = project
+        _projects[key] = project
+    elif refresh:
+        project.refresh()
+    return project
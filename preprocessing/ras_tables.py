@@ -0,0 +1,234 @@
+"""
+Reading and writing the fixed-width numeric tables of HEC-RAS text files.
+
+HEC-RAS stores series such as flow and stage hydrographs, lateral inflows, rating curves
+and Manning's n breakpoints as a 'Key= count' line followed by a block of 8-character
+fields, 10 per line (the geometry file's '#Mann=' table uses 9 per line: 3 triples). The
+codec below turns a whole block into a NumPy array and back in bulk: the block is joined
+into one buffer and viewed as fixed-width byte fields, and values are formatted per group
+of equal precision, so a boundary with tens of thousands of ordinates reads and writes in
+milliseconds. Blocks are replaced whole, whatever their old and new length.
+
+Usage:
+    with open('ME_Valleys.u01') as file:
+        lines = file.readlines()
+    hydrograph = read_table(lines, 'Flow Hydrograph')
+    lines = replace_table(lines, find_tables(lines, 'Flow Hydrograph')[0]['index'], hydrograph * 2)
+"""
+
+import numpy as np
+
+# Width of one field and fields per line of the standard table layout
+FIELD_WIDTH = 8
+VALUES_PER_LINE = 10
+
+# Decimals written at most
+MAX_DECIMALS = 3
+
+# Known tables: key -> (values per entry, values per line). The count on the key line is the
+# number of entries, e.g. pairs of (stage, flow) for a rating curve
+TABLE_LAYOUTS = {
+    'Flow Hydrograph': (1, 10),
+    'Stage Hydrograph': (1, 10),
+    'Lateral Inflow Hydrograph': (1, 10),
+    'Uniform Lateral Inflow Hydrograph': (1, 10),
+    'Precipitation Hydrograph': (1, 10),
+    'Rating Curve': (2, 10),
+    '#Sta/Elev': (2, 10),
+    '#Mann': (3, 9),
+}
+
+
+def table_layout(key):
+    # (values per entry, values per line) of a table key, the standard layout if it is not known
+    return TABLE_LAYOUTS.get(key, (1, VALUES_PER_LINE))
+
+
+def table_line_count(n_values, per_line=VALUES_PER_LINE):
+    # Lines taken by a block of n_values fields
+    return -(-n_values // per_line)
+
+
+def split_fixed_width(lines, n_values, width=FIELD_WIDTH, per_line=VALUES_PER_LINE):
+    """
+    Splits a block of fixed-width fields into its raw fields, without converting them.
+
+    Parameters:
+        lines (list): The block's lines (at least table_line_count(n_values, per_line)).
+        n_values (int): Number of fields to read.
+        width (int): Field width in characters.
+        per_line (int): Fields per full line.
+
+    Returns:
+        np.ndarray: Byte-string fields (dtype 'S<width>'), right-padded with spaces.
+    """
+    line_width = width * per_line
+    block = ''.join(line.rstrip('\r\n').ljust(line_width)[:line_width]
+                    for line in lines[:table_line_count(n_values, per_line)])
+    fields = np.frombuffer(block.encode('ascii', errors='replace'), dtype=f'S{width}')[:n_values]
+    if len(fields) < n_values:
+        raise ValueError(f"Table block holds {len(fields)} values, expected {n_values}.")
+    return fields
+
+
+def parse_fixed_width(lines, n_values, width=FIELD_WIDTH, per_line=VALUES_PER_LINE):
+    """
+    Parses a block of fixed-width fields.
+
+    Parameters:
+        lines (list): The block's lines (at least table_line_count(n_values, per_line)).
+        n_values (int): Number of fields to read.
+        width (int): Field width in characters.
+        per_line (int): Fields per full line.
+
+    Returns:
+        np.ndarray: float64 values; blank fields are NaN.
+    """
+    return fields_to_values(split_fixed_width(lines, n_values, width, per_line))
+
+
+def fields_to_values(fields):
+    # float64 values of raw fields; blank fields are NaN
+    blank = np.char.strip(fields) == b''
+    return np.where(blank, b'nan', fields).astype(np.float64)
+
+
+def format_fields(values, width=FIELD_WIDTH, max_decimals=MAX_DECIMALS):
+    """
+    Formats values as right-aligned fixed-width fields.
+
+    Every value gets as many decimals (up to max_decimals) as fit its field, so large
+    ordinates lose decimals instead of overflowing into the next field.
+
+    Parameters:
+        values (array-like): Values to write; NaN is written as a blank field.
+        width (int): Field width in characters.
+        max_decimals (int): Decimals written at most.
+
+    Returns:
+        np.ndarray: One string of exactly width characters per value.
+    """
+    values = np.asarray(values, dtype=np.float64).ravel()
+    finite = np.isfinite(values)
+    magnitude = np.abs(np.where(finite, values, 0.0))
+    integer_digits = np.where(magnitude >= 1, np.floor(np.log10(np.maximum(magnitude, 1))) + 1, 1).astype(int)
+    sign = (values < 0).astype(int)
+    decimals = np.clip(width - 1 - integer_digits - sign, 0, max_decimals)
+
+    fields = np.full(values.size, ' ' * width, dtype=f'U{width + 2}')
+    for _ in range(2):
+        for precision in np.unique(decimals[finite]):
+            group = finite & (decimals == precision)
+            fields[group] = np.char.mod(f'%{width}.{precision}f', values[group])
+        # Rounding can add a digit (99.9996 -> 100.000); such values get one decimal less
+        too_wide = finite & (np.char.str_len(fields) > width) & (decimals > 0)
+        if not too_wide.any():
+            break
+        decimals[too_wide] -= 1
+    if (np.char.str_len(fields) > width).any():
+        raise ValueError(f"Values too large for {width}-character fields: {values[np.char.str_len(fields) > width][:5]}")
+    return fields.astype(f'U{width}')
+
+
+def fields_to_lines(fields, per_line=VALUES_PER_LINE):
+    # Joins fixed-width fields into lines of per_line fields, each ending in a newline
+    text = ''.join(fields.tolist())
+    line_width = len(fields[0]) * per_line if len(fields) else 1
+    return [text[start:start + line_width] + '\n' for start in range(0, len(text), line_width)]
+
+
+def format_fixed_width(values, width=FIELD_WIDTH, per_line=VALUES_PER_LINE, max_decimals=MAX_DECIMALS):
+    """
+    Formats values as a block of fixed-width fields, see format_fields.
+
+    Parameters:
+        values (array-like): Values to write; NaN is written as a blank field.
+        width (int): Field width in characters.
+        per_line (int): Fields per line.
+        max_decimals (int): Decimals written at most.
+
+    Returns:
+        list: Lines, each ending in a newline.
+    """
+    values = np.asarray(values, dtype=np.float64).ravel()
+    if values.size == 0:
+        return []
+    return fields_to_lines(format_fields(values, width, max_decimals), per_line)
+
+
+def header_count(line):
+    # Entry count of a 'Key= count[, ...]' line, e.g. 5 from 'Flow Hydrograph= 5' or 3 from '#Mann= 3 , 0 , 0'
+    value = line.split('=', 1)[1].split(',')[0].strip()
+    return int(float(value)) if value else 0
+
+
+def find_tables(lines, key):
+    """
+    Locates every table of a key in the lines of a HEC-RAS text file.
+
+    Parameters:
+        lines (list): Lines of the file.
+        key (str): Table key without '=', e.g. 'Flow Hydrograph' or '#Mann'.
+
+    Returns:
+        list: One dict per table with 'index' (line of the key), 'count' (entries),
+        'n_values' and 'n_lines' (lines of the value block).
+    """
+    per_entry, per_line = table_layout(key)
+    prefix = f"{key}="
+    tables = []
+    for index, line in enumerate(lines):
+        if line.lstrip().startswith(prefix):
+            count = header_count(line)
+            tables.append({'index': index, 'count': count, 'n_values': count * per_entry,
+                           'n_lines': table_line_count(count * per_entry, per_line)})
+    return tables
+
+
+def read_table(lines, key, occurrence=0):
+    """
+    Reads one table of a key.
+
+    Parameters:
+        lines (list): Lines of the file.
+        key (str): Table key, e.g. 'Flow Hydrograph'.
+        occurrence (int): Which table of that key (one per boundary condition), in file order.
+
+    Returns:
+        np.ndarray: (count,) values, or (count, values per entry) for paired tables.
+    """
+    tables = find_tables(lines, key)
+    if occurrence >= len(tables):
+        raise KeyError(f"Table {occurrence} of '{key}' not found ({len(tables)} in the file).")
+    table = tables[occurrence]
+    per_entry, per_line = table_layout(key)
+    values = parse_fixed_width(lines[table['index'] + 1:], table['n_values'], per_line=per_line)
+    return values if per_entry == 1 else values.reshape(-1, per_entry)
+
+
+def replace_table(lines, index, values, key=None):
+    """
+    Replaces the table whose key line is lines[index], whatever the old and new lengths.
+
+    Parameters:
+        lines (list): Lines of the file.
+        index (int): Line of the table key, see find_tables.
+        values (array-like): New values, (count,) or (count, values per entry).
+        key (str): Table key; read from the line when None.
+
+    Returns:
+        list: The updated lines (the input list is not modified). The count on the key line
+        is updated; any further fields on it (as on '#Mann=') are kept.
+    """
+    line = lines[index]
+    key = key or line.split('=', 1)[0].strip()
+    per_entry, per_line = table_layout(key)
+    values = np.asarray(values, dtype=np.float64)
+    count = values.shape[0] if values.ndim > 1 else values.size // per_entry
+
+    old_lines = table_line_count(header_count(line) * per_entry, per_line)
+    indent = line[:len(line) - len(line.lstrip())]
+    fields = line.rstrip('\r\n').split('=', 1)[1].split(',')
+    fields[0] = f" {count}" + (' ' if len(fields) > 1 else '')
+    header = f"{indent}{key}={','.join(fields)}\n"
+    return lines[:index] + [header] + format_fixed_width(values, per_line=per_line) + lines[index + 1 + old_lines:]
@@ -5,6 +5,8 @@ Current Plan in HEC-RAS project must be set before it is opened. Once a new plan
 
 import os
 
+from preprocessing.ras_project import get_project
+
 def set_current_plan(file_path, new_plan):
     #Check that there is an extension = new_plan in the file_path directory
     # eg is new_plan = p21, then check if there is a file with extension p21 in the file_path directory
@@ -13,14 +15,11 @@ def set_current_plan(file_path, new_plan):
     # Open the project file
     if not os.path.exists(file_path):
         raise FileNotFoundError(f"Project file not found: {file_path}")
-    file_dir = os.path.dirname(file_path)
-    ext_exists = False
+    # Refreshed, so a plan created since the project was first opened in this process is found
+    project = get_project(file_path, refresh=True)
     new_plan_ext = new_plan.split(".")[-1]
     print(f"new_plan_ext: {new_plan_ext}")
-    for file in os.listdir(file_dir):
-        if file.endswith(f".{new_plan_ext}"):
-            ext_exists = True
-            break
+    ext_exists = project.exists(new_plan_ext)
     if not ext_exists:
         # Provide a warning that the plan does not exist in the project directory
         print(f"Warning: Plan {new_plan} does not exist in the project directory.")
@@ -39,6 +38,7 @@ def set_current_plan(file_path, new_plan):
     # Write the updated content back to the file
     with open(file_path, 'w') as file:
         file.writelines(lines)
+    project.record(file_path)
     return ext_exists
 
 if __name__ == "__main__":
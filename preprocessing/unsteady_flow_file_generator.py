@@ -1,7 +1,13 @@
 import os
 import re
+from concurrent.futures import ThreadPoolExecutor
+
 import numpy as np
 
+from preprocessing.number_allocator import EXTENDED_MAX_NUMBER, MAX_NUMBER, NumberAllocator, file_extension
+from preprocessing.ras_project import get_project, write_atomic
+from preprocessing.ras_tables import find_tables, replace_table
+
 def create_hydrograph(max_flow_value, ramp_steps=2, steady_steps=3):
     """
     Creates a hydrograph array that ramps up to the max flow value.
@@ -25,41 +31,27 @@ def create_hydrograph(max_flow_value, ramp_steps=2, steady_steps=3):
     return ramp + steady
 
 
-def update_flow_hydrograph(input_file, new_hydrograph, new_title, max_flow_value):
+def update_flow_lines(lines, new_hydrograph, new_title, max_flow_value):
     """
-    Updates the Flow Hydrograph and Flow Title in the unsteady flow file.
+    Updates the Flow Hydrograph and Flow Title in the lines of an unsteady flow file.
 
     Parameters:
-        input_file (str): Path to the input file to be updated.
+        lines (list): Lines of the template flow file.
         new_hydrograph (list): The new hydrograph values.
+        new_title (str): The new Flow Title, or None to derive it from the max flow value.
         max_flow_value (float): The maximum flow value for the hydrograph.
-    
+
     Returns:
-        str: The path to the newly created file.
+        list: The updated lines (the input list is not modified).
     """
-    
     #If  max_flow value has a decimal with trailing 0s after, remove the trailing 0s
     max_flow_value = float(max_flow_value)
     max_flow_value = int(max_flow_value) if max_flow_value.is_integer() else max_flow_value
-    # Read the content of the input file
-    with open(input_file, 'r') as file:
-        lines = file.readlines()
+    lines = list(lines)
     
-    # Update Flow Hydrograph and Flow Title
+    # Update Flow Title
     for i, line in enumerate(lines):
-        if line.strip().startswith("Flow Hydrograph="):
-            # Update the line to reflect the new array length
-            lines[i] = f"Flow Hydrograph= {len(new_hydrograph)}\n"
-            
-            # Replace the subsequent line with the new hydrograph values
-            formatted_hydrograph = ''.join(
-                f'{x:8.3f}' if x >= 1 or x == 0 else f' {x:7.3f}'  # Ensures 8 characters for each number
-                for x in new_hydrograph
-            ).rstrip()  # Remove the trailing spaces after the last number
-            
-            lines[i + 1] = formatted_hydrograph + '\n'
-        
-        elif line.strip().startswith("Flow Title=") and new_title is not None:
+        if line.strip().startswith("Flow Title=") and new_title is not None:
             # Extract the base title and update it with the new max flow value
             base_title = re.match(r'Flow Title=(.*?)[0-9]*cms', line.strip()).group(1).strip()
             new_flow_title = f"Flow Title={base_title}{int(max_flow_value)}cms\n"
@@ -78,53 +70,64 @@ def update_flow_hydrograph(input_file, new_hydrograph, new_title, max_flow_value
                 new_title = f"{old_title_prefix}_{max_flow_value}cms"
             lines[i] = f"Flow Title={new_title}\n"
 
+    # Replace every Flow Hydrograph block (10 values of 8 characters per line), bottom up so
+    # the line numbers of the blocks above stay valid when a block changes length
+    for table in reversed(find_tables(lines, 'Flow Hydrograph')):
+        lines = replace_table(lines, table['index'], new_hydrograph)
+    return lines
+
+
+def update_flow_hydrograph(input_file, new_hydrograph, new_title, max_flow_value, number=None):
+    """
+    Updates the Flow Hydrograph and Flow Title in the unsteady flow file.
+
+    Parameters:
+        input_file (str): Path to the input file to be updated.
+        new_hydrograph (list): The new hydrograph values.
+        max_flow_value (float): The maximum flow value for the hydrograph.
+        number (int): Number of the new flow file, reserved with NumberAllocator. None takes
+            the number the next plan file will get.
     
-    # Get directory
-    dir_name = os.path.dirname(input_file)
-    # Find all .p## files in the directory
-    import glob
-    p_files = glob.glob(os.path.join(dir_name, '*.p[0-9][0-9]'))
-    # Find the highest number in p_files
-    highest_number = 0
-    for p_file in p_files:
-        base_name, ext = os.path.splitext(p_file)
-        ext_number = int(ext[2:])
-        if ext_number > highest_number:
-            highest_number = ext_number
-    
-    # Determine the new file extension
+    Returns:
+        str: The path to the newly created file.
+    """
+    # Read the content of the input file
+    with open(input_file, 'r') as file:
+        lines = update_flow_lines(file.readlines(), new_hydrograph, new_title, max_flow_value)
+
+    # The new flow file takes the number the next plan file will get (from the project index)
+    project = get_project(os.path.dirname(input_file))
     base_name, ext = os.path.splitext(input_file)
-    ext_number = int(re.search(r'\d+$', ext).group())
-    new_ext_number = f"{highest_number + 1:02}"
-    new_file = f"{base_name}.u{new_ext_number}"
+    new_file = f"{base_name}.{file_extension('u', project.next_number('p') if number is None else number)}"
     
     # Write the modified content to the new file
     with open(new_file, 'w') as file:
         file.writelines(lines)
+    project.record(new_file)
     
     print(f"Updated file saved as {new_file}")
     return new_file
 
-def update_plan_file(file_path, new_flow_file, new_title, max_flow_value):
+def update_plan_lines(lines, new_flow_file, new_title, max_flow_value):
     """
-    Updates the Flow File and Short Identifier in the specified HEC-RAS plan file,
-    and saves a copy of the file with the extension updated by one number.
+    Updates the Flow File, Plan Title and Short Identifier in the lines of a plan file.
 
     Parameters:
-        file_path (str): The path to the text file to be updated.
-        new_flow_file (str): The new Flow File string to replace the existing one.
-        new_title (str): The new identifier string to replace the existing Short Identifier.
+        lines (list): Lines of the template plan file.
+        new_flow_file (str): The new Flow File string to replace the existing one, e.g. 'u05'.
+        new_title (str): The new Plan Title and Short Identifier, or None to derive them from
+            the max flow value.
+        max_flow_value (float): The maximum flow value of the plan.
+
+    Returns:
+        list: The updated lines (the input list is not modified).
     """
     # Rename the title, using the format "{Area Name}_{Max Flow}cms"
 
     #If  max_flow value has a decimal with trailing 0s after, remove the trailing 0s
     max_flow_value = float(max_flow_value)
     max_flow_value = int(max_flow_value) if max_flow_value.is_integer() else max_flow_value
-    
-    
-    # Read the content of the file
-    with open(file_path, 'r') as file:
-        lines = file.readlines()
+    lines = list(lines)
 
     # Update the relevant lines
     for i, line in enumerate(lines):
@@ -157,23 +160,30 @@ def update_plan_file(file_path, new_flow_file, new_title, max_flow_value):
             else:
                 new_title = f"{old_title_prefix}_{max_flow_value}cms"
             lines[i] = f"Short Identifier={new_title}\n"
-    # Increment the extension number
-    #get directory
-    dir_name = os.path.dirname(file_path)
-    #find all .p## files in the directory
-    import glob
-    p_files = glob.glob(os.path.join(dir_name, '*.p[0-9][0-9]'))
-    #find the highest number in p_files
-    highest_number = 0
-    for p_file in p_files:
-        base_name, ext = os.path.splitext(p_file)
-        ext_number = int(ext[2:])
-        if ext_number > highest_number:
-            highest_number = ext_number
+    return lines
+
+
+def update_plan_file(file_path, new_flow_file, new_title, max_flow_value, number=None):
+    """
+    Updates the Flow File and Short Identifier in the specified HEC-RAS plan file,
+    and saves a copy of the file with the extension updated by one number.
+
+    Parameters:
+        file_path (str): The path to the text file to be updated.
+        new_flow_file (str): The new Flow File string to replace the existing one.
+        new_title (str): The new identifier string to replace the existing Short Identifier.
+        number (int): Number of the new plan file, reserved with NumberAllocator. None takes
+            one past the highest plan.
+    """
+    # Read the content of the file
+    with open(file_path, 'r') as file:
+        lines = update_plan_lines(file.readlines(), new_flow_file, new_title, max_flow_value)
+
+    # Increment the extension number past the highest plan in the project index
+    project = get_project(os.path.dirname(file_path))
     base_name, ext = os.path.splitext(file_path)
     if ext.startswith('.p') and ext[2:].isdigit():
-        new_ext_number = highest_number + 1
-        new_ext = f"p{new_ext_number:02d}"
+        new_ext = file_extension('p', project.next_number('p') if number is None else number)
     else:
         raise ValueError(f"Unexpected file extension format: {ext}")
 
@@ -184,10 +194,44 @@ def update_plan_file(file_path, new_flow_file, new_title, max_flow_value):
     # Write the updated content to the new file
     with open(new_file_path, 'w') as new_file:
         new_file.writelines(lines)
+    project.record(new_file_path)
 
     print(f"Updated file saved as: {new_file_path}")
     return new_file_path
 
+def update_prj_lines(lines, new_unsteady_files, new_plan_files):
+    """
+    Adds Unsteady File and Plan File entries to the lines of a .prj file, directly below the
+    last pre-existing entry of each kind. Entries already in the file are skipped.
+
+    Parameters:
+        lines (list): Lines of the .prj file.
+        new_unsteady_files (list): Unsteady File entries to add, e.g. ['u05', 'u06'].
+        new_plan_files (list): Plan File entries to add, e.g. ['p05', 'p06'].
+
+    Returns:
+        list: The updated lines (the input list is not modified).
+    """
+    lines = list(lines)
+    insertions = []
+    for key, new_files in (("Unsteady File=", new_unsteady_files), ("Plan File=", new_plan_files)):
+        existing = {line.strip() for line in lines if line.strip().startswith(key)}
+        last_index = max((i for i, line in enumerate(lines) if line.strip().startswith(key)), default=-1)
+        new_lines = []
+        for new_file in new_files:
+            if f"{key}{new_file}" in existing:
+                print(f"{key[:-1]} {new_file} already in the .prj file")
+            else:
+                new_lines.append(f"{key}{new_file}\n")
+        if last_index != -1 and new_lines:
+            insertions.append((last_index + 1, new_lines))
+
+    # Insert from the bottom up so the earlier insertion points stay valid
+    for index, new_lines in sorted(insertions, reverse=True):
+        lines[index:index] = new_lines
+    return lines
+
+
 def update_prj_file(prj_file_path, new_unsteady_file, new_plan_file):
     """
     Updates the .prj file to include the new unsteady and plan file lines
@@ -200,39 +244,11 @@ def update_prj_file(prj_file_path, new_unsteady_file, new_plan_file):
     """
     # Read the content of the .prj file
     with open(prj_file_path, 'r') as file:
-        lines = file.readlines()
-
-    # Find the last Unsteady File and Plan File lines
-    unsteady_exists = False
-    plan_exists = False
-    last_unsteady_index = -1
-    last_plan_index = -1
-    for i, line in enumerate(lines):
-        if line.strip().startswith("Unsteady File="):
-            last_unsteady_index = i
-        elif line.strip().startswith("Plan File="):
-            last_plan_index = i
-    #check if new_unsteady_file and new_plan_file are already in the file
-    for line in lines:
-        if line.strip().startswith("Unsteady File="):
-            if line.strip() == f"Unsteady File={new_unsteady_file}":
-                print(f"Unsteady File {new_unsteady_file} already in {prj_file_path}")
-                unsteady_exists = True
-        if line.strip().startswith("Plan File="):
-            if line.strip() == f"Plan File={new_plan_file}":
-                print(f"Plan File {new_plan_file} already in {prj_file_path}")
-                plan_exists = True
-    # Insert the new Unsteady File line after the last one
-    if last_unsteady_index != -1 and not unsteady_exists:
-        lines.insert(last_unsteady_index + 1, f"Unsteady File={new_unsteady_file}\n")
-    
-    # Insert the new Plan File line after the last one
-    if last_plan_index != -1 and not plan_exists:
-        lines.insert(last_plan_index + 1, f"Plan File={new_plan_file}\n")
+        lines = update_prj_lines(file.readlines(), [new_unsteady_file], [new_plan_file])
 
     # Write the updated content back to the .prj file
-    with open(prj_file_path, 'w') as file:
-        file.writelines(lines)
+    write_atomic(prj_file_path, lines)
+    get_project(prj_file_path).record(prj_file_path)
     
     print(f"Updated .prj file saved as: {prj_file_path}")
 
@@ -246,23 +262,126 @@ def generate_hydrograph_and_update_plan(input_flow_file, input_plan_file, input_
         input_prj_file (str): Path to the .prj file to be updated.
         max_flow_value (float): Maximum flow value for the hydrograph.
     """
-    # Generate new hydrograph
-    new_hydrograph = create_hydrograph(max_flow_value)
-    
-    # Update flow hydrograph file and flow title
-    new_flow_file_path = update_flow_hydrograph(input_flow_file, new_hydrograph, new_title, max_flow_value)
-    
-    # Extract just the extension for the flow and plan files
-    new_flow_file = os.path.splitext(os.path.basename(new_flow_file_path))[1][1:]
-    
-    # Update plan file
-    new_plan_file_path = update_plan_file(input_plan_file, new_flow_file, new_title, max_flow_value)
-    
-    # Extract just the extension for the plan file
-    new_plan_file = os.path.splitext(os.path.basename(new_plan_file_path))[1][1:]
-    
-    # Update the .prj file with the new unsteady and plan files
-    update_prj_file(input_prj_file, new_flow_file, new_plan_file)
+    # One number for both files, reserved so a concurrent generator cannot take it
+    allocator = NumberAllocator(input_prj_file)
+    number = allocator.reserve(1)[0]
+    try:
+        # Generate new hydrograph
+        new_hydrograph = create_hydrograph(max_flow_value)
+
+        # Update flow hydrograph file and flow title
+        new_flow_file_path = update_flow_hydrograph(input_flow_file, new_hydrograph, new_title, max_flow_value,
+                                                    number=number)
+
+        # Extract just the extension for the flow and plan files
+        new_flow_file = os.path.splitext(os.path.basename(new_flow_file_path))[1][1:]
+
+        # Update plan file
+        new_plan_file_path = update_plan_file(input_plan_file, new_flow_file, new_title, max_flow_value,
+                                              number=number)
+
+        # Extract just the extension for the plan file
+        new_plan_file = os.path.splitext(os.path.basename(new_plan_file_path))[1][1:]
+
+        # Update the .prj file with the new unsteady and plan files
+        with allocator.lock():
+            update_prj_file(input_prj_file, new_flow_file, new_plan_file)
+    finally:
+        allocator.release([number])
+
+
+def generate_scenarios(input_flow_file, input_plan_file, input_prj_file, scenarios, workers=None, dry_run=False,
+                       max_number=MAX_NUMBER):
+    """
+    Generates the flow and plan files of many scenarios and registers them in the .prj at once.
+
+    The templates are read once and every number is reserved up front with NumberAllocator,
+    so several generators can run on one project at the same time. The new files are
+    written in parallel (each through a temporary file and a rename), and the .prj is
+    rewritten once, atomically and under the allocation lock, after all of them exist. If
+    writing fails, the files of the batch are removed again and the .prj is left untouched.
+
+    Parameters:
+        input_flow_file (str): Template unsteady flow file.
+        input_plan_file (str): Template plan file.
+        input_prj_file (str): Path to the .prj file to be updated.
+        scenarios (list): One dict per scenario with 'max_flow_value' and optionally
+            'title' (None derives it from the max flow value), 'hydrograph' (explicit values)
+            or 'ramp_steps' / 'steady_steps' (see create_hydrograph).
+        workers (int): Threads writing the files. Defaults to the ThreadPoolExecutor default.
+        dry_run (bool): Only report what would be created.
+        max_number (int): Highest plan/flow number, MAX_NUMBER (99) or EXTENDED_MAX_NUMBER
+            for 3-digit extensions.
+
+    Returns:
+        list: One dict per scenario with 'number', 'flow_file', 'plan_file' (paths),
+        'flow_ext', 'plan_ext' and 'max_flow_value'.
+    """
+    project = get_project(input_prj_file)
+    with open(input_flow_file, 'r') as file:
+        flow_template = file.readlines()
+    with open(input_plan_file, 'r') as file:
+        plan_template = file.readlines()
+
+    allocator = NumberAllocator(input_prj_file, max_number=max_number)
+    numbers = allocator.peek(len(scenarios)) if dry_run else allocator.reserve(len(scenarios))
+    if len(numbers) < len(scenarios):
+        # Only peek gets here; a dry run fails where the real run would, instead of dropping scenarios
+        raise ValueError(f"Only {len(numbers)} of {len(scenarios)} numbers are free up to {max_number} in "
+                         f"{input_prj_file}. Use max_number={EXTENDED_MAX_NUMBER} for 3-digit numbers.")
+
+    flow_base = os.path.splitext(input_flow_file)[0]
+    plan_base = os.path.splitext(input_plan_file)[0]
+    created, contents = [], []
+    for number, scenario in zip(numbers, scenarios):
+        max_flow_value = scenario['max_flow_value']
+        hydrograph = scenario.get('hydrograph')
+        if hydrograph is None:
+            hydrograph = create_hydrograph(max_flow_value, scenario.get('ramp_steps', 2),
+                                           scenario.get('steady_steps', 3))
+        flow_ext, plan_ext = file_extension('u', number), file_extension('p', number)
+        flow_file, plan_file = f"{flow_base}.{flow_ext}", f"{plan_base}.{plan_ext}"
+        contents.append((flow_file, update_flow_lines(flow_template, hydrograph, scenario.get('title'),
+                                                      max_flow_value)))
+        contents.append((plan_file, update_plan_lines(plan_template, flow_ext, scenario.get('title'),
+                                                      max_flow_value)))
+        created.append({'number': number, 'flow_file': flow_file, 'plan_file': plan_file, 'flow_ext': flow_ext,
+                        'plan_ext': plan_ext, 'max_flow_value': max_flow_value})
+
+    if dry_run:
+        for entry in created:
+            print(f"Would create {entry['flow_file']} and {entry['plan_file']} "
+                  f"(max flow {entry['max_flow_value']})")
+        print(f"Would add {len(created)} Unsteady File and Plan File entries to {input_prj_file}")
+        return created
+
+    try:
+        try:
+            with ThreadPoolExecutor(max_workers=workers) as pool:
+                list(pool.map(lambda item: write_atomic(*item), contents))
+        except BaseException:
+            # Roll the batch back; its numbers were reserved, so every file of the batch is new
+            for file_path, _ in contents:
+                if os.path.exists(file_path):
+                    os.remove(file_path)
+            raise
+
+        # Registered only once every file exists. The .prj is re-read under the lock, so
+        # entries added by a concurrent generator in the meantime are kept
+        with allocator.lock():
+            with open(input_prj_file, 'r') as file:
+                prj_lines = update_prj_lines(file.readlines(), [entry['flow_ext'] for entry in created],
+                                             [entry['plan_ext'] for entry in created])
+            write_atomic(input_prj_file, prj_lines)
+    finally:
+        allocator.release(numbers)
+
+    for file_path, _ in contents:
+        project.record(file_path)
+    project.record(input_prj_file)
+    print(f"Created {len(created)} scenarios and updated {input_prj_file}")
+    return created
+
 
 if __name__ == "__main__":
 
@@ -281,7 +400,5 @@ if __name__ == "__main__":
 
         # Set to a string to replace the Short Identifier and Plan Title and Flow Title
         new_title = None # If None, the title will be updated based on {Text before '_' in old plan title}_{the max flow value}cms
-        for max_flow_value in max_flow_value_list:
-            generate_hydrograph_and_update_plan(input_flow_file_path, input_plan_file_path, 
-                                                input_prj_file_path, max_flow_value, new_title = new_title) 
-
+        scenarios = [{'max_flow_value': max_flow_value, 'title': new_title} for max_flow_value in max_flow_value_list]
+        generate_scenarios(input_flow_file_path, input_plan_file_path, input_prj_file_path, scenarios)
@@ -1,43 +1,59 @@
 import shutil
 import os
 
-def save_hec_ras_project(src_project_folder, dest_folders):
+def _copy_if_changed(src_item, dest_item):
+    # Copies a file unless the destination already has the same size and modification time
+    if os.path.exists(dest_item):
+        src_stat, dest_stat = os.stat(src_item), os.stat(dest_item)
+        if src_stat.st_size == dest_stat.st_size and int(src_stat.st_mtime) == int(dest_stat.st_mtime):
+            return dest_item
+    return shutil.copy2(src_item, dest_item)
+
+def save_hec_ras_project(src_project_folder, dest_folders, ignore=None, update_only=False):
     """
     Saves the contents of a HEC-RAS project folder to multiple destination folders.
 
     Parameters:
     src_project_folder (str): The path to the source HEC-RAS project folder.
     dest_folders (list of str): A list of destination folders where the project contents should be copied.
+    ignore (callable): Optional filter like shutil.ignore_patterns('*.p??.hdf'); matching files and folders are not copied.
+    update_only (bool): Skip files whose copy already has the same size and modification time (for reused workspaces).
     """
     if not os.path.exists(src_project_folder):
         raise ValueError(f"Source project folder '{src_project_folder}' does not exist.")
 
+    copy_function = _copy_if_changed if update_only else shutil.copy2
     for dest_folder in dest_folders:
         # Ensure the destination directory exists, if not, create it
         os.makedirs(dest_folder, exist_ok=True)
 
         # Copy all files and subdirectories from the source folder to the destination
-        for item in os.listdir(src_project_folder):
+        items = os.listdir(src_project_folder)
+        ignored = ignore(src_project_folder, items) if ignore else set()
+        for item in items:
+            if item in ignored:
+                continue
             src_item = os.path.join(src_project_folder, item)
             dest_item = os.path.join(dest_folder, item)
 
             if os.path.isdir(src_item):
                 # Copy directory
-                shutil.copytree(src_item, dest_item, dirs_exist_ok=True)
+                shutil.copytree(src_item, dest_item, dirs_exist_ok=True, ignore=ignore, copy_function=copy_function)
             else:
                 # Copy file
-                shutil.copy2(src_item, dest_item)
+                copy_function(src_item, dest_item)
 
         print(f"Project contents saved to: {dest_folder}")
 
-src_project_folder = r"C:\ATD\Hydraulic Models\UM_Valleys"
-dest_folders = [
-    r"C:\ATD\Hydraulic Models\Bennett\ME",
-r"C:\ATD\Hydraulic Models\Bennett\MM",
-r"C:\ATD\Hydraulic Models\Bennett\MW",
-r"C:\ATD\Hydraulic Models\Bennett\UE",
-r"C:\ATD\Hydraulic Models\Bennett\UM",
-r"C:\ATD\Hydraulic Models\Bennett\UW",
-]
-
-save_hec_ras_project(src_project_folder, dest_folders)
+if __name__ == "__main__":
+    src_project_folder = r"C:\ATD\Hydraulic Models\UM_Valleys"
+    dest_folders = [
+        r"C:\ATD\Hydraulic Models\Bennett\ME",
+    r"C:\ATD\Hydraulic Models\Bennett\MM",
+    r"C:\ATD\Hydraulic Models\Bennett\MW",
+    r"C:\ATD\Hydraulic Models\Bennett\UE",
+    r"C:\ATD\Hydraulic Models\Bennett\UM",
+    r"C:\ATD\Hydraulic Models\Bennett\UW",
+    ]
+
+    save_hec_ras_project(src_project_folder, dest_folders)
@@ -1,6 +1,3 @@
-import os
-import re
-
 """
 Extracts the plan, flow, and/opr geometry titles from the input HEC-RAS project folder. 
 Loops through all files with the extensions .p##, .u##, and .g## in the project directory and extract the titles.
@@ -9,35 +6,25 @@ Print titles next to the file names.
 """
 
 import os
-import re
+
+from preprocessing.ras_project import FILE_KINDS, get_project, parse_header
 
 # Function to extract title from file content
 def extract_title(file_path):
-    title_patterns = {
-        '.p': r'Plan Title=(.*)',
-        '.u': r'Flow Title=(.*)',
-        '.g': r'Geom Title=(.*)'
-    }
-    
-    ext = os.path.splitext(file_path)[1][:2]  # Get the extension prefix like .p, .u, .g
-    
-    with open(file_path, 'r') as file:
-        content = file.read()
-        pattern = title_patterns.get(ext)
-        if pattern:
-            match = re.search(pattern, content)
-            if match:
-                return match.group(1).strip()  # Return the first match as the title
-    return None
+    # Only the header block is read, not the whole (geometry) file
+    kind = os.path.splitext(file_path)[1][1:2].lower()  # Get the extension letter like p, u, g
+    if kind not in FILE_KINDS:
+        return None
+    return parse_header(file_path).get(FILE_KINDS[kind]) or None
 
-# Directory containing the HEC-RAS project files
-project_directory = r"C:\ATD\Hydraulic Models\Bennett_MC"
+if __name__ == "__main__":
+    # Directory containing the HEC-RAS project files
+    project_directory = r"C:\ATD\Hydraulic Models\Bennett_MC"
 
-# Loop through the directory and process relevant files
-for file_name in os.listdir(project_directory):
-    if re.match(r'.*\.(p\d+|u\d+|g\d+)$', file_name):  # Match files with .p##, .u##, .g## extensions
-        file_path = os.path.join(project_directory, file_name)
-        title = extract_title(file_path)
+    # Titles of every .p##, .u## and .g## file from the project index
+    project = get_project(project_directory, refresh=True)
+    for ext, title in project.titles().items():
+        file_name = os.path.basename(project.path(ext))
         if title:
             print(f"{file_name}: {title}")
         else:
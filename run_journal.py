@@ -0,0 +1,269 @@
+"""
+Journal of plan runs, so interrupted or repeated batches only compute what is out of date.
+
+run_multiple_HEC_RAS_plans kept no record of what had finished: after an interruption every
+plan was computed again, including those whose .p##.hdf was already complete. RunJournal
+keeps '<project>.run_journal.json' beside the .prj with, for every plan, a hash of its inputs
+(the plan, flow and geometry files, the geometry HDF, the .rasmap and the terrain reference),
+its status and a hash of its result file. A plan is skipped when it completed, its inputs
+hash as they did when it ran and its .p##.hdf is unchanged and reports a successful solution
+('Solution' attribute of Results/Unsteady/Summary). A plan left 'running' by an aborted batch
+is run again.
+
+Text inputs are hashed by content; large binary files (terrain, geometry HDF) by size and
+modification time. File hashes are cached in the journal by size and modification time, so
+checking a batch of unchanged plans re-reads nothing.
+
+Usage:
+    journal = RunJournal(r"C:\\ATD\\Hydraulic Models\\Bennett_MC\\UE\\UE_Valleys.prj", terrain_file)
+    for plan in journal.pending(['p02', 'p04', 'p05']):
+        journal.start(plan)
+        ... run the plan ...
+        journal.finish(plan, succeeded=True)
+"""
+
+import hashlib
+import json
+import os
+import tempfile
+import threading
+import time
+
+import h5py
+
+from postprocessing.ras_hdf import solution_status
+from preprocessing.ras_project import get_project
+
+JOURNAL_VERSION = 1
+
+# Files larger than this are identified by size and modification time instead of content
+HASH_SIZE_LIMIT = 256 * 1024 * 1024
+
+# Read size when hashing a file
+HASH_CHUNK_SIZE = 4 * 1024 * 1024
+
+# Start of the 'Solution' attribute of a plan that computed to the end
+SUCCESSFUL_SOLUTION = 'Unsteady Finished Successfully'
+
+# Plan statuses
+RUNNING = 'running'
+COMPLETED = 'completed'
+FAILED = 'failed'
+
+
+def plan_extension(plan):
+    # 'p05' from 'p05', 'P05' or 'ME_Valleys.p05'
+    return plan.split('.')[-1].lower()
+
+
+def output_complete(hdf_path):
+    """
+    Checks that a plan result file exists, opens and reports a successful solution.
+
+    Returns:
+        bool: True if the computation finished successfully.
+    """
+    if not os.path.exists(hdf_path):
+        return False
+    try:
+        with h5py.File(hdf_path, 'r') as hdf_file:
+            status = solution_status(hdf_file)
+    except OSError:
+        return False
+    return status is not None and status.strip().startswith(SUCCESSFUL_SOLUTION)
+
+
+class RunJournal:
+    """
+    Input hashes and status of every plan run of a project, saved after each change.
+    """
+
+    def __init__(self, project_file, terrain_file=None, hash_size_limit=HASH_SIZE_LIMIT):
+        """
+        Parameters:
+            project_file (str): The project's .prj file.
+            terrain_file (str): Terrain the plans run with; part of every plan's inputs.
+            hash_size_limit (int): Files larger than this (bytes) are identified by size and
+                modification time instead of content.
+        """
+        self.project_file = os.path.abspath(project_file)
+        self.project_dir = os.path.dirname(self.project_file)
+        self.base_name = os.path.splitext(os.path.basename(self.project_file))[0]
+        self.terrain_file = terrain_file
+        self.hash_size_limit = hash_size_limit
+        self.journal_path = os.path.join(self.project_dir, f"{self.base_name}.run_journal.json")
+        self._lock = threading.RLock()
+        self.plans, self._file_hashes = self._read()
+
+    # Journal file
+    def _read(self):
+        try:
+            with open(self.journal_path, 'r') as file:
+                journal = json.load(file)
+        except (FileNotFoundError, ValueError):
+            return {}, {}
+        if journal.get('version') != JOURNAL_VERSION:
+            return {}, {}
+        return journal.get('plans', {}), journal.get('file_hashes', {})
+
+    def _write(self):
+        # Written under a temporary name and renamed, so an interruption never leaves half a journal
+        journal = {'version': JOURNAL_VERSION, 'plans': self.plans, 'file_hashes': self._file_hashes}
+        handle, temp_path = tempfile.mkstemp(dir=self.project_dir, suffix='.tmp')
+        with os.fdopen(handle, 'w') as file:
+            json.dump(journal, file, indent=1)
+        os.replace(temp_path, self.journal_path)
+
+    # Hashing
+    def file_hash(self, file_path, by_content=None):
+        """
+        Hash of one file: of its content, or of its size and modification time for files over
+        hash_size_limit. Content hashes are cached by size and modification time.
+
+        Returns:
+            str: Hex digest, or None if the file does not exist.
+        """
+        try:
+            stat = os.stat(file_path)
+        except FileNotFoundError:
+            return None
+        signature = f"{stat.st_size}:{stat.st_mtime_ns}"
+        if by_content is None:
+            by_content = stat.st_size <= self.hash_size_limit
+        if not by_content:
+            return 'stat:' + signature
+        key = os.path.abspath(file_path)
+        with self._lock:
+            cached = self._file_hashes.get(key)
+        if cached and cached['signature'] == signature:
+            return cached['hash']
+        digest = hashlib.sha256()
+        with open(file_path, 'rb') as file:
+            for chunk in iter(lambda: file.read(HASH_CHUNK_SIZE), b''):
+                digest.update(chunk)
+        with self._lock:
+            self._file_hashes[key] = {'signature': signature, 'hash': digest.hexdigest()}
+        return digest.hexdigest()
+
+    def input_files(self, plan):
+        """
+        Returns the input files of a plan: {role: path}.
+        """
+        plan = plan_extension(plan)
+        project = get_project(self.project_file, refresh=True)
+        if not project.exists(plan):
+            raise FileNotFoundError(f"Plan {plan} does not exist in {self.project_dir}.")
+        files = {'plan': project.path(plan)}
+        flow, geometry = project.plan_flow(plan), project.plan_geometry(plan)
+        if flow:
+            files['flow'] = project.path(flow) or os.path.join(self.project_dir, f"{self.base_name}.{flow}")
+        if geometry:
+            files['geometry'] = project.path(geometry) or os.path.join(self.project_dir, f"{self.base_name}.{geometry}")
+            files['geometry_hdf'] = files['geometry'] + '.hdf'
+        files['rasmap'] = os.path.join(self.project_dir, f"{self.base_name}.rasmap")
+        if self.terrain_file:
+            files['terrain'] = self.terrain_file
+        return files
+
+    def input_hash(self, plan):
+        """
+        Hashes the inputs of a plan.
+
+        Returns:
+            tuple: (combined hex digest, {role: file hash}). Missing files hash as None.
+        """
+        hashes = {}
+        for role, file_path in self.input_files(plan).items():
+            # Binary inputs are identified by size and modification time
+            by_content = False if role in ('terrain', 'geometry_hdf') else None
+            hashes[role] = self.file_hash(file_path, by_content=by_content)
+        combined = hashlib.sha256(json.dumps(hashes, sort_keys=True).encode()).hexdigest()
+        return combined, hashes
+
+    def output_path(self, plan):
+        return os.path.join(self.project_dir, f"{self.base_name}.{plan_extension(plan)}.hdf")
+
+    # Status
+    def is_fresh(self, plan):
+        """
+        Checks whether a plan's result is up to date.
+
+        Returns:
+            tuple: (bool, reason).
+        """
+        plan = plan_extension(plan)
+        with self._lock:
+            entry = self.plans.get(plan)
+        if entry is None:
+            return False, 'never run'
+        if entry['status'] != COMPLETED:
+            return False, f"last run {entry['status']}"
+        try:
+            inputs_hash = self.input_hash(plan)[0]
+        except FileNotFoundError as e:
+            return False, str(e)
+        # HEC-RAS may rewrite an input (e.g. run flags) while computing; both states are accepted
+        if inputs_hash not in (entry['inputs_hash'], entry.get('inputs_hash_after')):
+            return False, 'inputs changed'
+        output = self.output_path(plan)
+        if self.file_hash(output, by_content=False) != entry.get('output_signature'):
+            if not os.path.exists(output):
+                return False, 'result file missing'
+            if self.file_hash(output, by_content=True) != entry.get('output_hash'):
+                return False, 'result file changed'
+        if not output_complete(output):
+            return False, 'result incomplete'
+        return True, 'up to date'
+
+    def pending(self, plans):
+        """
+        Returns the plans that must run, in the order given; up-to-date plans are skipped.
+        """
+        pending = []
+        for plan in plans:
+            fresh, reason = self.is_fresh(plan)
+            if fresh:
+                print(f"Skipping plan {plan_extension(plan)}: {reason}")
+            else:
+                pending.append(plan)
+        return pending
+
+    def start(self, plan):
+        """
+        Records that a plan starts, with the hash of its inputs.
+        """
+        plan = plan_extension(plan)
+        try:
+            inputs_hash, hashes = self.input_hash(plan)
+        except FileNotFoundError:
+            # A missing plan fails in the solver and is recorded as failed by finish
+            inputs_hash, hashes = None, {}
+        with self._lock:
+            self.plans[plan] = {'status': RUNNING, 'inputs_hash': inputs_hash, 'inputs': hashes,
+                                'started': time.strftime('%Y-%m-%d %H:%M:%S'), 'finished': None, 'error': None}
+            self._write()
+
+    def finish(self, plan, succeeded, error=None):
+        """
+        Records the end of a plan run. A run only counts as completed if its .p##.hdf reports a
+        successful solution; the result file is then hashed.
+
+        Parameters:
+            plan (str): Plan extension.
+            succeeded (bool): Whether the solver reported success.
+            error (str): Error message of a failed run.
+        """
+        plan = plan_extension(plan)
+        output = self.output_path(plan)
+        if succeeded and not output_complete(output):
+            succeeded, error = False, error or f"{os.path.basename(output)} does not report a successful solution"
+        entry = dict(self.plans.get(plan) or {'inputs_hash': None, 'inputs': {}, 'started': None})
+        entry.update(status=COMPLETED if succeeded else FAILED, error=error,
+                     finished=time.strftime('%Y-%m-%d %H:%M:%S'))
+        if succeeded:
+            entry['inputs_hash_after'] = self.input_hash(plan)[0]
+            entry['output_signature'] = self.file_hash(output, by_content=False)
+            entry['output_hash'] = self.file_hash(output, by_content=True)
+        with self._lock:
+            self.plans[plan] = entry
+            self._write()
@@ -1,50 +1,47 @@
-import pyHMT2D
 from preprocessing.get_plan_names import extract_plan_titles_from_dir
-from preprocessing.set_current_plan import set_current_plan
+from run_journal import RunJournal
+from session_pool import DEFAULT_MAX_RUNS, HecRasSession, SessionPool
 import os
 
-def run_multiple_HEC_RAS_plans(project_file, terrain_file, plan_array = []):
+def run_multiple_HEC_RAS_plans(project_file, terrain_file, plan_array = [], max_workers=1,
+                               max_runs_per_session=DEFAULT_MAX_RUNS, journal=True):
     # Get the list of all plans in the project
     if not plan_array:
         plans = extract_plan_titles_from_dir(os.path.dirname(project_file))
         #get just the plan names from dictionary {file: plan}
         plan_array = {file for file, plan in plans.items()}
         print("Plans in the project:", plans)
-        
+
+    # The journal skips plans whose results are up to date, e.g. when an interrupted batch is rerun
+    run_journal = RunJournal(project_file, terrain_file) if journal else None
+
+    # Several workers run the plans side by side, each in its own copy of the project
+    if max_workers > 1:
+        from plan_scheduler import HecRasBackend, PlanScheduler
+        backend = HecRasBackend(terrain_file, max_runs=max_runs_per_session)
+        results = PlanScheduler(project_file, backend, max_workers=max_workers, journal=run_journal).run(plan_array)
+        print("Session timings:", backend.pool.report())
+        return results
+
+    # HEC-RAS is started once and reused for up to max_runs_per_session plans (1 starts a
+    # fresh session for every plan)
+    pool = SessionPool(lambda: HecRasSession(terrain_file), max_runs=max_runs_per_session)
+    results = []
+    if run_journal is not None:
+        plan_array = run_journal.pending(plan_array)
     for plan in plan_array:
-        # Create a HEC-RAS model instance
         print(f"Running plan {plan}")
-        plan_set_suceessfully = set_current_plan(project_file, plan)
-        if not plan_set_suceessfully:
-            continue
-        my_hec_ras_model = pyHMT2D.RAS_2D.HEC_RAS_Model(version="6.1.0", faceless=False)
-
-        # Initialize the HEC-RAS model
-        my_hec_ras_model.init_model()
-
-        print("Hydraulic model name:", my_hec_ras_model.getName())
-        print("Hydraulic model version:", my_hec_ras_model.getVersion())
-
-        # Open a HEC-RAS project
-    
-        my_hec_ras_model.open_project(project_file, terrain_file)
-        
-        # Get the ras_controller instance
-        ras = my_hec_ras_model._RASController
-        print("RAS Controller:", ras)
-
-        try:
-            print(f"Running plan {plan}")
-            my_hec_ras_model.run_model()
-            
-        except Exception as e:
-            print(f"Error occurred while running plan {plan}: {e}")
-
-        # Close the HEC-RAS project
-        my_hec_ras_model.close_project()
-
-        # Quit HEC-RAS
-        my_hec_ras_model.exit_model()
+        if run_journal is not None:
+            run_journal.start(plan)
+        result = pool.run(project_file, plan)
+        if run_journal is not None:
+            run_journal.finish(plan, result['status'] == 'completed', result['error'])
+        if result['error']:
+            print(f"Error occurred while running plan {plan}: {result['error']}")
+        results.append(result)
+    pool.close()
+    print("Session timings:", pool.report())
+    return results
 
 if __name__ == "__main__":
     project_file_list = [
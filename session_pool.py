@@ -0,0 +1,276 @@
+"""
+Pool of warm HEC-RAS Controller sessions, reused across plans.
+
+run_multiple_HEC_RAS_plans used to start HEC-RAS, open the project, run one plan, close the
+project and quit HEC-RAS for every plan; for short plans the application start and shutdown
+took longer than the computation. SessionPool keeps sessions running and switches plans
+within a session, either with the controller's Plan_SetCurrent or by setting 'Current Plan='
+and reopening the project in the running application. A session is recycled (shut down and
+replaced on next use) after max_runs plans, and discarded as soon as a run fails, so a
+controller left in a bad state never runs another plan.
+
+Every phase (startup, open, switch, compute, shutdown) is timed; report() sums them up and
+estimates the startup and shutdown time saved compared to one session per plan.
+
+Sessions are created through a factory, so the pool runs with any object that implements
+the session methods (start, open_project, set_plan, compute, close), e.g. a mock in tests.
+Because the controller is a COM object, a session is only handed to the thread that created
+it.
+
+Usage:
+    pool = SessionPool(lambda: HecRasSession(terrain_file), max_runs=20)
+    for plan in ['p02', 'p04', 'p05']:
+        pool.run(project_file, plan)
+    pool.close()
+    print(pool.report())
+"""
+
+import os
+import threading
+import time
+from collections import defaultdict
+from contextlib import contextmanager
+
+from preprocessing.ras_project import get_project
+from preprocessing.set_current_plan import set_current_plan
+
+# Plans run by one session before it is recycled
+DEFAULT_MAX_RUNS = 20
+
+# Timed phases of a session
+PHASES = ('startup', 'open', 'switch', 'compute', 'shutdown')
+
+# How a session changes plans: the controller's Plan_SetCurrent, or 'Current Plan=' plus a reopen
+SWITCH_MODES = ('set_current', 'reopen')
+
+
+class HecRasSession:
+    """
+    One running HEC-RAS application driven through pyHMT2D.
+    """
+
+    def __init__(self, terrain_file, version="6.1.0", faceless=False, switch_mode='set_current',
+                 model_factory=None):
+        """
+        Parameters:
+            terrain_file (str): Terrain passed to open_project.
+            version (str): HEC-RAS version.
+            faceless (bool): Run HEC-RAS without its window.
+            switch_mode (str): 'set_current' (Plan_SetCurrent, falling back to a reopen when the
+                controller refuses) or 'reopen'.
+            model_factory (callable): Returns a model with the pyHMT2D HEC_RAS_Model methods;
+                defaults to pyHMT2D.RAS_2D.HEC_RAS_Model. Pass a mock to test without HEC-RAS.
+        """
+        if switch_mode not in SWITCH_MODES:
+            raise ValueError(f"switch_mode must be one of {SWITCH_MODES}, got '{switch_mode}'.")
+        self.terrain_file = terrain_file
+        self.version = version
+        self.faceless = faceless
+        self.switch_mode = switch_mode
+        self.model_factory = model_factory
+        self.model = None
+        self.project_file = None
+
+    def start(self):
+        if self.model_factory is None:
+            import pyHMT2D
+            self.model = pyHMT2D.RAS_2D.HEC_RAS_Model(version=self.version, faceless=self.faceless)
+        else:
+            self.model = self.model_factory()
+        self.model.init_model()
+
+    def open_project(self, project_file):
+        if self.project_file is not None:
+            self.model.close_project()
+        self.model.open_project(project_file, self.terrain_file)
+        self.project_file = project_file
+
+    def set_plan(self, plan):
+        """
+        Makes plan ('p05') the current plan of the open project.
+        """
+        if self.switch_mode == 'set_current':
+            title = get_project(self.project_file).title(plan)
+            if title and self.model._RASController.Plan_SetCurrent(title):
+                return
+        # The .prj is read when the project opens, so the plan is set there and the project reopened
+        if not set_current_plan(self.project_file, plan):
+            raise ValueError(f"Plan {plan} does not exist in {self.project_file}.")
+        self.open_project(self.project_file)
+
+    def compute(self):
+        self.model.run_model()
+
+    def close(self):
+        if self.model is None:
+            return
+        try:
+            if self.project_file is not None:
+                self.model.close_project()
+        finally:
+            self.model.exit_model()
+            self.model = None
+            self.project_file = None
+
+
+class SessionPool:
+    """
+    Hands out warm sessions and recycles them after max_runs plans or an error.
+    """
+
+    def __init__(self, session_factory, size=1, max_runs=DEFAULT_MAX_RUNS):
+        """
+        Parameters:
+            session_factory (callable): Returns a new, not yet started session.
+            size (int): Sessions alive at most; acquire() waits when all are busy. None sets no
+                limit (the caller limits concurrency, as PlanScheduler does).
+            max_runs (int): Plans run by a session before it is recycled (1 starts a session per plan).
+        """
+        self.session_factory = session_factory
+        self.size = float('inf') if size is None else max(1, size)
+        self.max_runs = max(1, max_runs)
+        self.timings = defaultdict(list)
+        self.runs = 0
+        self.failures = 0
+        self._idle = []
+        self._alive = 0
+        self._condition = threading.Condition()
+
+    @contextmanager
+    def _timed(self, phase):
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            with self._condition:
+                self.timings[phase].append(time.perf_counter() - start)
+
+    def _start_session(self):
+        session = self.session_factory()
+        with self._timed('startup'):
+            session.start()
+        return {'session': session, 'thread': threading.get_ident(), 'runs': 0}
+
+    def _stop_session(self, entry):
+        try:
+            with self._timed('shutdown'):
+                entry['session'].close()
+        except Exception as e:
+            print(f"Warning: error while closing a HEC-RAS session: {e}")
+        finally:
+            with self._condition:
+                self._alive -= 1
+                self._condition.notify_all()
+
+    @contextmanager
+    def acquire(self):
+        """
+        Yields a started session; it is returned to the pool afterwards, or shut down if it
+        reached max_runs or the block raised.
+        """
+        thread = threading.get_ident()
+        with self._condition:
+            while True:
+                entry = next((entry for entry in self._idle if entry['thread'] == thread), None)
+                if entry is not None:
+                    self._idle.remove(entry)
+                    break
+                if self._alive < self.size:
+                    self._alive += 1
+                    break
+                # Another thread's idle session is shut down to make room for this thread
+                if self._idle:
+                    foreign = self._idle.pop(0)
+                    self._condition.release()
+                    try:
+                        self._stop_session(foreign)
+                    finally:
+                        self._condition.acquire()
+                    continue
+                self._condition.wait()
+        if entry is None:
+            try:
+                entry = self._start_session()
+            except BaseException:
+                with self._condition:
+                    self._alive -= 1
+                    self._condition.notify_all()
+                raise
+
+        try:
+            yield entry['session']
+        except BaseException:
+            self._stop_session(entry)
+            raise
+        entry['runs'] += 1
+        if entry['runs'] >= self.max_runs:
+            self._stop_session(entry)
+        else:
+            with self._condition:
+                self._idle.append(entry)
+                self._condition.notify_all()
+
+    def run(self, project_file, plan):
+        """
+        Runs one plan in a warm session.
+
+        Parameters:
+            project_file (str): The project's .prj file.
+            plan (str): Plan extension or file name ('p05', 'ME_Valleys.p05').
+
+        Returns:
+            dict: 'plan', 'status' ('completed' or 'failed'), 'seconds' and 'error'.
+        """
+        plan = plan.split('.')[-1].lower()
+        project_file = os.path.abspath(project_file)
+        start = time.perf_counter()
+        error = None
+        try:
+            with self.acquire() as session:
+                if session.project_file != project_file:
+                    with self._timed('open'):
+                        session.open_project(project_file)
+                with self._timed('switch'):
+                    session.set_plan(plan)
+                with self._timed('compute'):
+                    session.compute()
+        except Exception as e:
+            error = f"{type(e).__name__}: {e}"
+        with self._condition:
+            self.runs += 1
+            self.failures += error is not None
+        return {'plan': plan, 'status': 'failed' if error else 'completed',
+                'seconds': round(time.perf_counter() - start, 2), 'error': error}
+
+    def close(self, thread_only=False):
+        """
+        Shuts down idle sessions: all of them, or only those of the calling thread (which
+        must close its own COM sessions).
+        """
+        thread = threading.get_ident()
+        with self._condition:
+            entries = [entry for entry in self._idle if not thread_only or entry['thread'] == thread]
+            for entry in entries:
+                self._idle.remove(entry)
+        for entry in entries:
+            self._stop_session(entry)
+
+    def report(self):
+        """
+        Summarizes the phase timings.
+
+        Returns:
+            dict: {phase: {'count', 'total', 'mean'}} in seconds, plus 'runs', 'failures' and
+            'startup_saved_seconds': the startup and shutdown time that one session per plan
+            would have cost on top, estimated from the measured means.
+        """
+        with self._condition:
+            report = {phase: {'count': len(self.timings[phase]), 'total': round(sum(self.timings[phase]), 3),
+                              'mean': round(sum(self.timings[phase]) / len(self.timings[phase]), 3)
+                              if self.timings[phase] else 0.0}
+                      for phase in PHASES}
+            report['runs'] = self.runs
+            report['failures'] = self.failures
+        cycle = report['startup']['mean'] + report['shutdown']['mean']
+        report['startup_saved_seconds'] = round(max(self.runs - report['startup']['count'], 0) * cycle, 3)
+        return report